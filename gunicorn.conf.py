@@ -7,8 +7,16 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# SSE stream notifikacija drži vezu otvorenom - sync worker bi njome bio
+# blokiran, pa se koristi gevent (hiljade veza po workeru) ili, bez njega, gthread
+try:
+    import gevent  # noqa: F401
+    _default_worker_class = "gevent"
+except ImportError:
+    _default_worker_class = "gthread"
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", _default_worker_class)
 worker_connections = 1000
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
 timeout = 30
 keepalive = 2
 
@@ -0,0 +1,24 @@
+# ASGI režim (HTTP + WebSocket preko Channels):
+#   gunicorn -c gunicorn_asgi.conf.py tovar_taxi.asgi:application
+# Ista podešavanja kao gunicorn.conf.py, samo sa uvicorn workerom.
+import os
+import runpy
+
+globals().update({
+    name: value
+    for name, value in runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")).items()
+    if not name.startswith("_")
+})
+
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    """Bez Redis channel layer-a poruke (chat, notifikacije, berza) stižu samo
+    do WebSocket-a na istom procesu - tada radi samo jedan worker"""
+    from decouple import config
+
+    if server.num_workers > 1 and not config("CHANNEL_LAYER_URL", default=config("REDIS_URL", default="")):
+        server.log.warning("CHANNEL_LAYER_URL/REDIS_URL nije podešen - pokreće se jedan worker umesto %s",
+                           server.num_workers)
+        server.num_workers = 1
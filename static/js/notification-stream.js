@@ -0,0 +1,50 @@
+// Sažetak notifikacija (broj nepročitanih + poslednje) - SSE stream,
+// a polling samo kada stream nije dostupan (stari pregledač, isključen na serveru)
+(function () {
+    const STREAM_URL = '/transport/api/notifications/stream/';
+    const POLL_URL = '/transport/api/notifications/';
+    const listeners = [];
+    let started = false;
+
+    function publish(summary) {
+        listeners.forEach(callback => callback(summary));
+    }
+
+    function startPolling(interval) {
+        const poll = () => {
+            if (!navigator.onLine) {
+                return;
+            }
+            fetch(POLL_URL, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(response => response.ok ? response.json() : null)
+                .then(data => data && publish(data))
+                .catch(error => console.log('Notification update failed:', error));
+        };
+        poll();
+        setInterval(poll, interval);
+    }
+
+    function start(interval) {
+        if (started) {
+            return;
+        }
+        started = true;
+        if (!window.EventSource) {
+            startPolling(interval);
+            return;
+        }
+        const stream = new EventSource(STREAM_URL);
+        stream.addEventListener('notifications', event => publish(JSON.parse(event.data)));
+        stream.onerror = () => {
+            // Prekid veze pregledač sam obnavlja; CLOSED znači da stream nije dostupan
+            if (stream.readyState === EventSource.CLOSED) {
+                startPolling(interval);
+            }
+        };
+    }
+
+    window.subscribeNotifications = function (callback, pollInterval = 30000) {
+        listeners.push(callback);
+        start(pollInterval);
+    };
+})();
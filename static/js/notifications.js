@@ -60,10 +60,14 @@ class AudioNotificationSystem {
             this.showNotification(event.detail);
         });
         
-        // Periodically check for new notifications from server
-        setInterval(() => {
-            this.checkForNewNotifications();
-        }, 10000); // Check every 10 seconds
+        // Nove notifikacije stižu preko streama (notification-stream.js), polling je rezerva
+        if (window.subscribeNotifications) {
+            window.subscribeNotifications(data => this.handleNotifications(data), 10000);
+        } else {
+            setInterval(() => {
+                this.checkForNewNotifications();
+            }, 10000); // Check every 10 seconds
+        }
     }
     
     async checkForNewNotifications() {
@@ -75,24 +79,30 @@ class AudioNotificationSystem {
             });
             
             if (response.ok) {
-                const data = await response.json();
-                data.notifications.forEach(notification => {
-                    if (!notification.is_read) {
-                        this.showNotification({
-                            type: notification.notification_type,
-                            title: notification.title,
-                            message: notification.message,
-                            sound: notification.sound_file || 'ping',
-                            id: notification.id
-                        });
-                    }
-                });
+                this.handleNotifications(await response.json());
             }
         } catch (error) {
             console.error('Error checking notifications:', error);
         }
     }
     
+    handleNotifications(data) {
+        this.shownIds = this.shownIds || new Set();
+        data.notifications.forEach(notification => {
+            // Ista notifikacija može stići ponovo dok se ne označi kao pročitana
+            if (!notification.is_read && !this.shownIds.has(notification.id)) {
+                this.shownIds.add(notification.id);
+                this.showNotification({
+                    type: notification.notification_type,
+                    title: notification.title,
+                    message: notification.message,
+                    sound: 'ping',
+                    id: notification.id
+                });
+            }
+        });
+    }
+    
     playSound(soundName) {
         if (this.sounds[soundName]) {
             try {
@@ -1,20 +1,32 @@
 """
 ASGI config for tovar_taxi project.
+
+HTTP ide kroz Django, WebSocket kroz Channels (transport/routing.py).
+Pokretanje: gunicorn -c gunicorn_asgi.conf.py tovar_taxi.asgi:application
 """
 
 import os
+
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-import transport.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tovar_taxi.settings')
 
+# Django mora biti inicijalizovan pre uvoza consumera (modeli)
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+import transport.routing  # noqa: E402
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
-        URLRouter(
-            transport.routing.websocket_urlpatterns
+    "http": django_asgi_app,
+    "websocket": AllowedHostsOriginValidator(
+        AuthMiddlewareStack(
+            URLRouter(
+                transport.routing.websocket_urlpatterns
+            )
         )
     ),
 })
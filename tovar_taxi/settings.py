@@ -54,13 +54,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'transport',
-    # 'channels',  # Removed temporarily to reduce memory
+    'channels',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'transport.middleware.SessionRefreshMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -143,9 +144,13 @@ USE_TZ = True
 LOGIN_REDIRECT_URL = '/'
 
 # Session configuration - korisnici ostaju ulogovani
+# Sesije iz keša sa bazom kao rezervom; rok se produžava u SessionRefreshMiddleware
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 30  # 30 dana
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False
+# Sesija se produžava (upisuje) najviše jednom u ovoliko sekundi
+SESSION_REFRESH_THRESHOLD = config('SESSION_REFRESH_THRESHOLD', default=60 * 60, cast=int)
 SESSION_COOKIE_SECURE = True  # HTTPS produkcija
 SESSION_COOKIE_HTTPONLY = True
 
@@ -172,13 +177,6 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Channels configuration - disabled to reduce memory
-# CHANNEL_LAYERS = {
-#     'default': {
-#         'BACKEND': 'channels.layers.InMemoryChannelLayer',
-#     },
-# }
-
 # Stripe Configuration
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='pk_test_51234567890abcdef')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='sk_test_51234567890abcdef')
@@ -187,13 +185,79 @@ STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='whsec_123456789
 # Currency settings
 DEFAULT_CURRENCY = 'RSD'  # Serbian Dinar
 
+# Redis (opciono) - deljeni keš između gunicorn workera
+REDIS_URL = config('REDIS_URL', default='')
+
+# Channels (WebSocket) - Redis sloj deli poruke između workera i servera;
+# bez njega sloj u memoriji radi samo za jedan ASGI proces. Mali kapacitet i
+# kratko trajanje poruka drže memoriju niskom (spor klijent gubi stare poruke).
+CHANNEL_LAYER_URL = config('CHANNEL_LAYER_URL', default=REDIS_URL)
+if CHANNEL_LAYER_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [CHANNEL_LAYER_URL],
+                'capacity': 100,
+                'expiry': 30,
+                'group_expiry': 3600,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {
+                'capacity': 100,
+                'expiry': 30,
+                'group_expiry': 3600,
+            },
+        },
+    }
+
+# Trenutne pozicije vozača za mapu flote - Redis ako je podešen, inače memorija procesa
+POSITION_STORE_URL = config('POSITION_STORE_URL', default=REDIS_URL)
+
+# SSE stream notifikacija - zahteva gevent/gthread worker (gunicorn.conf.py);
+# kada je isključen, klijenti se vraćaju na polling
+NOTIFICATION_STREAM_ENABLED = config('NOTIFICATION_STREAM_ENABLED', default=True, cast=bool)
+
+# Pozadinski zadaci (transport/tasks.py) izvršava `manage.py run_worker`; bez
+# worker-a (lokalni razvoj) BACKGROUND_TASKS_EAGER ih izvršava posle commit-a u zahtevu
+BACKGROUND_TASKS_EAGER = config('BACKGROUND_TASKS_EAGER', default=False, cast=bool)
+
+# GPS istorija (Location/DriverLocation) - starije od ovoga ide u arhivu
+TRACK_RETENTION_MONTHS = config('TRACK_RETENTION_MONTHS', default=6, cast=int)
+# Arhiva mora biti na trajnom disku (npr. Render persistent disk, /var/data/tracks) -
+# disk aplikacije se briše pri svakom deploy-u, a archive_tracks briše arhivirane
+# redove iz baze; bez podešavanja komanda odbija da radi
+TRACK_ARCHIVE_DIR = config('TRACK_ARCHIVE_DIR', default='')
+
 # Force template reloading
 TEMPLATES_AUTO_RELOAD = True
 
-# Disable all caching
+# Keš (transport/cache.py) - CACHE_URL bira backend:
+#   redis://host:6379/1  - deljen između workera i servera (podrazumevano kada je podešen REDIS_URL)
+#   file:///var/tmp/tovar_taxi_cache - deljen između workera na istom serveru
+#   locmem://            - memorija procesa, za jedan proces (podrazumevano)
+#   dummy://             - bez keširanja
+CACHE_URL = config('CACHE_URL', default=REDIS_URL or 'locmem://')
+_cache_scheme, _, _cache_location = CACHE_URL.partition('://')
+if _cache_scheme in ('redis', 'rediss'):
+    _cache_backend, _cache_location = 'django.core.cache.backends.redis.RedisCache', CACHE_URL
+elif _cache_scheme == 'file':
+    _cache_backend = 'django.core.cache.backends.filebased.FileBasedCache'
+elif _cache_scheme == 'dummy':
+    _cache_backend = 'django.core.cache.backends.dummy.DummyCache'
+else:
+    _cache_backend, _cache_location = 'django.core.cache.backends.locmem.LocMemCache', 'tovar_taxi'
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        'BACKEND': _cache_backend,
+        'LOCATION': _cache_location,
+        'KEY_PREFIX': 'tovar_taxi',
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
     }
 }
 
@@ -216,7 +280,7 @@ if not DEBUG:
     SESSION_COOKIE_HTTPONLY = True
     CSRF_COOKIE_HTTPONLY = True
     SESSION_COOKIE_AGE = 86400  # 24 sata
-    SESSION_SAVE_EVERY_REQUEST = True
+    SESSION_SAVE_EVERY_REQUEST = False
     SESSION_EXPIRE_AT_BROWSER_CLOSE = False
     
     CSRF_TRUSTED_ORIGINS = [
@@ -235,7 +299,7 @@ else:
     SESSION_COOKIE_HTTPONLY = True
     CSRF_COOKIE_HTTPONLY = True
     SESSION_COOKIE_AGE = 86400
-    SESSION_SAVE_EVERY_REQUEST = True
+    SESSION_SAVE_EVERY_REQUEST = False
     SESSION_EXPIRE_AT_BROWSER_CLOSE = False
     # Dodatne postavke za development
     SECURE_REDIRECT_EXEMPT = [r'.*']  # Isključi sve redirect-e na HTTPS
@@ -5,11 +5,14 @@ from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
 import json
 import csv
 from datetime import datetime
-from .models import Profile, Vehicle, Shipment, ShipmentOffer, Tour, ChatMessage, Notification, Location
+from .models import (
+    Profile, Vehicle, Shipment, ShipmentOffer, Tour, ChatMessage, Notification, Location, City, Highway, BackgroundTask, SavedSearch, UserStats
+)
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -134,6 +137,48 @@ class LocationAdmin(admin.ModelAdmin):
     search_fields = ('tour__shipment__title',)
     readonly_fields = ('timestamp',)
 
+@admin.register(City)
+class CityAdmin(admin.ModelAdmin):
+    list_display = ('name', 'postal_code', 'region', 'population', 'is_major')
+    list_filter = ('is_major', 'region')
+    search_fields = ('name', 'postal_code')
+
+@admin.register(Highway)
+class HighwayAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'highway_type', 'start_city', 'end_city', 'distance_km', 'toll_road', 'priority')
+    list_filter = ('highway_type', 'toll_road', 'priority')
+    search_fields = ('code', 'name', 'start_city__name', 'end_city__name')
+    readonly_fields = ('updated_at',)
+
+@admin.register(BackgroundTask)
+class BackgroundTaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'finished_at', 'idempotency_key')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'idempotency_key', 'last_error')
+    readonly_fields = ('created_at', 'finished_at', 'locked_at', 'locked_by', 'last_error')
+    actions = ['retry_tasks']
+
+    @admin.action(description='Pokreni ponovo izabrane zadatke')
+    def retry_tasks(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='pending', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f'{updated} zadataka vraćeno u red.')
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ('user', 'name', 'pickup_city', 'delivery_city', 'cargo_type', 'max_weight', 'is_active', 'created_at')
+    list_filter = ('is_active',)
+    search_fields = ('user__username', 'name', 'pickup_city__name', 'delivery_city__name')
+    raw_id_fields = ('user', 'pickup_city', 'delivery_city')
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'total_shipments', 'active_shipments', 'total_vehicles', 'total_offers',
+                    'accepted_offers', 'updated_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('updated_at',)
+
 # Inline Profile u User admin
 class ProfileInline(admin.StackedInline):
     model = Profile
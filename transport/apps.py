@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class TransportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transport'
+
+    def ready(self):
+        # Registruj signale za keševe (deljeni keš, putna mreža, matrica rastojanja, indeksi, ture, statistike)
+        from . import (  # noqa: F401
+            cache, road_graph, distance_matrix, spatial_index, corridor_matching, geofence, location_ingest,
+            notifications, cities, freight_search, saved_searches,
+            freight_board, user_stats,
+        )
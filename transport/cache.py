@@ -0,0 +1,156 @@
+"""
+Deljeni keš (settings.CACHES) za skupe upite i proračune
+
+- verzionisani ključevi: svaki namespace (i opciono opseg unutar njega,
+  npr. korisnik) ima verziju u kešu; invalidacija samo menja verziju, pa
+  stari unosi postaju nedostižni i ističu sami
+- invalidate_on: post_save/post_delete modela menja verziju posle commit-a
+- get_or_compute: zaštita od stampeda - kada unos zastari, samo proces koji
+  dobije zaključavanje ga računa ponovo, ostali do tada vraćaju staru
+  vrednost (ili kratko čekaju kada stare vrednosti nema)
+
+Na dnu su keširani upiti aplikacije (gradovi) i
+registracija invalidacije za sve namespace-ove.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .models import City, Highway
+
+DEFAULT_TIMEOUT = 300
+
+# Koliko dugo posle isteka se čuva stara vrednost za vreme ponovnog računanja
+STALE_SECONDS = 60
+
+# Zaključavanje računanja i koliko dugo ostali procesi čekaju rezultat
+LOCK_SECONDS = 10
+WAIT_SECONDS = 2.0
+WAIT_STEP = 0.05
+
+KEY_PREFIX = 'transport'
+
+# Namespace-ovi
+CITIES = 'cities'
+ROUTES = 'routes'
+PRICING = 'pricing'
+
+
+def _version_key(namespace, scope=None):
+    return f'{KEY_PREFIX}:v:{namespace}' if scope is None else f'{KEY_PREFIX}:v:{namespace}:{scope}'
+
+
+def _versions(namespace, scope=None):
+    keys = [_version_key(namespace)]
+    if scope is not None:
+        keys.append(_version_key(namespace, scope))
+    stored = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = stored.get(key)
+        if version is None:
+            # Prvi upis - add da dva procesa ne postave različite verzije
+            cache.add(key, 0, None)
+            version = cache.get(key, 0)
+        versions.append(str(version))
+    return '.'.join(versions)
+
+
+def version(namespace, scope=None):
+    """Trenutna verzija namespace-a (i opsega) - menja se pri svakoj invalidaciji"""
+    return _versions(namespace, scope)
+
+
+def is_shared():
+    """Da li keš vide svi procesi (Redis, fajl) ili samo ovaj (locmem, dummy)"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def make_key(namespace, *parts, scope=None):
+    """Ključ za trenutnu verziju namespace-a (i opsega)"""
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    scoped = namespace if scope is None else f'{namespace}:{scope}'
+    return f'{KEY_PREFIX}:{scoped}:{_versions(namespace, scope)}:{digest}'
+
+
+def invalidate(namespace, scope=None):
+    """Zastareva sve unose namespace-a, ili samo jednog opsega"""
+    cache.set(_version_key(namespace, scope), time.time_ns(), None)
+
+
+def invalidate_many(namespace, scopes):
+    """Zastareva više opsega jednim upisom (npr. svi primaoci masovne notifikacije)"""
+    value = time.time_ns()
+    cache.set_many({_version_key(namespace, scope): value for scope in scopes}, None)
+
+
+def get_or_compute(namespace, parts, compute, timeout=DEFAULT_TIMEOUT, scope=None):
+    """
+    Vraća keširanu vrednost ili je računa (compute()) i upisuje
+
+    Args:
+        parts: tuple koji uz namespace određuje ključ (argumenti upita)
+        scope: opseg za ciljanu invalidaciju (npr. id korisnika)
+    """
+    key = make_key(namespace, *parts, scope=scope)
+    lock_key = f'{key}:lock'
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until or not cache.add(lock_key, 1, LOCK_SECONDS):
+            return value
+    elif not cache.add(lock_key, 1, LOCK_SECONDS):
+        # Drugi proces već računa - sačekaj njegov rezultat, pa tek onda računaj sam
+        deadline = time.monotonic() + WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_STEP)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+
+    try:
+        value = compute()
+        cache.set(key, (value, time.time() + timeout), timeout + STALE_SECONDS)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def invalidate_on(namespace, *models, scope=None):
+    """
+    Registruje invalidaciju namespace-a na post_save/post_delete modela
+
+    Args:
+        scope: funkcija instanca -> opseg (ili lista opsega) koji se zastareva;
+               bez nje se zastareva ceo namespace
+    """
+    def changed(sender, instance, **kwargs):
+        scopes = [None] if scope is None else scope(instance)
+        if not isinstance(scopes, (list, tuple, set)):
+            scopes = [scopes]
+        # Posle commit-a, da drugi zahtev ne upiše u keš podatke pre izmene
+        transaction.on_commit(lambda: [invalidate(namespace, value) for value in scopes])
+
+    for model in models:
+        name = model._meta.label_lower
+        post_save.connect(changed, sender=model, weak=False, dispatch_uid=f'cache_{namespace}_{name}_saved')
+        post_delete.connect(changed, sender=model, weak=False, dispatch_uid=f'cache_{namespace}_{name}_deleted')
+
+
+# ------------------------------------------------------------ keširani upiti
+
+def city_list():
+    """Svi gradovi po imenu (padajući meniji)"""
+    return get_or_compute(CITIES, ('all',), lambda: list(City.objects.order_by('name')), timeout=3600)
+
+
+invalidate_on(CITIES, City)
+invalidate_on(ROUTES, City, Highway)
+# Matrica se puni sa bulk_create (bez signala) - DistanceMatrix.rebuild invalidira sam
+invalidate_on(PRICING, City)
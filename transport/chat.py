@@ -0,0 +1,142 @@
+"""
+Chat ture (ChatMessage)
+
+Poruke stižu uživo preko ChatConsumer-a (grupa chat_<tura>); istorija se
+čita po stranicama (history_page, kursori before_id/after_id), pa ni duga
+tura ne učitava ceo razgovor, a ista stranica služi i kao rezerva kada
+WebSocket nije dostupan. Potvrde čitanja klijent šalje zbirno ("pročitano
+do id-ja"), pa je to jedan UPDATE umesto UPDATE-a pri svakom učitavanju.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db.models import Q, Subquery
+
+from .models import ChatMessage, Notification
+
+logger = logging.getLogger(__name__)
+
+# Podrazumevana i najveća stranica istorije (početni prikaz, starije/novije poruke)
+CHAT_PAGE_SIZE = 50
+CHAT_MAX_PAGE_SIZE = 200
+
+MESSAGE_FIELDS = ('id', 'message', 'sender_id', 'timestamp', 'is_read')
+
+
+def chat_group(tour_id):
+    return f'chat_{tour_id}'
+
+
+def can_chat(tour, user):
+    """Poruke pišu vozač i naručilac pošiljke"""
+    return tour.driver_id == user.id or (tour.shipment is not None and tour.shipment.sender_id == user.id)
+
+
+def can_view_chat(tour, user):
+    return can_chat(tour, user) or user.is_staff
+
+
+def serialize_message(message):
+    return {
+        'id': message.id,
+        'message': message.message,
+        'user_id': message.sender_id,
+        'username': message.sender.username,
+        'timestamp': message.timestamp.isoformat(),
+        'is_read': message.is_read,
+    }
+
+
+def post_message(tour, sender, text):
+    """Upisuje poruku i obaveštava drugu stranu"""
+    message = ChatMessage.objects.create(tour=tour, sender=sender, message=text)
+
+    if tour.driver_id != sender.id:
+        recipient_id = tour.driver_id
+    else:
+        recipient_id = tour.shipment.sender_id if tour.shipment is not None else None
+    if recipient_id:
+        Notification.objects.create(
+            user_id=recipient_id,
+            notification_type='new_message',
+            title='Nova poruka',
+            message=f'Dobili ste novu poruku u turi "{tour.shipment.title}"',
+            tour=tour,
+        )
+    return message
+
+
+def _cursor_timestamp(tour_id, message_id):
+    return Subquery(ChatMessage.objects.filter(pk=message_id, tour_id=tour_id).values('timestamp')[:1])
+
+
+def history_page(tour_id, before_id=None, after_id=None, limit=CHAT_PAGE_SIZE):
+    """
+    Stranica istorije po ključu (timestamp, id) - indeks (tour, timestamp, id)
+
+    Bez kursora vraća poslednjih limit poruka, sa before_id starije od te
+    poruke, a sa after_id novije od nje. Redovi su rečnici (MESSAGE_FIELDS),
+    bez instanciranja modela i spajanja sa korisnicima.
+
+    Returns:
+        (poruke od najstarije, da li postoji još poruka u tom smeru)
+    """
+    messages = ChatMessage.objects.filter(tour_id=tour_id)
+    if after_id:
+        timestamp = _cursor_timestamp(tour_id, after_id)
+        # timestamp__gte ograničava opseg indeksa, OR samo razrešava isto vreme
+        messages = messages.filter(timestamp__gte=timestamp).filter(
+            Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=after_id)
+        ).order_by('timestamp', 'id')
+    else:
+        if before_id:
+            timestamp = _cursor_timestamp(tour_id, before_id)
+            messages = messages.filter(timestamp__lte=timestamp).filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=before_id)
+            )
+        messages = messages.order_by('-timestamp', '-id')
+
+    rows = list(messages.values(*MESSAGE_FIELDS)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not after_id:
+        rows.reverse()
+    return rows, has_more
+
+
+def compact_message(row):
+    """Red iz history_page za JSON (korisnička imena idu jednom, u users)"""
+    return {
+        'id': row['id'],
+        'message': row['message'],
+        'user_id': row['sender_id'],
+        'timestamp': row['timestamp'].isoformat(),
+        'is_read': row['is_read'],
+    }
+
+
+def mark_read(tour_id, reader_id, up_to_id):
+    """Označava tuđe poruke do up_to_id kao pročitane - jedan UPDATE"""
+    return ChatMessage.objects.filter(
+        tour_id=tour_id, id__lte=up_to_id, is_read=False
+    ).exclude(sender_id=reader_id).update(is_read=True)
+
+
+def broadcast(tour_id, event):
+    """Šalje događaj WebSocket klijentima ture (za izmene koje nisu došle kroz ChatConsumer)"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(chat_group(tour_id), event)
+    except Exception:
+        logger.warning('Slanje chat događaja za turu %s nije uspelo', tour_id, exc_info=True)
+
+
+def message_event(message):
+    return dict(serialize_message(message), type='chat_message')
+
+
+def read_event(reader_id, up_to_id):
+    return {'type': 'chat_read', 'user_id': reader_id, 'up_to_id': up_to_id}
@@ -0,0 +1,153 @@
+"""
+Nazivi gradova - poređenje bez obzira na velika slova i dijakritike
+
+Pošiljke čuvaju grad kao slobodan tekst (forma), a pretraga radi po
+City id-ju; resolve_city_id prevodi tekst u id, a autocomplete vraća
+gradove za početak naziva ("cac" -> Čačak). Oba rade nad indeksom u
+memoriji procesa (CityIndex), pa ne prave upit po pozivu; indeks se
+gradi iz keširane liste gradova i obnavlja kada se promeni verzija
+keša gradova (izmena City modela u bilo kom procesu).
+"""
+import threading
+import time
+import unicodedata
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import CITIES, city_list, version
+from .models import City
+
+# Slova koja NFKD ne rastavlja na osnovno slovo + znak
+_EXTRA_FOLDS = str.maketrans({'đ': 'dj', 'Đ': 'dj', 'ß': 'ss', '-': ' '})
+
+# Koliko gradova čuva svaki čvor stabla (najveći limit autocomplete-a)
+AUTOCOMPLETE_MAX_RESULTS = 20
+
+# Koliko često (s) proveravamo da li je neki drugi proces promenio gradove
+CITY_INDEX_RECHECK_SECONDS = 30
+
+
+def fold(text):
+    """'Čačak' -> 'cacak', 'Đurđevo' -> 'djurdjevo'"""
+    text = (text or '').translate(_EXTRA_FOLDS)
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+class _Node:
+    __slots__ = ('children', 'top')
+
+    def __init__(self):
+        self.children = {}
+        # Najveći gradovi ispod ovog čvora, već poređani - upit ne sortira
+        self.top = []
+
+
+class CityIndex:
+    """
+    Prefiksno stablo nad svedenim nazivima gradova
+
+    Grad se upisuje pod ceo naziv i pod svaku sledeću reč ("Novi Sad" i
+    "sad"), a svaki čvor pamti do AUTOCOMPLETE_MAX_RESULTS gradova po broju
+    stanovnika, pa je upit jedan prolaz kroz stablo dužine prefiksa.
+    """
+
+    def __init__(self, cities):
+        self.cities = {}
+        self.by_name = {}
+        self.root = _Node()
+        # Veći gradovi prvi - čvor puni top redom, a kod istih naziva pobeđuje veći
+        for city in sorted(cities, key=lambda city: (-city.population, city.name)):
+            self.cities[city.id] = city
+            name = fold(city.name)
+            if not name:
+                continue
+            self.by_name.setdefault(name, city.id)
+            words = name.split(' ')
+            for start in range(len(words)):
+                self._insert(' '.join(words[start:]), city.id)
+
+    def _insert(self, key, city_id):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            if len(node.top) < AUTOCOMPLETE_MAX_RESULTS and city_id not in node.top:
+                node.top.append(city_id)
+
+    def complete(self, prefix, limit=10):
+        """Gradovi čiji naziv (ili neka reč naziva) počinje sa prefix, po veličini"""
+        key = fold(prefix)
+        if not key:
+            return []
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [self.cities[city_id] for city_id in node.top[:limit]]
+
+    def city_name(self, city_id):
+        city = self.cities.get(city_id)
+        return city.name if city else None
+
+    def resolve(self, name):
+        key = fold(name)
+        return self.by_name.get(key) if key else None
+
+
+# ------------------------------------------------------------ indeks po procesu
+
+_index = None
+_index_version = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_city_index():
+    """Indeks ovog procesa, gradi se ponovo samo kada se verzija keša gradova promeni"""
+    global _index, _index_version, _index_checked_at
+
+    now = time.monotonic()
+    if _index is not None and now - _index_checked_at < CITY_INDEX_RECHECK_SECONDS:
+        return _index
+
+    with _index_lock:
+        if _index is not None and now - _index_checked_at < CITY_INDEX_RECHECK_SECONDS:
+            return _index
+        current = version(CITIES)
+        if _index is None or current != _index_version:
+            _index = CityIndex(city_list())
+            _index_version = current
+        _index_checked_at = time.monotonic()
+        return _index
+
+
+def invalidate_city_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+@receiver(post_save, sender=City, dispatch_uid='city_index_city_saved')
+@receiver(post_delete, sender=City, dispatch_uid='city_index_city_deleted')
+def _cities_changed(sender, **kwargs):
+    # Ostali procesi vide promenu preko verzije keša gradova
+    invalidate_city_index()
+
+
+def index_version():
+    """Verzija gradova od koje je građen indeks (ETag autocomplete-a)"""
+    get_city_index()
+    return _index_version
+
+
+def resolve_city_id(name):
+    """Id grada za uneti naziv ili None"""
+    return get_city_index().resolve(name)
+
+
+def autocomplete(prefix, limit=10):
+    """Do limit gradova za početak naziva, najveći prvi"""
+    return get_city_index().complete(prefix, min(limit, AUTOCOMPLETE_MAX_RESULTS))
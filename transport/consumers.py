@@ -1,8 +1,28 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
-from .models import Tour, Location, ChatMessage, Notification
+from django.http import QueryDict
+from .chat import can_chat, can_view_chat, chat_group, mark_read, message_event, post_message, read_event
+from .freight_board import BOARD_GROUP
+from .freight_search import matches, parse_filters
+from .models import Tour, Notification
+from .location_ingest import get_tour, record_tour_location
+
+
+@database_sync_to_async
+def tour_access(tour_id, user):
+    """
+    (sme da prati turu, da li je vozač ture) za korisnika iz scope-a
+
+    Turu prate vozač, naručilac pošiljke i osoblje.
+    """
+    try:
+        tour = get_tour(tour_id)
+    except (Tour.DoesNotExist, ValueError):
+        return False, False
+    is_driver = tour.driver_id == user.id
+    is_sender = tour.shipment is not None and tour.shipment.sender_id == user.id
+    return is_driver or is_sender or user.is_staff, is_driver
 
 
 class LocationConsumer(AsyncWebsocketConsumer):
@@ -10,6 +30,15 @@ class LocationConsumer(AsyncWebsocketConsumer):
         self.tour_id = self.scope['url_route']['kwargs']['tour_id']
         self.room_group_name = f'location_{self.tour_id}'
 
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close()
+            return
+        allowed, self.is_driver = await tour_access(self.tour_id, user)
+        if not allowed:
+            await self.close()
+            return
+
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -29,7 +58,8 @@ class LocationConsumer(AsyncWebsocketConsumer):
         text_data_json = json.loads(text_data)
         message_type = text_data_json['type']
 
-        if message_type == 'location_update':
+        # Poziciju šalje samo vozač ture, ostali je samo prate
+        if message_type == 'location_update' and self.is_driver:
             latitude = text_data_json['latitude']
             longitude = text_data_json['longitude']
             accuracy = text_data_json.get('accuracy')
@@ -62,20 +92,24 @@ class LocationConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def save_location(self, tour_id, latitude, longitude, accuracy):
         try:
-            tour = Tour.objects.get(id=tour_id)
-            Location.objects.create(
-                tour=tour,
-                latitude=latitude,
-                longitude=longitude,
-                accuracy=accuracy
-            )
-        except Tour.DoesNotExist:
+            tour = get_tour(tour_id)
+            # Upis ide kroz bafer (jedan bulk_create za više tačaka), uz proveru
+            # statusa i zona kao i HTTP put
+            record_tour_location(tour, float(latitude), float(longitude), accuracy)
+        except (Tour.DoesNotExist, ValueError):
             pass
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.user_id = self.scope['url_route']['kwargs']['user_id']
+        user = self.scope['user']
+        # user_id u putanji je opcion, ali mora biti ulogovani korisnik
+        requested_id = self.scope['url_route']['kwargs'].get('user_id')
+        if not user.is_authenticated or (requested_id is not None and requested_id != str(user.id)):
+            await self.close()
+            return
+
+        self.user_id = user.id
         self.room_group_name = f'notifications_{self.user_id}'
 
         # Join room group
@@ -88,10 +122,11 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
@@ -101,6 +136,19 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             notification_id = text_data_json['notification_id']
             await self.mark_notification_read(notification_id)
 
+    async def send_notification(self, event):
+        # Nova notifikacija (transport.notifications, posle upisa u bazu)
+        notification = event['notification']
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'id': notification['id'],
+            'title': notification['title'],
+            'message': notification['message'],
+            'notification_type': notification['notification_type'],
+            'timestamp': notification['created_at'],
+            'data': notification.get('data'),
+        }))
+
     async def notification_message(self, event):
         # Send notification to WebSocket
         await self.send(text_data=json.dumps({
@@ -114,7 +162,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def mark_notification_read(self, notification_id):
         try:
-            notification = Notification.objects.get(id=notification_id)
+            notification = Notification.objects.get(id=notification_id, user_id=self.user_id)
             notification.is_read = True
             notification.save()
         except Notification.DoesNotExist:
@@ -124,7 +172,16 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.tour_id = self.scope['url_route']['kwargs']['tour_id']
-        self.room_group_name = f'chat_{self.tour_id}'
+        self.room_group_name = chat_group(self.tour_id)
+
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        self.can_write = await self.chat_access()
+        if self.can_write is None:
+            await self.close()
+            return
 
         # Join room group
         await self.channel_layer.group_add(
@@ -143,52 +200,96 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-        user_id = text_data_json['user_id']
+        message_type = text_data_json.get('type', 'message')
 
-        # Save message to database
-        message_obj = await self.save_message(self.tour_id, user_id, message)
+        if message_type == 'message' and self.can_write:
+            message = str(text_data_json.get('message', '')).strip()
+            if not message:
+                return
+            # Pošiljalac je uvek ulogovani korisnik, ne user_id iz poruke
+            event = await self.save_message(message)
+            await self.channel_layer.group_send(self.room_group_name, event)
 
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message,
-                'user_id': user_id,
-                'username': message_obj['username'],
-                'timestamp': message_obj['timestamp']
-            }
-        )
+        elif message_type == 'read' and self.can_write:
+            # Zbirna potvrda - sve tuđe poruke do up_to_id (samo učesnici, ne osoblje)
+            try:
+                up_to_id = int(text_data_json.get('up_to_id', 0))
+            except (TypeError, ValueError):
+                return
+            if await self.mark_read(up_to_id):
+                await self.channel_layer.group_send(self.room_group_name, read_event(self.user.id, up_to_id))
 
     async def chat_message(self, event):
         # Send message to WebSocket
         await self.send(text_data=json.dumps({
             'type': 'chat_message',
+            'id': event['id'],
             'message': event['message'],
             'user_id': event['user_id'],
             'username': event['username'],
-            'timestamp': event['timestamp']
+            'timestamp': event['timestamp'],
+            'is_read': event['is_read'],
+        }))
+
+    async def chat_read(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'read_receipt',
+            'user_id': event['user_id'],
+            'up_to_id': event['up_to_id'],
         }))
 
     @database_sync_to_async
-    def save_message(self, tour_id, user_id, message):
+    def chat_access(self):
+        """True - sme da piše, False - samo čita (osoblje), None - bez pristupa"""
         try:
-            tour = Tour.objects.get(id=tour_id)
-            user = User.objects.get(id=user_id)
-            
-            chat_message = ChatMessage.objects.create(
-                tour=tour,
-                sender=user,
-                message=message
-            )
-            
-            return {
-                'username': user.username,
-                'timestamp': chat_message.timestamp.isoformat()
-            }
-        except (Tour.DoesNotExist, User.DoesNotExist):
-            return {
-                'username': 'Unknown',
-                'timestamp': ''
-            }
+            tour = get_tour(self.tour_id)
+        except (Tour.DoesNotExist, ValueError):
+            return None
+        if can_chat(tour, self.user):
+            return True
+        return False if can_view_chat(tour, self.user) else None
+
+    @database_sync_to_async
+    def save_message(self, message):
+        return message_event(post_message(get_tour(self.tour_id), self.user, message))
+
+    @database_sync_to_async
+    def mark_read(self, up_to_id):
+        return mark_read(self.tour_id, self.user.id, up_to_id)
+
+
+class FreightBoardConsumer(AsyncWebsocketConsumer):
+    """Promene berze tereta uživo (transport.freight_board), po filterima iz query string-a"""
+
+    async def connect(self):
+        if not self.scope['user'].is_authenticated:
+            await self.close()
+            return
+
+        # Isti GET parametri kao stranica berze (gradovi se razrešavaju preko indeksa gradova)
+        self.filters = await database_sync_to_async(parse_filters)(
+            QueryDict(self.scope.get('query_string', b'').decode('utf-8'))
+        )
+
+        await self.channel_layer.group_add(BOARD_GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'filters'):
+            await self.channel_layer.group_discard(BOARD_GROUP, self.channel_name)
+
+    async def board_change(self, event):
+        action = event['action']
+        shipment = event['shipment']
+        if action != 'removed' and not matches(self.filters, shipment):
+            if action == 'added':
+                return
+            # Izmenjena tako da više ne prolazi filtere ovog klijenta
+            action, shipment = 'removed', None
+        await self.send(text_data=json.dumps({
+            'type': 'board_change',
+            'version': event['version'],
+            'action': action,
+            'shipment_id': event['shipment_id'],
+            'shipment': shipment,
+        }))
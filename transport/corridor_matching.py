@@ -0,0 +1,332 @@
+"""
+Uparivanje pošiljki sa turama za dotovar
+
+Putanja svake aktivne ture (polilinija kroz gradove putne mreže, ili prava
+linija polazište-odredište) se deli na ćelije mreže proširene za širinu
+koridora. Za pošiljku se gledaju samo ture iz ćelija mesta preuzimanja i
+dostave, pa cena upita ne raste linearno sa brojem tura.
+
+Kada pošiljka postane objavljena, upis stavlja u red zadatak
+match_dotovar_tours (kao saved_searches), a worker obaveštava vozače
+tura na čijoj je putanji.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .freight_search import OPEN_STATUS
+from .geo import haversine_km
+from .models import Shipment, Tour
+from .notifications import fan_out
+from .road_graph import get_road_graph
+from .spatial_index import DEFAULT_CELL_SIZE_DEG, KM_PER_DEGREE_LAT
+from .tasks import enqueue, task
+
+# Najveće odstupanje mesta preuzimanja/dostave od putanje ture (km)
+CORRIDOR_WIDTH_KM = 10.0
+
+# Statusi tura koje još mogu da prime dotovar
+ACTIVE_TOUR_STATUSES = ['confirmed', 'in_progress', 'pickup_confirmed']
+
+# Koliko često (s) indeks dopunjava ture koje su izmenili drugi procesi
+INDEX_SYNC_SECONDS = 10
+
+# Ključne reči u Shipment.cargo_type koje odgovaraju tipu dotovara ture
+CARGO_KEYWORDS = {
+    'paleta': ('palet',),
+    'paketna_roba': ('paket',),
+    'rasuti_teret': ('rasut',),
+    'tečni_teret': ('tečn', 'tecn'),
+}
+CARGO_COMPATIBILITY = {
+    'paleta': {'paleta'},
+    'paketna_roba': {'paketna_roba'},
+    'paleta_paketna_roba': {'paleta', 'paketna_roba'},
+    'rasuti_teret': {'rasuti_teret'},
+    'tečni_teret': {'tečni_teret'},
+}
+
+
+def cargo_type_matches(tour_cargo_type, shipment_cargo_type):
+    """
+    Da li tura sa datim tipom dotovara može da primi teret pošiljke.
+    Slobodan tekst koji ne prepoznajemo ne isključuje turu.
+    """
+    text = (shipment_cargo_type or '').lower()
+    recognized = {key for key, words in CARGO_KEYWORDS.items() if any(word in text for word in words)}
+    if not recognized:
+        return True
+    return bool(recognized & CARGO_COMPATIBILITY.get(tour_cargo_type, set()))
+
+
+class TourCorridor:
+    """Polilinija ture sa kumulativnom dužinom po temenima"""
+
+    def __init__(self, tour_id, points, slobodna_kilaza, cargo_type):
+        self.tour_id = tour_id
+        self.points = points
+        self.slobodna_kilaza = float(slobodna_kilaza or 0)
+        self.cargo_type = cargo_type
+        self.cumulative = [0.0]
+        for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+            self.cumulative.append(self.cumulative[-1] + haversine_km(lat1, lng1, lat2, lng2))
+
+    @property
+    def length_km(self):
+        return self.cumulative[-1]
+
+    def locate(self, lat, lng):
+        """
+        Najbliža tačka polilinije - lokalna ekvidistantna projekcija oko tačke
+
+        Returns:
+            (odstupanje_km, pozicija_duž_ture_km)
+        """
+        scale_x = KM_PER_DEGREE_LAT * math.cos(math.radians(lat))
+        best = (math.inf, 0.0)
+        for index, ((lat1, lng1), (lat2, lng2)) in enumerate(zip(self.points, self.points[1:])):
+            ax, ay = (lng1 - lng) * scale_x, (lat1 - lat) * KM_PER_DEGREE_LAT
+            bx, by = (lng2 - lng) * scale_x, (lat2 - lat) * KM_PER_DEGREE_LAT
+            dx, dy = bx - ax, by - ay
+            length_sq = dx * dx + dy * dy
+            t = 0.0 if length_sq == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / length_sq))
+            px, py = ax + t * dx, ay + t * dy
+            offset = math.hypot(px, py)
+            if offset < best[0]:
+                segment = self.cumulative[index + 1] - self.cumulative[index]
+                best = (offset, self.cumulative[index] + t * segment)
+        return best
+
+
+class TourCorridorIndex:
+    """
+    Ćelija -> skup tura čiji koridor prolazi kroz ćeliju, po jedan indeks u procesu
+    """
+
+    def __init__(self, cell_size_deg=DEFAULT_CELL_SIZE_DEG, corridor_km=CORRIDOR_WIDTH_KM):
+        self.cell_size = cell_size_deg
+        self.corridor_km = corridor_km
+        self.cells = defaultdict(set)
+        self.corridors = {}
+        self._tour_cells = {}
+        self._lock = threading.Lock()
+        self._synced_at = None
+        self._checked_at = 0.0
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def _cells_along(self, points):
+        """Ćelije koje pokriva polilinija proširena za širinu koridora"""
+        cells = set()
+        step_km = self.cell_size * KM_PER_DEGREE_LAT / 2
+        pad_lat = self.corridor_km / KM_PER_DEGREE_LAT
+        for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+            steps = max(1, int(math.ceil(haversine_km(lat1, lng1, lat2, lng2) / step_km)))
+            for step in range(steps + 1):
+                lat = lat1 + (lat2 - lat1) * step / steps
+                lng = lng1 + (lng2 - lng1) * step / steps
+                pad_lng = self.corridor_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+                min_i, min_j = self._cell(lat - pad_lat, lng - pad_lng)
+                max_i, max_j = self._cell(lat + pad_lat, lng + pad_lng)
+                for i in range(min_i, max_i + 1):
+                    for j in range(min_j, max_j + 1):
+                        cells.add((i, j))
+        return cells
+
+    @staticmethod
+    def tour_polyline(tour, graph=None):
+        """
+        Polilinija ture: gradovi duž najkraćeg puta u putnoj mreži kada su
+        polazište i odredište poznati gradovi, inače prava linija između koordinata
+        """
+        graph = graph or get_road_graph()
+        start = end = None
+        if tour.polaziste_lat is not None and tour.polaziste_lng is not None:
+            start = (float(tour.polaziste_lat), float(tour.polaziste_lng))
+        if tour.odrediste_lat is not None and tour.odrediste_lng is not None:
+            end = (float(tour.odrediste_lat), float(tour.odrediste_lng))
+        start = start or graph.city_coordinates(tour.polaziste)
+        end = end or graph.city_coordinates(tour.odrediste)
+        if start is None or end is None:
+            return None
+
+        points = [start, end]
+        start_id, end_id = graph.city_id(tour.polaziste), graph.city_id(tour.odrediste)
+        if start_id is not None and end_id is not None:
+            path = graph.shortest_path(start_id, end_id)
+            if path is not None and len(path.nodes) > 2:
+                via = [graph.coordinates(city_id) for city_id in path.nodes[1:-1]]
+                if all(via):
+                    points = [start] + via + [end]
+        return points
+
+    def add(self, tour, graph=None):
+        self.remove(tour.id)
+        if tour.status not in ACTIVE_TOUR_STATUSES or not tour.slobodna_kilaza:
+            return
+        points = self.tour_polyline(tour, graph)
+        if points is None:
+            return
+
+        corridor = TourCorridor(tour.id, points, tour.slobodna_kilaza, tour.dostupno_za_dotovar)
+        cells = self._cells_along(points)
+        with self._lock:
+            self.corridors[tour.id] = corridor
+            self._tour_cells[tour.id] = cells
+            for cell in cells:
+                self.cells[cell].add(tour.id)
+
+    def remove(self, tour_id):
+        with self._lock:
+            self.corridors.pop(tour_id, None)
+            for cell in self._tour_cells.pop(tour_id, ()):
+                self.cells[cell].discard(tour_id)
+                if not self.cells[cell]:
+                    del self.cells[cell]
+
+    def sync(self, force=False):
+        """Učitava sve aktivne ture prvi put, posle toga samo izmenjene"""
+        now = time.monotonic()
+        if not force and self._synced_at is not None and now - self._checked_at < INDEX_SYNC_SECONDS:
+            return
+
+        started = timezone.now()
+        graph = get_road_graph()
+        if self._synced_at is None:
+            tours = Tour.objects.filter(status__in=ACTIVE_TOUR_STATUSES)
+        else:
+            tours = Tour.objects.filter(updated_at__gte=self._synced_at)
+        for tour in tours.iterator():
+            self.add(tour, graph)
+        self._synced_at = started
+        self._checked_at = time.monotonic()
+
+    def candidates(self, lat, lng):
+        with self._lock:
+            return set(self.cells.get(self._cell(lat, lng), ()))
+
+    def match(self, pickup, delivery, weight=0, cargo_type=''):
+        """
+        Ture čiji koridor pokriva preuzimanje i dostavu, tim redom
+
+        Returns:
+            list: [dict(tour_id, pickup_offset_km, delivery_offset_km, pickup_position_km,
+                        delivery_position_km)] sortirano po ukupnom odstupanju
+        """
+        self.sync()
+        tour_ids = self.candidates(*pickup) & self.candidates(*delivery)
+
+        matches = []
+        for tour_id in tour_ids:
+            corridor = self.corridors.get(tour_id)
+            if corridor is None or corridor.slobodna_kilaza < float(weight or 0):
+                continue
+            if not cargo_type_matches(corridor.cargo_type, cargo_type):
+                continue
+            pickup_offset, pickup_position = corridor.locate(*pickup)
+            delivery_offset, delivery_position = corridor.locate(*delivery)
+            if pickup_offset > self.corridor_km or delivery_offset > self.corridor_km:
+                continue
+            if pickup_position >= delivery_position:
+                continue  # tura ide u suprotnom smeru
+            matches.append({
+                'tour_id': tour_id,
+                'pickup_offset_km': round(pickup_offset, 1),
+                'delivery_offset_km': round(delivery_offset, 1),
+                'pickup_position_km': round(pickup_position, 1),
+                'delivery_position_km': round(delivery_position, 1),
+            })
+
+        matches.sort(key=lambda match: match['pickup_offset_km'] + match['delivery_offset_km'])
+        return matches
+
+
+tour_corridor_index = TourCorridorIndex()
+
+
+class DotovarMatchingEngine:
+    """
+    Pronalazi ture koje mogu da ponesu pošiljku kao dotovar
+    """
+
+    @classmethod
+    def match_tours(cls, shipment):
+        """
+        Ture čija putanja prolazi pored mesta preuzimanja pa dostave pošiljke,
+        sa dovoljno slobodne kilaže i odgovarajućim tipom tereta
+
+        Returns:
+            List[Tour]: Ture sortirane po odstupanju od putanje (atribut corridor_match)
+        """
+        graph = get_road_graph()
+        pickup = graph.city_coordinates(shipment.pickup_city)
+        delivery = graph.city_coordinates(shipment.delivery_city)
+        if pickup is None or delivery is None:
+            return []
+
+        # Slobodna kilaža se u formi ture unosi u tonama, kao i težina pošiljke
+        matches = tour_corridor_index.match(pickup, delivery, shipment.cargo_weight, shipment.cargo_type)
+        if not matches:
+            return []
+
+        by_id = {match['tour_id']: match for match in matches}
+        tours = Tour.objects.filter(id__in=by_id, status__in=ACTIVE_TOUR_STATUSES).select_related('driver', 'vehicle')
+        result = []
+        for tour in tours:
+            tour.corridor_match = by_id[tour.id]
+            result.append(tour)
+        result.sort(key=lambda tour: tour.corridor_match['pickup_offset_km'] + tour.corridor_match['delivery_offset_km'])
+        return result
+
+
+@receiver(post_save, sender=Tour, dispatch_uid='corridor_index_tour_saved')
+def _tour_saved(sender, instance, **kwargs):
+    if tour_corridor_index._synced_at is not None:
+        tour_corridor_index.add(instance)
+
+
+@receiver(post_delete, sender=Tour, dispatch_uid='corridor_index_tour_deleted')
+def _tour_deleted(sender, instance, **kwargs):
+    tour_corridor_index.remove(instance.id)
+
+
+# ------------------------------------------------------------ objava pošiljke
+
+@task('match_dotovar_tours')
+def match_dotovar_tours(shipment_id):
+    shipment = Shipment.objects.filter(pk=shipment_id, status=OPEN_STATUS).first()
+    if shipment is None:
+        # U međuvremenu povučena ili već prihvaćena
+        return
+    tours = [tour for tour in DotovarMatchingEngine.match_tours(shipment) if tour.driver_id != shipment.sender_id]
+    if not tours:
+        return
+    fan_out(
+        [tour.driver_id for tour in tours],
+        notification_type='dotovar',
+        title='Dotovar na vašoj putanji',
+        message=(
+            f'Pošiljka "{shipment.title}" od {shipment.pickup_city} do {shipment.delivery_city} '
+            f'({shipment.cargo_weight} t) je na putanji vaše ture'
+        ),
+        shipment=shipment,
+        data={
+            'shipment_id': shipment.id,
+            'tour_ids': [tour.id for tour in tours],
+            'weight': float(shipment.cargo_weight),
+        },
+    )
+
+
+@receiver(post_save, sender=Shipment, dispatch_uid='corridor_matching_shipment_published')
+def _shipment_published(sender, instance, raw=False, **kwargs):
+    # _previous_status postavlja freight_search pre upisa
+    if raw or instance.status != OPEN_STATUS or getattr(instance, '_previous_status', None) == OPEN_STATUS:
+        return
+    enqueue('match_dotovar_tours', {'shipment_id': instance.pk}, idempotency_key=f'dotovar-{instance.pk}')
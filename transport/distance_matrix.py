@@ -0,0 +1,182 @@
+"""
+Matrica rastojanja između svih parova gradova
+
+Za svaki par City se čuva najkraće rastojanje, vreme vožnje i putarina
+(CityDistance), tako da cenovnik i berza čitaju cenu para jednim upitom
+po jedinstvenom indeksu umesto da svaki put računaju rutu. Procena cene
+tereta sa mape (calculate_price_view) čita rastojanje preko road_distance_km.
+Puna izgradnja: `python manage.py build_distance_matrix`.
+Kada se promeni jedna deonica (Highway), ponovo se računaju samo gradovi
+čije najkraće stablo tu deonicu koristi ili bi je sada koristilo.
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import PRICING, get_or_compute, invalidate
+from .models import City, CityDistance, Highway
+from .road_graph import RoadGraph, get_road_graph
+
+# Tolerancija pri poređenju rastojanja (km)
+EPSILON_KM = 1e-6
+
+# Koliko daleko (km) tačka sa mape može biti od grada matrice
+SNAP_RADIUS_KM = 25.0
+
+
+class DistanceMatrix:
+    """
+    Čitanje i održavanje matrice CityDistance
+    """
+
+    @classmethod
+    def lookup(cls, origin_name, destination_name):
+        """
+        Vraća rastojanje, vreme i putarinu za par gradova
+
+        Returns:
+            dict ili None ako par nije u matrici (nema puta ili matrica nije izgrađena)
+        """
+        graph = get_road_graph()
+        return cls._pair(graph.city_id(origin_name), graph.city_id(destination_name))
+
+    @classmethod
+    def _pair(cls, origin_id, destination_id):
+        if origin_id is None or destination_id is None:
+            return None
+        return get_or_compute(PRICING, (origin_id, destination_id), lambda: CityDistance.objects.filter(
+            origin_id=origin_id, destination_id=destination_id
+        ).values('distance_km', 'travel_time_hours', 'toll_cost').first(), timeout=3600)
+
+    @classmethod
+    def road_distance_km(cls, pickup_lat, pickup_lng, delivery_lat, delivery_lng, snap_km=SNAP_RADIUS_KM):
+        """
+        Drumsko rastojanje između dve tačke sa mape: tačke se vezuju za
+        najbliži grad matrice, pa je rastojanje prilaz + par iz matrice + odlazak
+
+        Returns:
+            float ili None (tačka daleko od grada, isti grad ili par nije u matrici)
+        """
+        graph = get_road_graph()
+        origin = graph.nearest_city(float(pickup_lat), float(pickup_lng), snap_km)
+        destination = graph.nearest_city(float(delivery_lat), float(delivery_lng), snap_km)
+        if origin is None or destination is None or origin[0] == destination[0]:
+            return None
+        pair = cls._pair(origin[0], destination[0])
+        if not pair:
+            return None
+        return origin[1] + float(pair['distance_km']) + destination[1]
+
+    @classmethod
+    def rebuild(cls, graph=None, sources=None):
+        """
+        Računa redove matrice za zadate gradove polaska (podrazumevano sve)
+
+        Returns:
+            int: Broj upisanih redova
+        """
+        graph = graph or RoadGraph.load()
+        sources = list(graph.cities) if sources is None else [s for s in sources if s in graph.cities]
+
+        rows = []
+        for source in sources:
+            for target, (distance, travel_time, toll) in graph.single_source_costs(source).items():
+                if target == source:
+                    continue
+                rows.append(CityDistance(
+                    origin_id=source,
+                    destination_id=target,
+                    distance_km=round(distance, 3),
+                    travel_time_hours=round(travel_time, 3),
+                    toll_cost=round(toll, 2),
+                ))
+
+        with transaction.atomic():
+            CityDistance.objects.filter(origin_id__in=sources).delete()
+            CityDistance.objects.bulk_create(rows, batch_size=1000)
+        transaction.on_commit(lambda: invalidate(PRICING))
+
+        return len(rows)
+
+    @classmethod
+    def affected_sources(cls, start_city_id, end_city_id, old_distance=None, new_distance=None):
+        """
+        Gradovi čiji se redovi menjaju kada deonica start-end promeni dužinu
+
+        - stara deonica je bila "tesna" u stablu najkraćih puteva grada s
+          (d(s,a) + w_staro == d(s,b)) - možda je bila deo najkraćeg puta
+        - nova deonica skraćuje put od s (d(s,a) + w_novo < d(s,b))
+        """
+        distances = {}
+        for origin_id, destination_id, distance in CityDistance.objects.filter(
+            destination_id__in=[start_city_id, end_city_id]
+        ).values_list('origin_id', 'destination_id', 'distance_km'):
+            distances[(origin_id, destination_id)] = distance
+
+        def dist(source, city_id):
+            if source == city_id:
+                return 0.0
+            return distances.get((source, city_id))
+
+        affected = set()
+        for source in City.objects.values_list('id', flat=True):
+            for a, b in ((start_city_id, end_city_id), (end_city_id, start_city_id)):
+                to_a, to_b = dist(source, a), dist(source, b)
+                if to_a is None:
+                    continue
+                if old_distance is not None and to_b is not None and abs(to_a + old_distance - to_b) <= EPSILON_KM:
+                    affected.add(source)
+                if new_distance is not None and (to_b is None or to_a + new_distance < to_b - EPSILON_KM):
+                    affected.add(source)
+
+        # Krajnji gradovi deonice se uvek računaju ponovo (npr. prva deonica grada)
+        affected.update({start_city_id, end_city_id})
+        return affected
+
+    @classmethod
+    def update_for_highway(cls, old_edge, new_edge):
+        """
+        Inkrementalno ažuriranje posle promene jedne deonice
+
+        Args:
+            old_edge: (start_city_id, end_city_id, distance_km, highway_type, toll_road) pre promene ili None
+            new_edge: isto posle promene ili None
+        """
+        if not CityDistance.objects.exists():
+            return 0  # matrica još nije izgrađena
+
+        affected = set()
+        if old_edge:
+            affected |= cls.affected_sources(old_edge[0], old_edge[1], old_distance=old_edge[2])
+        if new_edge:
+            affected |= cls.affected_sources(new_edge[0], new_edge[1], new_distance=new_edge[2])
+
+        return cls.rebuild(sources=affected)
+
+
+def _highway_edge(highway):
+    return (highway.start_city_id, highway.end_city_id, float(highway.distance_km or 0),
+            highway.highway_type, highway.toll_road)
+
+
+@receiver(pre_save, sender=Highway, dispatch_uid='distance_matrix_highway_pre_save')
+def _remember_old_highway(sender, instance, **kwargs):
+    old = None
+    if instance.pk:
+        old = Highway.objects.filter(pk=instance.pk).first()
+    instance._matrix_old_edge = _highway_edge(old) if old else None
+
+
+@receiver(post_save, sender=Highway, dispatch_uid='distance_matrix_highway_saved')
+def _highway_saved(sender, instance, **kwargs):
+    old_edge = getattr(instance, '_matrix_old_edge', None)
+    new_edge = _highway_edge(instance)
+    if old_edge == new_edge:
+        return
+    transaction.on_commit(lambda: DistanceMatrix.update_for_highway(old_edge, new_edge))
+
+
+@receiver(post_delete, sender=Highway, dispatch_uid='distance_matrix_highway_deleted')
+def _highway_deleted(sender, instance, **kwargs):
+    old_edge = _highway_edge(instance)
+    transaction.on_commit(lambda: DistanceMatrix.update_for_highway(old_edge, None))
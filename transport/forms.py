@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
@@ -180,13 +182,16 @@ class TourForm(forms.ModelForm):
         label='Kapacitet (tone)'
     )
     
+    # Tura sa 0 t ne dobija ponude za dotovar (corridor_matching)
     slobodna_kilaza = forms.DecimalField(
         max_digits=10,
         decimal_places=2,
+        min_value=Decimal('0.01'),
         widget=forms.NumberInput(attrs={
             'class': 'form-control',
             'placeholder': 'Slobodna kilaža (t), npr. 2.2 ili 2.5',
-            'step': '0.1'
+            'step': '0.1',
+            'min': '0.01'
         }),
         label='Slobodna kilaža (t)'
     )
@@ -213,7 +218,8 @@ class TourForm(forms.ModelForm):
             try:
                 vehicle = Vehicle.objects.get(license_plate=vehicle_license, owner=user)
                 self.fields['vehicle'].initial = vehicle
-                # Popuni kapacitet na osnovu vozila
+                # Popuni kapacitet i slobodnu kilažu (prazno vozilo) na osnovu vozila
                 self.fields['kapacitet'].initial = vehicle.capacity
+                self.fields['slobodna_kilaza'].initial = vehicle.capacity
             except Vehicle.DoesNotExist:
                 pass
@@ -0,0 +1,161 @@
+"""
+Berza tereta uživo - promene umesto ponovnog učitavanja cele table
+
+Svaka promena objavljene pošiljke (dodata, izmenjena, skinuta sa berze -
+prihvaćena ponuda, otkazana, obrisana) upisuje se kao FreightBoardEvent,
+čiji je id verzija table. Posle commit-a promena ide WebSocket klijentima
+(grupa freight_board, FreightBoardConsumer ih filtrira po filterima
+klijenta), a klijent koji je bio odsutan traži "promene od verzije N"
+(changes_since) i dopunjava listu na mestu.
+
+Id događaja se dodeljuje pri upisu, a vidljiv je tek posle commit-a, pa
+transakcija sa događajem 10 može da se potvrdi posle događaja 11. Zato
+klijent ne napreduje do najveće viđene verzije, već do settled_version -
+poslednjeg događaja starijeg od FREIGHT_COMMIT_SETTLE_SECONDS - a novije
+promene dobija ponovo sledeći put (primena je idempotentna).
+
+Promene preko QuerySet.update/bulk_create ne prolaze kroz signale i ne
+stižu na tablu.
+"""
+import logging
+from datetime import timedelta
+from functools import partial
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .freight_search import OPEN_STATUS, filtered_queryset, serialize_shipment
+from .models import FreightBoardEvent, Shipment
+
+logger = logging.getLogger(__name__)
+
+BOARD_GROUP = 'freight_board'
+
+# Više promena od ovoga - klijentu je jeftinije da učita stranicu ponovo
+FREIGHT_CHANGES_LIMIT = 500
+BOARD_EVENT_RETENTION_DAYS = 2
+# Posle ovoliko sekundi smatramo da su potvrđene sve transakcije sa manjim id-jem
+FREIGHT_COMMIT_SETTLE_SECONDS = 10
+
+
+def current_version():
+    return FreightBoardEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def settled_version():
+    """Verzija do koje klijent sme da napreduje (sve starije promene su vidljive)"""
+    cutoff = timezone.now() - timedelta(seconds=FREIGHT_COMMIT_SETTLE_SECONDS)
+    settled = FreightBoardEvent.objects.filter(created_at__lt=cutoff).order_by('-id').values_list(
+        'id', flat=True
+    ).first()
+    if settled is None:
+        oldest = FreightBoardEvent.objects.order_by('id').values_list('id', flat=True).first()
+        return oldest - 1 if oldest else 0
+    return settled
+
+
+def record(shipment, action):
+    """Upisuje promenu (u tekućoj transakciji) i šalje je klijentima posle commit-a"""
+    event = FreightBoardEvent.objects.create(shipment_id=shipment.pk, action=action)
+    payload = serialize_shipment(shipment) if action != 'removed' else None
+    transaction.on_commit(partial(publish, dict(change(event.pk, action, shipment.pk, payload), type='board_change')))
+    return event
+
+
+def change(version, action, shipment_id, shipment=None):
+    """Jedna promena table (shipment je serialize_shipment, osim za removed)"""
+    return {'version': version, 'action': action, 'shipment_id': shipment_id, 'shipment': shipment}
+
+
+def publish(event):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(BOARD_GROUP, event)
+    except Exception:
+        logger.warning('Slanje promene berze v%s nije uspelo', event['version'], exc_info=True)
+
+
+def changes_since(version, filters, limit=FREIGHT_CHANGES_LIMIT):
+    """
+    Promene table posle verzije version, za klijenta sa datim filterima
+
+    Više promena iste pošiljke svodi se na jednu, prema njenom stanju sada:
+    pošiljka koja je i dalje na berzi i prolazi filtere stiže cela (added/
+    updated), a ostale kao removed.
+
+    Vraćaju se i promene novije od FREIGHT_COMMIT_SETTLE_SECONDS, ali nova
+    verzija staje pre njih, pa ih klijent dobija ponovo - do tada može da se
+    potvrdi transakcija sa manjim id-jem.
+
+    Returns:
+        (nova verzija, lista promena), ili (settled_version, None) kada
+        klijent treba ponovo da učita stranicu (previše promena ili su
+        stariji događaji već obrisani)
+    """
+    oldest = FreightBoardEvent.objects.order_by('id').values_list('id', flat=True).first()
+    if oldest is not None and version < oldest - 1:
+        return settled_version(), None
+
+    events = list(
+        FreightBoardEvent.objects.filter(id__gt=version).order_by('id')
+        .values_list('id', 'shipment_id', 'action', 'created_at')[:limit + 1]
+    )
+    if len(events) > limit:
+        return settled_version(), None
+    if not events:
+        return version, []
+
+    cutoff = timezone.now() - timedelta(seconds=FREIGHT_COMMIT_SETTLE_SECONDS)
+    settled = version
+    latest = {}
+    for event_id, shipment_id, action, created_at in events:
+        if created_at < cutoff:
+            settled = event_id
+        first_action = latest.get(shipment_id, (None, action))[1]
+        latest[shipment_id] = (event_id, 'added' if first_action == 'added' else action)
+
+    shipments = filtered_queryset(filters).filter(id__in=latest).select_related('sender').in_bulk()
+    changes = []
+    for shipment_id, (event_id, action) in sorted(latest.items(), key=lambda item: item[1][0]):
+        shipment = shipments.get(shipment_id)
+        if shipment is None:
+            changes.append(change(event_id, 'removed', shipment_id))
+        else:
+            changes.append(change(event_id, 'updated' if action == 'removed' else action,
+                                  shipment_id, serialize_shipment(shipment)))
+    return settled, changes
+
+
+def purge_events(days=BOARD_EVENT_RETENTION_DAYS):
+    """Briše stare promene (klijent sa starijom verzijom ponovo učitava stranicu)"""
+    # Poslednja ostaje - verzija table ne sme da se vrati na 0
+    deleted, _ = FreightBoardEvent.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=days)
+    ).exclude(id=current_version()).delete()
+    return deleted
+
+
+# ------------------------------------------------------------ signali
+
+@receiver(post_save, sender=Shipment, dispatch_uid='freight_board_shipment_saved')
+def _shipment_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # _previous_status postavlja freight_search pre upisa
+    was_open = getattr(instance, '_previous_status', None) == OPEN_STATUS
+    if instance.status == OPEN_STATUS:
+        record(instance, 'updated' if was_open else 'added')
+    elif was_open:
+        record(instance, 'removed')
+
+
+@receiver(post_delete, sender=Shipment, dispatch_uid='freight_board_shipment_deleted')
+def _shipment_deleted(sender, instance, **kwargs):
+    if instance.status == OPEN_STATUS:
+        record(instance, 'removed')
@@ -0,0 +1,183 @@
+"""
+Pretraga berze tereta (objavljene pošiljke)
+
+Gradovi se filtriraju po City id-ju (pickup_city_ref/delivery_city_ref),
+ne po icontains nad tekstom, a rezultati idu po (pickup_date, id) sa
+kursorom umesto OFFSET-a. Svaka kombinacija filtera je opseg jednog od
+indeksa (status, [grad,] pickup_date, id), pa stranica košta isto i kada
+je na berzi 100k+ pošiljki.
+"""
+import base64
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .cities import get_city_index, resolve_city_id
+from .models import Shipment
+
+FREIGHT_PAGE_SIZE = 30
+FREIGHT_MAX_PAGE_SIZE = 100
+
+# Ponuda prihvaćena -> pošiljka prelazi u in_progress, pa status pokriva i
+# nekadašnji exclude(prihvaćena ponuda)
+OPEN_STATUS = 'published'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@receiver(pre_save, sender=Shipment, dispatch_uid='freight_search_city_refs')
+def _resolve_city_refs(sender, instance, raw=False, **kwargs):
+    instance.pickup_city_ref_id = resolve_city_id(instance.pickup_city)
+    instance.delivery_city_ref_id = resolve_city_id(instance.delivery_city)
+
+    # Status pre ovog upisa - post_save prijemnici (saved_searches, freight_board)
+    # prepoznaju objavu i skidanje sa berze
+    if raw or instance._state.adding:
+        instance._previous_status = None
+    else:
+        instance._previous_status = Shipment.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+def encode_cursor(shipment):
+    raw = f'{shipment.pickup_date.isoformat()}|{shipment.pk}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        timestamp, shipment_id = raw.split('|')
+        pickup_date = parse_datetime(timestamp)
+        if pickup_date is None:
+            raise ValueError
+        return pickup_date, int(shipment_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def _city_filter(value):
+    """Id iz padajućeg menija ili naziv grada; neprepoznat grad -> 0 (bez rezultata)"""
+    value = value.strip()
+    if value.isdigit():
+        city_id = int(value)
+        return city_id if city_id in get_city_index().cities else 0
+    return resolve_city_id(value) or 0
+
+
+def parse_filters(params):
+    """
+    GET parametri berze -> rečnik filtera (neispravne vrednosti se preskaču)
+
+    pickup_city/delivery_city (id ili naziv), cargo_type, max_weight (t),
+    min_price (RSD), pickup_date (YYYY-MM-DD)
+    """
+    filters = {}
+    for key in ('pickup_city', 'delivery_city'):
+        value = params.get(key) or ''
+        if value.strip():
+            filters[key] = _city_filter(value)
+
+    cargo_type = (params.get('cargo_type') or '').strip()
+    if cargo_type:
+        filters['cargo_type'] = cargo_type
+
+    for key in ('max_weight', 'min_price'):
+        try:
+            value = Decimal(params.get(key) or '')
+        except InvalidOperation:
+            continue
+        if value.is_finite():
+            filters[key] = value
+
+    try:
+        # Ispravan oblik, ali nepostojeći datum (2024-02-30) -> ValueError
+        pickup_date = parse_date(params.get('pickup_date') or '')
+    except ValueError:
+        pickup_date = None
+    if pickup_date:
+        filters['pickup_date'] = pickup_date
+    return filters
+
+
+def filtered_queryset(filters):
+    shipments = Shipment.objects.filter(status=OPEN_STATUS)
+    if 'pickup_city' in filters:
+        shipments = shipments.filter(pickup_city_ref_id=filters['pickup_city'])
+    if 'delivery_city' in filters:
+        shipments = shipments.filter(delivery_city_ref_id=filters['delivery_city'])
+    if 'cargo_type' in filters:
+        shipments = shipments.filter(cargo_type__iexact=filters['cargo_type'])
+    if 'max_weight' in filters:
+        shipments = shipments.filter(cargo_weight__lte=filters['max_weight'])
+    if 'min_price' in filters:
+        shipments = shipments.filter(budget__gte=filters['min_price'])
+    if 'pickup_date' in filters:
+        # Opseg dana umesto __date, da važi indeks nad pickup_date
+        start = timezone.make_aware(datetime.combine(filters['pickup_date'], time.min))
+        shipments = shipments.filter(pickup_date__gte=start, pickup_date__lt=start + timedelta(days=1))
+    return shipments
+
+
+def search_shipments(filters, after=None, limit=FREIGHT_PAGE_SIZE):
+    """
+    Jedna stranica objavljenih pošiljki, od najranijeg preuzimanja
+
+    Args:
+        after: kursor iz prethodne stranice (next_cursor)
+
+    Returns:
+        (lista pošiljki, kursor sledeće stranice ili None)
+    """
+    shipments = filtered_queryset(filters)
+    if after:
+        pickup_date, shipment_id = decode_cursor(after)
+        shipments = shipments.filter(pickup_date__gte=pickup_date).filter(
+            Q(pickup_date__gt=pickup_date) | Q(pickup_date=pickup_date, id__gt=shipment_id)
+        )
+    page = list(shipments.select_related('sender').order_by('pickup_date', 'id')[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+def serialize_shipment(shipment):
+    return {
+        'id': shipment.id,
+        'title': shipment.title,
+        'sender': shipment.sender.username,
+        'pickup_city': shipment.pickup_city,
+        'pickup_city_id': shipment.pickup_city_ref_id,
+        'delivery_city': shipment.delivery_city,
+        'delivery_city_id': shipment.delivery_city_ref_id,
+        'cargo_type': shipment.cargo_type,
+        'cargo_weight': float(shipment.cargo_weight),
+        'cargo_volume': float(shipment.cargo_volume),
+        'budget': float(shipment.budget) if shipment.budget is not None else None,
+        'pickup_date': shipment.pickup_date.isoformat(),
+        'delivery_date': shipment.delivery_date.isoformat(),
+    }
+
+
+def matches(filters, shipment):
+    """Da li serijalizovana pošiljka (serialize_shipment) prolazi filtere berze"""
+    if 'pickup_city' in filters and shipment['pickup_city_id'] != filters['pickup_city']:
+        return False
+    if 'delivery_city' in filters and shipment['delivery_city_id'] != filters['delivery_city']:
+        return False
+    if 'cargo_type' in filters and shipment['cargo_type'].casefold() != filters['cargo_type'].casefold():
+        return False
+    if 'max_weight' in filters and shipment['cargo_weight'] > filters['max_weight']:
+        return False
+    if 'min_price' in filters and (shipment['budget'] is None or shipment['budget'] < filters['min_price']):
+        return False
+    if 'pickup_date' in filters:
+        pickup_date = timezone.localtime(parse_datetime(shipment['pickup_date'])).date()
+        if pickup_date != filters['pickup_date']:
+            return False
+    return True
@@ -0,0 +1,208 @@
+"""
+Geofence zone preuzimanja i dostave za ture
+
+Za svaku turu se jednom izračunaju dve kružne zone (polazište i odredište)
+sa opsegom u stepenima, pa provera jedne GPS tačke košta dva poređenja
+pravougaonika, a haversine se računa samo kada je tačka unutar opsega.
+Ulazak i izlazak iz zone se šalju kao `geofence_event` signal; podrazumevani
+prijemnik upisuje pickup_confirmed_at / delivery_confirmed_at pri prvom
+ulasku, menja status ture (uslovni UPDATE, uz ručno poslat post_save) i
+obaveštava naručioca. Tačke stižu kroz location_ingest.record_tour_location,
+i preko HTTP-a i preko WebSocket-a.
+"""
+import math
+import threading
+from typing import NamedTuple
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .geo import haversine_km
+from .models import Notification, Tour
+from .spatial_index import KM_PER_DEGREE_LAT
+
+PICKUP = 'pickup'
+DELIVERY = 'delivery'
+
+# Poluprečnik zone u km
+PICKUP_RADIUS_KM = 1.0
+DELIVERY_RADIUS_KM = 5.0
+
+# Izlazak se priznaje tek na ovoliko većem poluprečniku, da GPS šum na
+# ivici zone ne proizvodi niz ulazaka i izlazaka
+EXIT_RADIUS_FACTOR = 1.2
+
+ENTER = 'enter'
+EXIT = 'exit'
+
+# Polja ture od kojih se prave zone
+COORDINATE_FIELDS = frozenset(['polaziste_lat', 'polaziste_lng', 'odrediste_lat', 'odrediste_lng'])
+
+# Argumenti: tour (Tour), zone (PICKUP/DELIVERY), event (ENTER/EXIT),
+# latitude, longitude, timestamp
+geofence_event = Signal()
+
+
+class Geofence(NamedTuple):
+    zone: str
+    latitude: float
+    longitude: float
+    radius_km: float
+    min_lat: float
+    max_lat: float
+    min_lng: float
+    max_lng: float
+
+    @classmethod
+    def around(cls, zone, latitude, longitude, radius_km):
+        latitude, longitude = float(latitude), float(longitude)
+        outer_km = radius_km * EXIT_RADIUS_FACTOR
+        dlat = outer_km / KM_PER_DEGREE_LAT
+        dlng = outer_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01))
+        return cls(zone, latitude, longitude, radius_km,
+                   latitude - dlat, latitude + dlat, longitude - dlng, longitude + dlng)
+
+    def distance_km(self, latitude, longitude):
+        """Rastojanje do centra ili None ako je tačka van opsega spoljnog kruga"""
+        if not (self.min_lat <= latitude <= self.max_lat and self.min_lng <= longitude <= self.max_lng):
+            return None
+        return haversine_km(self.latitude, self.longitude, latitude, longitude)
+
+    def contains(self, latitude, longitude, was_inside=False):
+        distance = self.distance_km(latitude, longitude)
+        if distance is None:
+            return False
+        limit = self.radius_km * EXIT_RADIUS_FACTOR if was_inside else self.radius_km
+        return distance <= limit
+
+
+class TourGeofences:
+    """Zone jedne ture i zone u kojima se vozilo trenutno nalazi"""
+
+    def __init__(self, tour):
+        self.fences = []
+        if tour.polaziste_lat is not None and tour.polaziste_lng is not None:
+            self.fences.append(Geofence.around(PICKUP, tour.polaziste_lat, tour.polaziste_lng, PICKUP_RADIUS_KM))
+        if tour.odrediste_lat is not None and tour.odrediste_lng is not None:
+            self.fences.append(Geofence.around(DELIVERY, tour.odrediste_lat, tour.odrediste_lng, DELIVERY_RADIUS_KM))
+        self.inside = set()
+
+    def get(self, zone):
+        for fence in self.fences:
+            if fence.zone == zone:
+                return fence
+        return None
+
+    def transitions(self, latitude, longitude):
+        """[(zona, ENTER/EXIT)] koje je izazvala nova tačka"""
+        events = []
+        for fence in self.fences:
+            was_inside = fence.zone in self.inside
+            is_inside = fence.contains(latitude, longitude, was_inside)
+            if is_inside and not was_inside:
+                self.inside.add(fence.zone)
+                events.append((fence.zone, ENTER))
+            elif was_inside and not is_inside:
+                self.inside.discard(fence.zone)
+                events.append((fence.zone, EXIT))
+        return events
+
+
+class GeofenceEngine:
+    """
+    Zone aktivnih tura, po jedan keš u procesu
+
+    Zone se prave iz Tour objekta koji pozivalac već ima, pa provera
+    tačke ne ide u bazu; baza se dira samo kada se desi događaj.
+    """
+
+    def __init__(self):
+        self._tours = {}
+        self._lock = threading.Lock()
+
+    def fences_for(self, tour):
+        fences = self._tours.get(tour.pk)
+        if fences is None:
+            with self._lock:
+                fences = self._tours.setdefault(tour.pk, TourGeofences(tour))
+        return fences
+
+    def forget(self, tour_id):
+        with self._lock:
+            self._tours.pop(tour_id, None)
+
+    def check(self, tour, latitude, longitude, timestamp=None):
+        """
+        Obrađuje novu GPS tačku ture
+
+        Returns:
+            list: [(zona, događaj)] - prazna lista u velikoj većini poziva
+        """
+        latitude, longitude = float(latitude), float(longitude)
+        events = self.fences_for(tour).transitions(latitude, longitude)
+        if events:
+            timestamp = timestamp or timezone.now()
+            for zone, event in events:
+                geofence_event.send(sender=Tour, tour=tour, zone=zone, event=event,
+                                    latitude=latitude, longitude=longitude, timestamp=timestamp)
+        return events
+
+
+geofence_engine = GeofenceEngine()
+
+
+# Zona -> (polje potvrde, statusi iz kojih se prelazi, novi status, tip notifikacije, naslov)
+ZONE_CONFIRMATIONS = {
+    PICKUP: ('pickup_confirmed_at', ['confirmed', 'in_progress'], 'pickup_confirmed',
+             'pickup_confirmed', 'Vozilo je stiglo na preuzimanje'),
+    DELIVERY: ('delivery_confirmed_at', ['confirmed', 'in_progress', 'pickup_confirmed'], 'delivered',
+               'delivery_confirmed', 'Vozilo je stiglo na odredište'),
+}
+
+
+@receiver(geofence_event, dispatch_uid='geofence_confirm_arrival')
+def _confirm_arrival(sender, tour, zone, event, timestamp, **kwargs):
+    if event != ENTER:
+        return
+    field, from_statuses, status, notification_type, title = ZONE_CONFIRMATIONS[zone]
+    if getattr(tour, field) is not None:
+        return
+
+    # Uslovni UPDATE - samo prvi proces koji primeti ulazak upisuje potvrdu
+    tours = Tour.objects.filter(pk=tour.pk)
+    updated = tours.filter(**{f'{field}__isnull': True}).update(**{field: timestamp, 'updated_at': timezone.now()})
+    setattr(tour, field, timestamp)
+    if not updated:
+        return
+    if tours.filter(status__in=from_statuses).update(status=status):
+        tour.status = status
+        # UPDATE ne šalje post_save - prijemnici promene ture (keš tura, indeks
+        # koridora, kraj putanje) dobijaju ga ručno, sa novim statusom
+        post_save.send(sender=Tour, instance=tour, created=False, raw=False,
+                       using=tours.db, update_fields=frozenset([field, 'status', 'updated_at']))
+
+    if tour.shipment_id:
+        shipment = tour.shipment
+        Notification.objects.create(
+            user=shipment.sender,
+            notification_type=notification_type,
+            title=title,
+            message=f'{title} za pošiljku "{shipment.title}"',
+            shipment=shipment,
+            tour=tour
+        )
+    if zone == DELIVERY:
+        geofence_engine.forget(tour.pk)
+
+
+@receiver(post_save, sender=Tour, dispatch_uid='geofence_tour_saved')
+def _tour_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Koordinate su mogle da se promene - zone se prave ponovo pri sledećoj tački
+    if not created and (update_fields is None or not COORDINATE_FIELDS.isdisjoint(update_fields)):
+        geofence_engine.forget(instance.pk)
+
+
+@receiver(post_delete, sender=Tour, dispatch_uid='geofence_tour_deleted')
+def _tour_deleted(sender, instance, **kwargs):
+    geofence_engine.forget(instance.pk)
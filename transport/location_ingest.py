@@ -0,0 +1,333 @@
+"""
+Baferisan upis GPS tačaka ture (Location)
+
+Umesto jednog INSERT-a po tački, tačke se skupljaju u baferu procesa i
+upisuju jednim bulk_create kada se skupi LOCATION_FLUSH_SIZE tačaka ili
+prođe LOCATION_FLUSH_SECONDS od najstarije neupisane tačke. Pozadinska
+nit radi vremenski flush, a atexit upisuje ostatak pri gašenju workera.
+
+Ako baza ne stiže (flush pada ili traje), bafer raste najviše do
+LOCATION_BUFFER_LIMIT - pozivalac koji ga dostigne sam radi flush
+(backpressure), a ako ni to ne uspe, odbacuju se najstarije tačke.
+
+Isti modul drži kratkotrajni keš Tour objekata (vozač, naručilac,
+koordinate zona), da se tura ne učitava za svaku tačku; status se ipak
+čita iz baze (record_tour_location), jer ga menjaju i drugi workeri.
+
+Pre bafera tačke prolaze kroz DeadReckoningFilter (trajectory.py), pa se
+ne upisuju tačke koje su objašnjive brzinom i pravcem kretanja. Stanje
+filtera ture bez novih tačaka (završena u drugom workeru) se oslobađa
+posle TRACK_IDLE_SECONDS, a njena poslednja odbačena tačka upisuje.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .geofence import DELIVERY, ENTER, geofence_engine, geofence_event
+from .models import DriverLocation, Location, Tour
+from .positions import position_buffer, update_position
+from .trajectory import DeadReckoningFilter
+
+logger = logging.getLogger(__name__)
+
+LOCATION_FLUSH_SIZE = getattr(settings, 'LOCATION_FLUSH_SIZE', 200)
+LOCATION_FLUSH_SECONDS = getattr(settings, 'LOCATION_FLUSH_SECONDS', 2.0)
+LOCATION_BUFFER_LIMIT = getattr(settings, 'LOCATION_BUFFER_LIMIT', 10000)
+
+# Koliko dugo (s) keširani Tour važi u procesu koji ga nije menjao
+TOUR_CACHE_SECONDS = 30
+TOUR_CACHE_MAX = 5000
+
+# Koliko često (s) se oslobađa stanje filtera neaktivnih tura
+TRACK_EVICT_SECONDS = 60
+
+# Ture koje primaju GPS tačke
+ACTIVE_TOUR_STATUSES = ('confirmed', 'in_progress', 'pickup_confirmed')
+
+
+class LocationBuffer:
+    """
+    Bafer neupisanih Location objekata, po jedan u procesu
+    """
+
+    def __init__(self, flush_size=LOCATION_FLUSH_SIZE, flush_seconds=LOCATION_FLUSH_SECONDS,
+                 limit=LOCATION_BUFFER_LIMIT, companions=()):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.limit = limit
+        # Baferi koje ista nit prazni na svakom otkucaju (npr. trenutne pozicije)
+        self.companions = list(companions)
+        self.dropped = 0
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        # Nit se pokreće u procesu workera, ne u master procesu pre fork-a
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='location-ingest', daemon=True)
+            self._thread.start()
+
+    def add(self, tour_id, latitude, longitude, accuracy=None, timestamp=None):
+        """Dodaje tačku u bafer; upis u bazu je odložen"""
+        self.start()
+        location = Location(
+            tour_id=tour_id,
+            latitude=latitude,
+            longitude=longitude,
+            accuracy=accuracy,
+            timestamp=timestamp or timezone.now(),
+        )
+        with self._lock:
+            self._pending.append(location)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            size = len(self._pending)
+
+        if size >= self.limit:
+            # Backpressure - pozivalac čeka dok se bafer ne isprazni
+            self.flush()
+        elif size >= self.flush_size:
+            self._wakeup.set()
+        return location
+
+    def _take(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._oldest = None
+        return batch
+
+    def _requeue(self, batch):
+        """Vraća neupisane tačke na početak bafera, odbacuje najstarije preko limita"""
+        with self._lock:
+            self._pending = batch + self._pending
+            overflow = len(self._pending) - self.limit
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.dropped += overflow
+                logger.warning('Location bafer pun, odbačeno %s najstarijih tačaka', overflow)
+            if self._pending and self._oldest is None:
+                self._oldest = time.monotonic()
+
+    @staticmethod
+    def _without_deleted_tours(batch):
+        existing = set(Tour.objects.filter(
+            id__in={location.tour_id for location in batch}
+        ).values_list('id', flat=True))
+        return [location for location in batch if location.tour_id in existing]
+
+    def flush(self):
+        """
+        Upisuje sve neupisane tačke
+
+        Returns:
+            int: Broj upisanih tačaka
+        """
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            try:
+                try:
+                    Location.objects.bulk_create(batch, batch_size=500)
+                except IntegrityError:
+                    # Tura obrisana dok su njene tačke čekale u baferu
+                    batch = self._without_deleted_tours(batch)
+                    Location.objects.bulk_create(batch, batch_size=500)
+            except Exception:
+                logger.exception('Upis %s GPS tačaka nije uspeo', len(batch))
+                self._requeue(batch)
+                return 0
+            return len(batch)
+
+    def _due(self):
+        oldest = self._oldest
+        return bool(self._pending) and (
+            len(self._pending) >= self.flush_size
+            or (oldest is not None and time.monotonic() - oldest >= self.flush_seconds)
+        )
+
+    def flush_all(self):
+        self.flush()
+        for companion in self.companions:
+            companion.flush()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            close_old_connections()
+            if self._due():
+                self.flush()
+            for companion in self.companions:
+                companion.flush()
+
+
+location_buffer = LocationBuffer(companions=[position_buffer])
+atexit.register(location_buffer.flush_all)
+
+location_filter = DeadReckoningFilter()
+
+
+def record_position(driver_id, latitude, longitude, timestamp=None, **extra):
+    """Trenutna pozicija vozača za mapu flote - upis ide kroz istu pozadinsku nit"""
+    location_buffer.start()
+    update_position(driver_id, latitude, longitude, timestamp, **extra)
+
+
+def record_location(tour_id, latitude, longitude, accuracy=None, timestamp=None, speed=None, heading=None,
+                    driver_id=None):
+    """
+    Beleži GPS tačku ture preko filtera i bafera; uz driver_id i trenutnu
+    poziciju vozača (za svaku tačku, i onu koju filter odbaci)
+
+    Returns:
+        int: Broj tačaka predatih baferu (0 kada je tačka objašnjena predviđanjem)
+    """
+    timestamp = timestamp or timezone.now()
+    if driver_id is not None:
+        record_position(driver_id, latitude, longitude, timestamp, tour_id=tour_id,
+                        accuracy=accuracy, speed=speed, heading=heading)
+    fixes = location_filter.accept(tour_id, latitude, longitude, timestamp, speed, heading)
+    for fix_lat, fix_lng, fix_timestamp in fixes:
+        location_buffer.add(tour_id, fix_lat, fix_lng,
+                            accuracy if fix_timestamp == timestamp else None, fix_timestamp)
+    _evict_idle_tracks()
+    return len(fixes)
+
+
+_evicted_at = time.monotonic()
+
+
+def _evict_idle_tracks():
+    """Stanje filtera za ture bez tačaka (završene u drugom workeru) - kraj putanje ide u bafer"""
+    global _evicted_at
+    now = time.monotonic()
+    if now - _evicted_at < TRACK_EVICT_SECONDS:
+        return
+    _evicted_at = now
+    for tour_id, (latitude, longitude, timestamp) in location_filter.evict_idle(now):
+        location_buffer.add(tour_id, latitude, longitude, timestamp=timestamp)
+
+
+def record_tour_location(tour, latitude, longitude, accuracy=None, timestamp=None):
+    """
+    GPS tačka aktivne ture, ista za HTTP i WebSocket: upis (record_location)
+    i provera zona preuzimanja/dostave
+
+    Tour može biti iz keša (get_tour), pa se status čita iz baze - drugi
+    worker je možda već potvrdio preuzimanje ili završio turu. Prva tačka
+    potvrđene ture je prebacuje u in_progress uslovnim UPDATE-om.
+
+    Returns:
+        list: [(zona, događaj)] iz geofence_engine.check
+
+    Raises:
+        Tour.DoesNotExist: tura ne postoji ili više nije aktivna
+    """
+    tours = Tour.objects.filter(pk=tour.pk)
+    status = tours.values_list('status', flat=True).first()
+    if status == 'confirmed':
+        if tours.filter(status='confirmed').update(status='in_progress', updated_at=timezone.now()):
+            status = tour.status = 'in_progress'
+            # UPDATE ne šalje post_save - prijemnici promene ture ga dobijaju ručno
+            post_save.send(sender=Tour, instance=tour, created=False, raw=False,
+                           using=tours.db, update_fields=frozenset(['status', 'updated_at']))
+        else:
+            # Drugi worker je upravo promenio status
+            status = tours.values_list('status', flat=True).first()
+    if status not in ACTIVE_TOUR_STATUSES:
+        forget_tour(tour.pk)
+        raise Tour.DoesNotExist
+    tour.status = status
+
+    timestamp = timestamp or timezone.now()
+    record_location(tour.id, latitude, longitude, accuracy, timestamp, driver_id=tour.driver_id)
+    return geofence_engine.check(tour, latitude, longitude, timestamp)
+
+
+# ------------------------------------------------------------ keš tura
+
+_tours = {}
+_tours_lock = threading.Lock()
+
+
+def get_tour(tour_id):
+    """
+    Tour iz keša procesa (sa shipment), iz baze najviše jednom u TOUR_CACHE_SECONDS
+
+    Raises:
+        Tour.DoesNotExist
+    """
+    tour_id = int(tour_id)
+    cached = _tours.get(tour_id)
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < TOUR_CACHE_SECONDS:
+        return cached[0]
+
+    tour = Tour.objects.select_related('shipment').get(id=tour_id)
+    with _tours_lock:
+        if len(_tours) >= TOUR_CACHE_MAX:
+            for key in [key for key, (_, loaded_at) in _tours.items() if now - loaded_at >= TOUR_CACHE_SECONDS]:
+                del _tours[key]
+        _tours[tour_id] = (tour, now)
+    return tour
+
+
+def forget_tour(tour_id):
+    with _tours_lock:
+        _tours.pop(tour_id, None)
+
+
+def finish_track(tour_id):
+    """Tura je završena - poslednja odbačena tačka je kraj putanje i mora da se upiše"""
+    last_fix = location_filter.forget(tour_id)
+    if last_fix is not None:
+        location_buffer.add(tour_id, last_fix[0], last_fix[1], timestamp=last_fix[2])
+
+
+@receiver(post_save, sender=Tour, dispatch_uid='location_ingest_tour_saved')
+def _tour_saved(sender, instance, **kwargs):
+    forget_tour(instance.pk)
+    if instance.status not in ACTIVE_TOUR_STATUSES:
+        finish_track(instance.pk)
+
+
+@receiver(post_delete, sender=Tour, dispatch_uid='location_ingest_tour_deleted')
+def _tour_deleted(sender, instance, **kwargs):
+    forget_tour(instance.pk)
+    location_filter.forget(instance.pk)
+
+
+@receiver(post_save, sender=DriverLocation, dispatch_uid='location_ingest_driver_location_saved')
+def _driver_location_saved(sender, instance, created, **kwargs):
+    if created:
+        record_position(instance.driver_id, instance.latitude, instance.longitude, instance.timestamp,
+                        accuracy=instance.accuracy, speed=instance.speed, heading=instance.heading,
+                        is_active=instance.is_active)
+
+
+@receiver(geofence_event, dispatch_uid='location_ingest_delivery_reached')
+def _delivery_reached(sender, tour, zone, event, **kwargs):
+    if zone == DELIVERY and event == ENTER:
+        finish_track(tour.pk)
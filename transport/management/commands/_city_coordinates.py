@@ -0,0 +1,76 @@
+# Približne koordinate centara gradova (lat, lng) za učitavanje City tabele
+CITY_COORDINATES = {
+    'Aranđelovac': (44.3069, 20.5600),
+    'Arilje': (43.7531, 20.0950),
+    'Barajevo': (44.5800, 20.4156),
+    'Bela Crkva': (44.8975, 21.4172),
+    'Beograd': (44.8125, 20.4612),
+    'Blace': (43.2906, 21.2842),
+    'Bor': (44.0747, 22.0958),
+    'Bujanovac': (42.4614, 21.7669),
+    'Grocka': (44.6706, 20.7175),
+    'Inđija': (45.0481, 20.0817),
+    'Ivanjica': (43.5817, 20.2297),
+    'Jagodina': (43.9772, 21.2612),
+    'Kikinda': (45.8297, 20.4653),
+    'Kladovo': (44.6067, 22.6069),
+    'Kosovska Mitrovica': (42.8914, 20.8660),
+    'Kovin': (44.7475, 20.9761),
+    'Kragujevac': (44.0128, 20.9114),
+    'Kraljevo': (43.7258, 20.6894),
+    'Krupanj': (44.3667, 19.3617),
+    'Kuršumlija': (43.1406, 21.2714),
+    'Lazarevac': (44.3853, 20.2558),
+    'Leskovac': (42.9981, 21.9461),
+    'Ljubovija': (44.1875, 19.3725),
+    'Loznica': (44.5339, 19.2236),
+    'Majdanpek': (44.4214, 21.9336),
+    'Mali Zvornik': (44.3733, 19.1067),
+    'Mladenovac': (44.4408, 20.6942),
+    'Negotin': (44.2264, 22.5308),
+    'Niš': (43.3209, 21.8958),
+    'Novi Beograd': (44.8086, 20.4156),
+    'Novi Pazar': (43.1367, 20.5122),
+    'Novi Sad': (45.2671, 19.8335),
+    'Obrenovac': (44.6550, 20.2000),
+    'Opovo': (45.0522, 20.4303),
+    'Pančevo': (44.8708, 20.6403),
+    'Paraćin': (43.8608, 21.4078),
+    'Peć': (42.6593, 20.2883),
+    'Pećinci': (44.9089, 19.9656),
+    'Pirot': (43.1531, 22.5861),
+    'Požarevac': (44.6200, 21.1869),
+    'Priboj': (43.5836, 19.5253),
+    'Prizren': (42.2139, 20.7397),
+    'Prokuplje': (43.2342, 21.5881),
+    'Ruma': (45.0081, 19.8222),
+    'Sjenica': (43.2731, 19.9992),
+    'Smederevo': (44.6628, 20.9300),
+    'Smederevska Palanka': (44.3655, 20.9587),
+    'Sombor': (45.7733, 19.1150),
+    'Sopot': (44.5194, 20.5753),
+    'Sremska Mitrovica': (44.9764, 19.6122),
+    'Stara Pazova': (44.9850, 20.1608),
+    'Subotica': (46.1000, 19.6650),
+    'Surdulica': (42.6906, 22.1700),
+    'Užice': (43.8556, 19.8425),
+    'Valjevo': (44.2750, 19.8981),
+    'Vladičin Han': (42.7078, 22.0639),
+    'Vranje': (42.5514, 21.9003),
+    'Vršac': (45.1167, 21.3036),
+    'Zaječar': (43.9036, 22.2847),
+    'Zemun': (44.8458, 20.4011),
+    'Zrenjanin': (45.3817, 20.3861),
+    'Ćuprija': (43.9275, 21.3700),
+    'Čajetina': (43.7497, 19.7147),
+    'Čačak': (43.8914, 20.3497),
+    'Šabac': (44.7558, 19.6939),
+}
+
+
+def with_coordinates(city_data):
+    """Dopunjuje podatke o gradu koordinatama ako su poznate"""
+    coordinates = CITY_COORDINATES.get(city_data['name'])
+    if coordinates:
+        city_data = dict(city_data, latitude=coordinates[0], longitude=coordinates[1])
+    return city_data
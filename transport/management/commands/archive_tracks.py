@@ -0,0 +1,172 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from transport.models import DriverLocation, Location
+
+# Tabela -> (model, kolone koje se arhiviraju)
+ARCHIVED_TABLES = {
+    'location': (Location, ('id', 'tour_id', 'latitude', 'longitude', 'accuracy', 'timestamp')),
+    'driverlocation': (DriverLocation, ('id', 'driver_id', 'latitude', 'longitude', 'accuracy',
+                                        'speed', 'heading', 'is_active', 'timestamp')),
+}
+
+
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value):
+    return value.replace(year=value.year + 1, month=1) if value.month == 12 else value.replace(month=value.month + 1)
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Command(BaseCommand):
+    help = 'Premešta GPS istoriju stariju od zadržavanja u kompresovane mesečne arhive (JSON Lines + gzip)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.TRACK_RETENTION_MONTHS,
+                            help=f'Koliko punih meseci ostaje u bazi (podrazumevano {settings.TRACK_RETENTION_MONTHS})')
+        parser.add_argument('--archive-dir', default=settings.TRACK_ARCHIVE_DIR,
+                            help='Direktorijum za arhive na trajnom disku (podrazumevano TRACK_ARCHIVE_DIR)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Samo prikaži koliko bi redova bilo arhivirano')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if not options['dry_run']:
+            options['archive_dir'] = self._durable_dir(options['archive_dir'])
+
+        cutoff = _month_start(timezone.now())
+        for _ in range(options['months']):
+            cutoff = _month_start(cutoff - timedelta(days=1))
+
+        total = 0
+        for table, (model, columns) in ARCHIVED_TABLES.items():
+            oldest = model.objects.filter(timestamp__lt=cutoff).order_by('timestamp').values_list(
+                'timestamp', flat=True
+            ).first()
+            if oldest is None:
+                continue
+
+            month = _month_start(oldest)
+            while month < cutoff:
+                end = _next_month(month)
+                rows = model.objects.filter(timestamp__gte=month, timestamp__lt=end)
+                if options['dry_run']:
+                    count = rows.count()
+                else:
+                    count = self._archive_month(table, model, columns, rows, month, options)
+                if count:
+                    self.stdout.write(f'{table} {month:%Y-%m}: {count} redova')
+                total += count
+                month = end
+
+        action = 'bi bilo arhivirano' if options['dry_run'] else 'arhivirano'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n🗄️ Završeno! Pre {cutoff:%Y-%m-%d} {action} {total} redova '
+                f'({time.monotonic() - started:.2f}s)'
+            )
+        )
+
+    def _durable_dir(self, directory):
+        """Arhivirani redovi se brišu iz baze - arhiva ne sme biti na disku koji nestaje pri deploy-u"""
+        if not directory:
+            raise CommandError('TRACK_ARCHIVE_DIR nije podešen - podesite direktorijum na trajnom disku '
+                               '(npr. /var/data/tracks) ili --archive-dir')
+        directory = os.path.realpath(directory)
+        if directory == str(settings.BASE_DIR) or directory.startswith(os.path.join(str(settings.BASE_DIR), '')):
+            raise CommandError(f'{directory} je unutar direktorijuma aplikacije, koji se briše pri deploy-u - '
+                               'arhiva mora biti na trajnom disku')
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def _archive_path(self, directory, table, month):
+        path = os.path.join(directory, f'{table}-{month:%Y-%m}.jsonl.gz')
+        suffix = 1
+        # Kasno pristigli redovi za već arhiviran mesec idu u novi fajl
+        while os.path.exists(path):
+            path = os.path.join(directory, f'{table}-{month:%Y-%m}.{suffix}.jsonl.gz')
+            suffix += 1
+        return path
+
+    def _write(self, archive, columns, rows, batch_size):
+        """
+        Upisuje mesec u arhivu u delovima po id-ju (bez sortiranja celog meseca)
+
+        Returns:
+            [(prvi id, poslednji id, broj redova)] po delu
+        """
+        batches = []
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id).order_by('id').values_list(*columns)[:batch_size])
+            if not batch:
+                return batches
+            for row in batch:
+                record = dict(zip(columns, row))
+                record['latitude'] = str(record['latitude'])
+                record['longitude'] = str(record['longitude'])
+                record['timestamp'] = record['timestamp'].isoformat()
+                archive.write(json.dumps(record, separators=(',', ':')) + '\n')
+            last_id = batch[-1][0]
+            batches.append((batch[0][0], last_id, len(batch)))
+
+    @staticmethod
+    def _verify(path, batches):
+        """Čita arhivu ponovo (gzip proverava CRC) i poredi id-jeve sa upisanim delovima"""
+        expected = sum(count for _, _, count in batches)
+        count = 0
+        last_id = None
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                last_id = json.loads(line)['id']
+                count += 1
+        if count != expected or last_id != batches[-1][1]:
+            raise CommandError(f'Arhiva {path} nije ispravna ({count} od {expected} redova) - ništa nije obrisano')
+
+    def _archive_month(self, table, model, columns, rows, month, options):
+        """Upisuje mesec u arhivu, proverava je, pa tek onda briše redove iz baze"""
+        path = self._archive_path(options['archive_dir'], table, month)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as raw:
+            with gzip.open(raw, 'wt', encoding='utf-8') as archive:
+                batches = self._write(archive, columns, rows, options['batch_size'])
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        if not batches:
+            os.remove(temporary)
+            return 0
+        self._verify(temporary, batches)
+        os.replace(temporary, path)
+        _fsync_dir(options['archive_dir'])
+
+        # Brisanje po opsezima id-jeva iz arhive; red koji je u opseg upisan
+        # posle čitanja nije u arhivi - ceo deo se vraća i komanda staje
+        total = 0
+        for first_id, last_id, count in batches:
+            with transaction.atomic():
+                deleted = rows.filter(id__gte=first_id, id__lte=last_id).delete()[1].get(model._meta.label, 0)
+                if deleted != count:
+                    raise CommandError(
+                        f'{table} {month:%Y-%m}: id {first_id}-{last_id} ima {deleted} redova, '
+                        f'a arhivirano je {count} - deo nije obrisan, pokrenite komandu ponovo'
+                    )
+            total += deleted
+        return total
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transport.distance_matrix import DistanceMatrix
+from transport.models import City
+from transport.road_graph import RoadGraph
+
+
+class Command(BaseCommand):
+    help = 'Računa matricu najkraćih rastojanja, vremena i putarine za sve parove gradova'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--city', action='append', dest='cities',
+            help='Ponovo izračunaj samo redove za navedeni grad polaska (može više puta)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        graph = RoadGraph.load()
+
+        sources = None
+        if options['cities']:
+            sources = []
+            for name in options['cities']:
+                city_id = graph.city_id(name)
+                if city_id is None:
+                    self.stdout.write(self.style.ERROR(f'Grad nije pronađen: {name}'))
+                    return
+                sources.append(city_id)
+
+        rows = DistanceMatrix.rebuild(graph=graph, sources=sources)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n📏 Završeno! Gradova: {len(sources) if sources else City.objects.count()}, '
+                f'upisano parova: {rows} ({time.monotonic() - started:.2f}s)'
+            )
+        )
@@ -0,0 +1,115 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from transport.models import DriverLocation, Location, Tour, TrackCompaction
+from transport.trajectory import SIMPLIFY_TOLERANCE_M, douglas_peucker
+
+# Pauza duža od ovoga deli istoriju vozača na zasebne vožnje
+SESSION_GAP = timedelta(minutes=10)
+
+FINISHED_TOUR_STATUSES = ['delivered', 'completed', 'cancelled']
+
+# TrackCompaction.table za istoriju vozača
+DRIVER_HISTORY = 'driverlocation'
+
+
+class Command(BaseCommand):
+    help = 'Uprošćava stare GPS putanje (Douglas-Peucker) i briše suvišne tačke'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+                            help='Kompaktiraj samo putanje starije od ovoliko dana (podrazumevano 7)')
+        parser.add_argument('--tolerance', type=float, default=SIMPLIFY_TOLERANCE_M,
+                            help=f'Najveće odstupanje uprošćene linije u metrima (podrazumevano {SIMPLIFY_TOLERANCE_M})')
+        parser.add_argument('--dry-run', action='store_true', help='Samo prikaži koliko bi tačaka bilo obrisano')
+        parser.add_argument('--skip-drivers', action='store_true', help='Ne diraj istoriju DriverLocation')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        tolerance = options['tolerance']
+        dry_run = options['dry_run']
+
+        # Svaka putanja se uprošćava jednom - ponovni prolaz bi povećao odstupanje preko tolerancije
+        total, removed = 0, 0
+        tours = Tour.objects.filter(
+            status__in=FINISHED_TOUR_STATUSES, updated_at__lt=cutoff, track_compacted_at__isnull=True
+        )
+        for tour_id in tours.values_list('id', flat=True).iterator():
+            rows = list(Location.objects.filter(tour_id=tour_id).order_by('timestamp', 'id').values_list(
+                'id', 'latitude', 'longitude'
+            ))
+            drop = self._redundant_ids(rows, tolerance)
+            total += len(rows)
+            removed += len(drop)
+            if not dry_run:
+                with transaction.atomic():
+                    self._delete(Location, drop)
+                    # update() ne menja updated_at ture
+                    Tour.objects.filter(id=tour_id).update(track_compacted_at=timezone.now())
+        self.stdout.write(f'Ture: {removed} od {total} tačaka je suvišno')
+
+        if not options['skip_drivers']:
+            # Istorija vozača pre vodostaja je već uprošćena
+            watermark = TrackCompaction.objects.filter(table=DRIVER_HISTORY).values_list(
+                'compacted_until', flat=True
+            ).first()
+            history = DriverLocation.objects.filter(timestamp__lt=cutoff)
+            if watermark is not None:
+                history = history.filter(timestamp__gte=watermark)
+
+            driver_total, driver_removed = 0, 0
+            driver_ids = history.order_by().values_list('driver_id', flat=True).distinct()
+            for driver_id in driver_ids.iterator():
+                rows = history.filter(driver_id=driver_id).order_by(
+                    'timestamp', 'id'
+                ).values_list('id', 'latitude', 'longitude', 'timestamp', 'is_active')
+                drop = []
+                for session in self._sessions(rows.iterator()):
+                    driver_total += len(session)
+                    drop.extend(self._redundant_ids(session, tolerance))
+                driver_removed += len(drop)
+                if drop and not dry_run:
+                    self._delete(DriverLocation, drop)
+            if not dry_run and (watermark is None or watermark < cutoff):
+                TrackCompaction.objects.update_or_create(table=DRIVER_HISTORY, defaults={'compacted_until': cutoff})
+            self.stdout.write(f'Vozači: {driver_removed} od {driver_total} tačaka je suvišno')
+            total += driver_total
+            removed += driver_removed
+
+        action = 'bi bilo obrisano' if dry_run else 'obrisano'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n🗜️ Završeno! Od {total} tačaka {action} {removed} '
+                f'({(removed / total * 100) if total else 0:.1f}%, {time.monotonic() - started:.2f}s)'
+            )
+        )
+
+    @staticmethod
+    def _redundant_ids(rows, tolerance):
+        if len(rows) <= 2:
+            return []
+        kept = set(douglas_peucker([row[1] for row in rows], [row[2] for row in rows], tolerance).tolist())
+        return [row[0] for index, row in enumerate(rows) if index not in kept]
+
+    @staticmethod
+    def _sessions(rows):
+        """Deli istoriju na vožnje po pauzama i promenama is_active (one se uvek čuvaju)"""
+        session = []
+        for row in rows:
+            if session and (row[3] - session[-1][3] > SESSION_GAP or row[4] != session[-1][4]):
+                yield session
+                session = []
+            session.append(row)
+        if session:
+            yield session
+
+    @staticmethod
+    def _delete(model, ids, chunk=1000):
+        with transaction.atomic():
+            for start in range(0, len(ids), chunk):
+                model.objects.filter(id__in=ids[start:start + chunk]).delete()
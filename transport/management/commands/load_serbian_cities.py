@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from transport.models import City, Highway
+from ._city_coordinates import with_coordinates
 
 class Command(BaseCommand):
     help = 'Load Serbian cities and highways data'
@@ -64,7 +65,7 @@ class Command(BaseCommand):
             {'name': 'Čajetina', 'postal_code': '31250', 'region': 'Centralna Srbija', 'district': 'Zlatibor', 'population': 2743, 'is_major': False},
         ]
         
-        for city_data in cities_data:
+        for city_data in map(with_coordinates, cities_data):
             city, created = City.objects.get_or_create(
                 name=city_data['name'],
                 postal_code=city_data['postal_code'],
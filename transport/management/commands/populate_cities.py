@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from transport.models import City
+from ._city_coordinates import with_coordinates
 
 class Command(BaseCommand):
     help = 'Popunjava bazu gradova Srbije sa poštanskim brojevima'
@@ -81,7 +82,7 @@ class Command(BaseCommand):
         created_count = 0
         updated_count = 0
 
-        for city_data in cities_data:
+        for city_data in map(with_coordinates, cities_data):
             city, created = City.objects.get_or_create(
                 name=city_data['name'],
                 postal_code=city_data['postal_code'],
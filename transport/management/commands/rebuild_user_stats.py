@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transport.user_stats import rebuild
+
+# Koliko id-jeva korisnika sa pogrešnim redom prikazati
+SHOW_MISMATCHES = 20
+
+
+class Command(BaseCommand):
+    help = 'Proverava brojače dashboard-a (UserStats) prema pošiljkama, vozilima i ponudama i ispravlja ih'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Samo proveri - bez izmena, izlazi sa greškom ako se brojači ne slažu')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Redova po bulk upisu (podrazumevano 500)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        check = options['check']
+        checked, mismatched = rebuild(fix=not check, batch_size=options['batch_size'])
+
+        if mismatched:
+            shown = ', '.join(str(user_id) for user_id in mismatched[:SHOW_MISMATCHES])
+            more = '…' if len(mismatched) > SHOW_MISMATCHES else ''
+            self.stdout.write(f'Korisnici: {shown}{more}')
+            if check:
+                raise CommandError(f'Brojači {len(mismatched)} korisnika nisu usklađeni (pokrenite bez --check)')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n📊 Završeno! Provereno {checked} korisnika, '
+                f'{"neusklađeno" if check else "ispravljeno"} {len(mismatched)} ({time.monotonic() - started:.1f} s)'
+            )
+        )
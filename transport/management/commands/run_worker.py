@@ -0,0 +1,73 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from transport.freight_board import purge_events
+from transport.tasks import TASK_BATCH_SIZE, TASK_RETENTION_DAYS, claim, execute, purge
+
+# Koliko često worker briše stare završene zadatke
+PURGE_EVERY_SECONDS = 3600
+
+
+class Command(BaseCommand):
+    help = 'Izvršava pozadinske zadatke iz reda BackgroundTask (transport/tasks.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Izvrši dospele zadatke i izađi')
+        parser.add_argument('--batch', type=int, default=TASK_BATCH_SIZE,
+                            help=f'Zadataka po preuzimanju (podrazumevano {TASK_BATCH_SIZE})')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Pauza u sekundama kada nema zadataka (podrazumevano 1)')
+        parser.add_argument('--retention-days', type=int, default=TASK_RETENTION_DAYS,
+                            help=f'Završeni zadaci stariji od ovoga se brišu (podrazumevano {TASK_RETENTION_DAYS})')
+
+    def handle(self, *args, **options):
+        # Bez DATABASE_URL worker bi čitao SQLite na sopstvenom disku i nikada
+        # ne bi video zadatke koje upisuje web servis
+        if connection.vendor == 'sqlite' and not settings.DEBUG:
+            raise CommandError('Worker koristi lokalnu SQLite bazu - podesite DATABASE_URL na istu bazu '
+                               'kao web servis')
+
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        # Render/systemd šalju SIGTERM - zadatak u toku se završi pre izlaska
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(f'Worker {worker} pokrenut')
+        done = failed = 0
+        last_purge = 0.0
+        while not self.stopping:
+            close_old_connections()
+            if time.monotonic() - last_purge >= PURGE_EVERY_SECONDS:
+                purged = purge(options['retention_days'])
+                if purged:
+                    self.stdout.write(f'Obrisano {purged} starih završenih zadataka')
+                # Stare promene berze (klijenti sa starijom verzijom učitavaju stranicu ponovo)
+                purge_events()
+                last_purge = time.monotonic()
+
+            tasks = claim(worker, options['batch'])
+            for background_task in tasks:
+                if execute(background_task):
+                    done += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'Zadatak {background_task.name} #{background_task.pk} nije uspeo')
+
+            if not tasks:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'\n⚙️ Završeno! Uspešno {done}, neuspešno {failed} zadataka')
+        )
+
+    def _stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,40 @@
+"""
+Middleware aplikacije
+
+SessionRefreshMiddleware zamenjuje SESSION_SAVE_EVERY_REQUEST: sesija se
+ne upisuje na svakom zahtevu (npr. polling notifikacija na 30s), već samo
+kada je od poslednjeg produženja prošlo više od SESSION_REFRESH_THRESHOLD.
+Aktivan korisnik tako ostaje ulogovan, a upis u sesiju se dešava najviše
+jednom po pragu umesto na svakom zahtevu.
+"""
+import time
+
+from django.conf import settings
+
+REFRESHED_AT_KEY = '_refreshed_at'
+
+
+class SessionRefreshMiddleware:
+    """Mora stajati posle SessionMiddleware (odgovor obrađuje pre njega)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SESSION_REFRESH_THRESHOLD', settings.SESSION_COOKIE_AGE // 2)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        if (
+            session is None
+            or session.is_empty()
+            or response.status_code >= 500
+        ):
+            return response
+
+        now = int(time.time())
+        # Izmena sesije -> SessionMiddleware je upisuje i šalje kolačić sa novim rokom
+        # (kada se sesija ionako upisuje, samo se osveži oznaka)
+        if session.modified or now - session.get(REFRESHED_AT_KEY, 0) >= self.threshold:
+            session[REFRESHED_AT_KEY] = now
+        return response
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0013_profile_bank_account'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='City',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('postal_code', models.CharField(blank=True, max_length=10)),
+                ('region', models.CharField(blank=True, max_length=100)),
+                ('district', models.CharField(blank=True, max_length=100)),
+                ('population', models.IntegerField(default=0)),
+                ('is_major', models.BooleanField(default=False, help_text='Veći grad - tranzitni čvor')),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+            ],
+            options={
+                'verbose_name': 'Grad',
+                'verbose_name_plural': 'Gradovi',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Highway',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('code', models.CharField(max_length=20)),
+                ('highway_type', models.CharField(choices=[('highway', 'Autoput'), ('main_road', 'Magistralni put'), ('regional', 'Regionalni put'), ('local', 'Lokalni put')], default='main_road', max_length=20)),
+                ('description', models.TextField(blank=True)),
+                ('distance_km', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('toll_road', models.BooleanField(default=False)),
+                ('priority', models.IntegerField(default=2, help_text='1 = autoput, 2 = magistrala, 3 = regionalni')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('end_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='highways_to', to='transport.city')),
+                ('start_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='highways_from', to='transport.city')),
+            ],
+            options={
+                'verbose_name': 'Put',
+                'verbose_name_plural': 'Putevi',
+                'ordering': ['priority', 'code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Route',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=300)),
+                ('total_distance', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('toll_cost', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('fuel_cost_estimate', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('is_recommended', models.BooleanField(default=False)),
+                ('priority', models.IntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['priority'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RouteHighway',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.IntegerField()),
+                ('highway', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transport.highway')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='route_highways', to='transport.route')),
+            ],
+            options={
+                'ordering': ['order'],
+            },
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='highways',
+            field=models.ManyToManyField(related_name='routes', through='transport.RouteHighway', to='transport.highway'),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='shipment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes', to='transport.shipment'),
+        ),
+    ]
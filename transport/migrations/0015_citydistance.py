@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0014_city_highway_route_routehighway_route_highways_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityDistance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.FloatField()),
+                ('travel_time_hours', models.FloatField()),
+                ('toll_cost', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distances_to', to='transport.city')),
+                ('origin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distances_from', to='transport.city')),
+            ],
+            options={
+                'verbose_name': 'Rastojanje između gradova',
+                'verbose_name_plural': 'Matrica rastojanja',
+                'unique_together': {('origin', 'destination')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0015_citydistance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='location',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
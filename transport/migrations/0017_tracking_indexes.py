@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0016_location_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='driverlocation',
+            index=models.Index(fields=['driver', '-timestamp'], name='driverloc_driver_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driverlocation',
+            index=models.Index(fields=['timestamp'], name='driverloc_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['tour', 'timestamp'], name='location_tour_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['timestamp'], name='location_ts_idx'),
+        ),
+    ]
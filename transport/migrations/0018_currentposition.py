@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transport', '0017_tracking_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrentPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('accuracy', models.FloatField(blank=True, null=True)),
+                ('speed', models.FloatField(blank=True, null=True)),
+                ('heading', models.FloatField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('driver', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='current_position', to=settings.AUTH_USER_MODEL)),
+                ('tour', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='current_positions', to='transport.tour')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timestamp'], name='currentpos_ts_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0018_currentposition'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['tour', 'timestamp', 'id'], name='chatmsg_tour_ts_id_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import unicodedata
+
+
+def _fold(text):
+    text = (text or '').replace('đ', 'dj').replace('Đ', 'dj')
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+
+def resolve_city_refs(apps, schema_editor):
+    City = apps.get_model('transport', 'City')
+    Shipment = apps.get_model('transport', 'Shipment')
+    ids = {}
+    for city_id, name in City.objects.order_by('-population').values_list('id', 'name'):
+        ids.setdefault(_fold(name), city_id)
+    for shipment in Shipment.objects.only('id', 'pickup_city', 'delivery_city').iterator():
+        Shipment.objects.filter(pk=shipment.pk).update(
+            pickup_city_ref_id=ids.get(_fold(shipment.pickup_city)),
+            delivery_city_ref_id=ids.get(_fold(shipment.delivery_city)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0020_backgroundtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='delivery_city_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='transport.city'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='pickup_city_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='transport.city'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'pickup_date', 'id'], name='shipment_status_pickup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'pickup_city_ref', 'pickup_date', 'id'], name='shipment_from_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'delivery_city_ref', 'pickup_date', 'id'], name='shipment_to_city_idx'),
+        ),
+        migrations.RunPython(resolve_city_refs, migrations.RunPython.noop),
+    ]
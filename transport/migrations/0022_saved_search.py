@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transport', '0021_shipment_city_refs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('new_offer', 'Nova ponuda'), ('offer_accepted', 'Ponuda prihvaćena'), ('offer_rejected', 'Ponuda odbijena'), ('tour_confirmed', 'Tura potvrđena'), ('pickup_confirmed', 'Preuzimanje potvrđeno'), ('delivery_confirmed', 'Isporuka potvrđena'), ('new_message', 'Nova poruka'), ('cargo', 'Nova pošiljka'), ('payment', 'Plaćanje'), ('tour_started', 'Tura pokrenuta'), ('tour_completed', 'Tura završena'), ('saved_search', 'Nova pošiljka za pretragu')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('cargo_type', models.CharField(blank=True, max_length=100)),
+                ('max_weight', models.DecimalField(blank=True, decimal_places=2, help_text='Težina u tonama', max_digits=10, null=True)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('pickup_date', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('delivery_city', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='transport.city')),
+                ('pickup_city', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='transport.city')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sačuvana pretraga',
+                'verbose_name_plural': 'Sačuvane pretrage',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('is_active', True)), fields=['pickup_city', 'delivery_city'], name='savedsearch_route_idx')],
+            },
+        ),
+    ]
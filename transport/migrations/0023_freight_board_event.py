@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0022_saved_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreightBoardEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shipment_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('added', 'Dodata'), ('updated', 'Izmenjena'), ('removed', 'Uklonjena')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Promena na berzi',
+                'verbose_name_plural': 'Promene na berzi',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('transport', '0023_freight_board_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_shipments', models.PositiveIntegerField(default=0)),
+                ('active_shipments', models.PositiveIntegerField(default=0)),
+                ('completed_shipments', models.PositiveIntegerField(default=0)),
+                ('total_vehicles', models.PositiveIntegerField(default=0)),
+                ('available_vehicles', models.PositiveIntegerField(default=0)),
+                ('total_offers', models.PositiveIntegerField(default=0)),
+                ('accepted_offers', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Statistika korisnika',
+                'verbose_name_plural': 'Statistike korisnika',
+            },
+        ),
+    ]
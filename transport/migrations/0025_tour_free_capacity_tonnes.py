@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:03
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def kg_to_tonnes(apps, schema_editor):
+    # Ture iz prihvaćene ponude su upisivale kilažu u kg (veća od kapaciteta u t)
+    Tour = apps.get_model('transport', 'Tour')
+    Tour.objects.filter(offer__isnull=False, slobodna_kilaza__gt=F('kapacitet')).update(
+        slobodna_kilaza=F('slobodna_kilaza') / 1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0024_user_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tour',
+            name='slobodna_kilaza',
+            field=models.DecimalField(decimal_places=2, help_text='Slobodna kilaža u tonama', max_digits=10),
+        ),
+        migrations.RunPython(kg_to_tonnes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0025_tour_free_capacity_tonnes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['tour', 'id'], name='location_tour_id_idx'),
+        ),
+    ]
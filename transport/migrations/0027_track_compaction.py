@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0026_location_tour_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackCompaction',
+            fields=[
+                ('table', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('compacted_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='track_compacted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0027_track_compaction'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('new_offer', 'Nova ponuda'), ('offer_accepted', 'Ponuda prihvaćena'), ('offer_rejected', 'Ponuda odbijena'), ('tour_confirmed', 'Tura potvrđena'), ('pickup_confirmed', 'Preuzimanje potvrđeno'), ('delivery_confirmed', 'Isporuka potvrđena'), ('new_message', 'Nova poruka'), ('cargo', 'Nova pošiljka'), ('payment', 'Plaćanje'), ('tour_started', 'Tura pokrenuta'), ('tour_completed', 'Tura završena'), ('saved_search', 'Nova pošiljka za pretragu'), ('dotovar', 'Dotovar na putanji ture')], max_length=20),
+        ),
+    ]
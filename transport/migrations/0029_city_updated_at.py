@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0028_dotovar_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='city',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
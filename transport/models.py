@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 
 class Profile(models.Model):
@@ -93,6 +94,9 @@ class Shipment(models.Model):
     delivery_address = models.CharField(max_length=300)
     pickup_city = models.CharField(max_length=100)
     delivery_city = models.CharField(max_length=100)
+    # Grad iz šifarnika za naziv iznad (postavlja transport.freight_search pri upisu)
+    pickup_city_ref = models.ForeignKey('City', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    delivery_city_ref = models.ForeignKey('City', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     
     # Teret
     cargo_weight = models.DecimalField(max_digits=10, decimal_places=2, help_text="Težina u tonama")
@@ -109,6 +113,14 @@ class Shipment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Berza tereta: status + (grad) + keyset po (pickup_date, id)
+            models.Index(fields=['status', 'pickup_date', 'id'], name='shipment_status_pickup_idx'),
+            models.Index(fields=['status', 'pickup_city_ref', 'pickup_date', 'id'], name='shipment_from_city_idx'),
+            models.Index(fields=['status', 'delivery_city_ref', 'pickup_date', 'id'], name='shipment_to_city_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.title} - {self.pickup_city} → {self.delivery_city}"
 
@@ -164,7 +176,7 @@ class Tour(models.Model):
     # Dotovar informacije
     dostupno_za_dotovar = models.CharField(max_length=50, choices=CARGO_TYPE_CHOICES, help_text="Tip tereta dostupan za dotovar")
     kapacitet = models.DecimalField(max_digits=10, decimal_places=2, help_text="Dostupan kapacitet u tonama")
-    slobodna_kilaza = models.DecimalField(max_digits=10, decimal_places=2, help_text="Slobodna kilaža u kg")
+    slobodna_kilaza = models.DecimalField(max_digits=10, decimal_places=2, help_text="Slobodna kilaža u tonama")
     
     # Koordinate
     polaziste_lat = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
@@ -174,6 +186,8 @@ class Tour(models.Model):
     
     pickup_confirmed_at = models.DateTimeField(null=True, blank=True)
     delivery_confirmed_at = models.DateTimeField(null=True, blank=True)
+    # Putanja je već uprošćena (compact_tracks) - ponovno uprošćavanje bi gomilalo odstupanje
+    track_compacted_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -192,6 +206,10 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Istorija chata po stranicama (keyset po timestamp, id) bez sortiranja
+            models.Index(fields=['tour', 'timestamp', 'id'], name='chatmsg_tour_ts_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.sender.username}: {self.message[:50]}"
@@ -210,6 +228,8 @@ class Notification(models.Model):
         ('payment', 'Plaćanje'),
         ('tour_started', 'Tura pokrenuta'),
         ('tour_completed', 'Tura završena'),
+        ('saved_search', 'Nova pošiljka za pretragu'),
+        ('dotovar', 'Dotovar na putanji ture'),
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -235,7 +255,18 @@ class Location(models.Model):
     latitude = models.DecimalField(max_digits=10, decimal_places=7)
     longitude = models.DecimalField(max_digits=10, decimal_places=7)
     accuracy = models.FloatField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Vreme GPS očitavanja - postavlja ga pozivalac, upis u bazu može kasniti
+    timestamp = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            # Putanja ture hronološki bez sortiranja
+            models.Index(fields=['tour', 'timestamp'], name='location_tour_ts_idx'),
+            # Inkrementalna putanja (?after=<id>)
+            models.Index(fields=['tour', 'id'], name='location_tour_id_idx'),
+            # Arhiviranje po mesecima
+            models.Index(fields=['timestamp'], name='location_ts_idx'),
+        ]
     
     def __str__(self):
         return f"Lokacija za {self.tour} - {self.timestamp}"
@@ -360,11 +391,47 @@ class DriverLocation(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Poslednja pozicija vozača je prvi red u indeksu - ne zavisi od dužine istorije
+            models.Index(fields=['driver', '-timestamp'], name='driverloc_driver_ts_idx'),
+            models.Index(fields=['timestamp'], name='driverloc_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.driver.username} - {self.latitude}, {self.longitude}"
 
 
+class TrackCompaction(models.Model):
+    """Dokle je GPS istorija tabele već uprošćena (compact_tracks) - sledeće pokretanje nastavlja odatle"""
+    table = models.CharField(max_length=50, primary_key=True)
+    compacted_until = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.table} do {self.compacted_until}"
+
+
+class CurrentPosition(models.Model):
+    """Poslednja poznata pozicija vozača - jedan red po vozaču, upsert na svaku tačku"""
+    driver = models.OneToOneField(User, on_delete=models.CASCADE, related_name='current_position')
+    tour = models.ForeignKey(Tour, on_delete=models.SET_NULL, null=True, blank=True, related_name='current_positions')
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    accuracy = models.FloatField(null=True, blank=True)
+    speed = models.FloatField(null=True, blank=True)
+    heading = models.FloatField(null=True, blank=True)
+    
+    is_active = models.BooleanField(default=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='currentpos_ts_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.driver_id} @ {self.latitude}, {self.longitude}"
+
+
 class DeliveryRating(models.Model):
     """Model za ocenjivanje dostave"""
     RATING_CHOICES = [(i, str(i)) for i in range(1, 6)]
@@ -479,3 +546,212 @@ class CenaPoKilometrazi(models.Model):
     
     def __str__(self):
         return f"{self.broj_paleta} paleta: {self.cena_do_200km}/{self.cena_preko_200km} RSD"
+
+
+class City(models.Model):
+    """Gradovi Srbije - čvorovi putne mreže"""
+    name = models.CharField(max_length=100)
+    postal_code = models.CharField(max_length=10, blank=True)
+    region = models.CharField(max_length=100, blank=True)
+    district = models.CharField(max_length=100, blank=True)
+    population = models.IntegerField(default=0)
+    is_major = models.BooleanField(default=False, help_text="Veći grad - tranzitni čvor")
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Graf putne mreže u drugim procesima se učitava ponovo kada se promeni (road_graph)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Grad'
+        verbose_name_plural = 'Gradovi'
+    
+    def __str__(self):
+        return f"{self.name} ({self.postal_code})" if self.postal_code else self.name
+
+
+class Highway(models.Model):
+    """Deonica puta između dva grada - grana putne mreže"""
+    HIGHWAY_TYPES = [
+        ('highway', 'Autoput'),
+        ('main_road', 'Magistralni put'),
+        ('regional', 'Regionalni put'),
+        ('local', 'Lokalni put'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    code = models.CharField(max_length=20)
+    highway_type = models.CharField(max_length=20, choices=HIGHWAY_TYPES, default='main_road')
+    description = models.TextField(blank=True)
+    start_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='highways_from')
+    end_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='highways_to')
+    distance_km = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    toll_road = models.BooleanField(default=False)
+    priority = models.IntegerField(default=2, help_text="1 = autoput, 2 = magistrala, 3 = regionalni")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['priority', 'code']
+        verbose_name = 'Put'
+        verbose_name_plural = 'Putevi'
+    
+    def __str__(self):
+        return f"{self.code} {self.start_city.name} - {self.end_city.name}"
+
+
+class Route(models.Model):
+    """Predložena ruta za pošiljku"""
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='routes')
+    name = models.CharField(max_length=300)
+    total_distance = models.DecimalField(max_digits=10, decimal_places=2)
+    toll_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    fuel_cost_estimate = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    is_recommended = models.BooleanField(default=False)
+    priority = models.IntegerField(default=1)
+    highways = models.ManyToManyField(Highway, through='RouteHighway', related_name='routes')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['priority']
+    
+    def __str__(self):
+        return f"{self.name} - {self.total_distance} km"
+
+
+class RouteHighway(models.Model):
+    """Redosled deonica puta u okviru rute"""
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='route_highways')
+    highway = models.ForeignKey(Highway, on_delete=models.CASCADE)
+    order = models.IntegerField()
+    
+    class Meta:
+        ordering = ['order']
+    
+    def __str__(self):
+        return f"{self.route.name} #{self.order}: {self.highway.code}"
+
+
+class CityDistance(models.Model):
+    """Prekalkulisana matrica najkraćih puteva između svih parova gradova"""
+    origin = models.ForeignKey(City, on_delete=models.CASCADE, related_name='distances_from')
+    destination = models.ForeignKey(City, on_delete=models.CASCADE, related_name='distances_to')
+    distance_km = models.FloatField()
+    travel_time_hours = models.FloatField()
+    toll_cost = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['origin', 'destination']
+        verbose_name = 'Rastojanje između gradova'
+        verbose_name_plural = 'Matrica rastojanja'
+    
+    def __str__(self):
+        return f"{self.origin.name} → {self.destination.name}: {self.distance_km:.1f} km"
+
+
+class BackgroundTask(models.Model):
+    """Red pozadinskih zadataka (transport/tasks.py, izvršava ih run_worker)"""
+    STATUS_CHOICES = [
+        ('pending', 'Na čekanju'),
+        ('running', 'U toku'),
+        ('done', 'Završen'),
+        ('failed', 'Neuspešan'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Isti ključ se ne upisuje dvaput (npr. ponovljen zahtev za istu akciju)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Worker uzima najstarije dospele zadatke
+            models.Index(fields=['status', 'run_at'], name='bgtask_status_run_at_idx'),
+        ]
+        verbose_name = 'Pozadinski zadatak'
+        verbose_name_plural = 'Pozadinski zadaci'
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class SavedSearch(models.Model):
+    """Sačuvani filteri berze tereta - korisnik dobija notifikaciju za nove pošiljke koje im odgovaraju"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=100, blank=True)
+    # Prazan filter znači "bilo koji"
+    pickup_city = models.ForeignKey(City, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    delivery_city = models.ForeignKey(City, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    cargo_type = models.CharField(max_length=100, blank=True)
+    max_weight = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Težina u tonama")
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    pickup_date = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Objava pošiljke traži samo pretrage za njen par gradova (i "bilo koji")
+            models.Index(
+                fields=['pickup_city', 'delivery_city'], name='savedsearch_route_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
+        verbose_name = 'Sačuvana pretraga'
+        verbose_name_plural = 'Sačuvane pretrage'
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.name or self.pk}"
+
+
+class FreightBoardEvent(models.Model):
+    """Promena na berzi tereta - id je verzija table (transport/freight_board.py)"""
+    ACTION_CHOICES = [
+        ('added', 'Dodata'),
+        ('updated', 'Izmenjena'),
+        ('removed', 'Uklonjena'),
+    ]
+    
+    # Bez FK - događaj "uklonjena" mora da preživi brisanje pošiljke
+    shipment_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = 'Promena na berzi'
+        verbose_name_plural = 'Promene na berzi'
+    
+    def __str__(self):
+        return f"v{self.pk}: #{self.shipment_id} {self.action}"
+
+
+class UserStats(models.Model):
+    """Brojači za dashboard-e naručioca i prevoznika (transport/user_stats.py)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    # Naručilac
+    total_shipments = models.PositiveIntegerField(default=0)
+    active_shipments = models.PositiveIntegerField(default=0)
+    completed_shipments = models.PositiveIntegerField(default=0)
+    # Prevoznik
+    total_vehicles = models.PositiveIntegerField(default=0)
+    available_vehicles = models.PositiveIntegerField(default=0)
+    total_offers = models.PositiveIntegerField(default=0)
+    accepted_offers = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Statistika korisnika'
+        verbose_name_plural = 'Statistike korisnika'
+    
+    def __str__(self):
+        return f"Statistika: {self.user.username}"
@@ -1,8 +1,317 @@
-from django.contrib.auth.models import User
-from django.db import models
-from django.utils import timezone
-from datetime import datetime, timedelta
+"""
+Notifikacije korisnika
+
+Polling (/transport/api/notifications/) i SSE stream
+(/transport/api/notifications/stream/) čitaju keširani sažetak po
+korisniku - broj nepročitanih i poslednjih LATEST_COUNT nepročitanih - koji
+se poništava na svaku promenu korisnikovih notifikacija, pa između promena
+odgovor ne dira bazu. Stream prati samo verziju sažetka u kešu i šalje ga
+čim se promeni. Nova notifikacija se posle upisa šalje i WebSocket-om
+(NotificationConsumer) kroz channel layer.
+
+Ista notifikacija za mnogo korisnika (fan_out) upisuje se sa bulk_create u
+paketima, a push-evi idu paralelno u jednom async pozivu; veliki fan-out
+radi pozadinska nit, pa npr. objava pošiljke ne čeka 5000 upisa.
+"""
+import asyncio
+import hashlib
 import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import get_or_compute, invalidate, invalidate_many, invalidate_on, is_shared, version
+from .models import Notification, Tour
+
+logger = logging.getLogger(__name__)
+
+# Namespace u transport.cache, opseg je korisnik
+NOTIFICATIONS = 'notifications'
+LATEST_COUNT = 10
+SUMMARY_TIMEOUT = 600
+# Keš samo u procesu ne vidi poništavanja iz drugih workera i run_worker-a,
+# pa polling sme da vrati zastareo sažetak najviše ovoliko sekundi
+SUMMARY_LOCAL_TIMEOUT = 5
+
+# SSE: koliko često se proverava verzija, ping da proksi ne zatvori vezu,
+# trajanje jedne veze (EventSource se sam ponovo poveže) i pauza pre toga
+STREAM_CHECK_SECONDS = 0.5
+STREAM_PING_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 3000
+# Sa kešom samo u procesu ovaj proces ne vidi izmene iz drugih workera,
+# pa se sažetak povremeno čita iz baze (kao nekadašnji polling)
+STREAM_LOCAL_RECHECK_SECONDS = 30
+
+# Fan-out: primalaca po bulk_create paketu, do koliko primalaca se radi u
+# samom zahtevu i koliko group_send poziva ide paralelno
+FANOUT_CHUNK_SIZE = 500
+FANOUT_INLINE_LIMIT = 200
+FANOUT_WORKERS = 2
+PUBLISH_CONCURRENCY = 100
+
+
+def serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'notification_type': notification.notification_type,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def notification_summary(user_id):
+    """
+    Broj nepročitanih i poslednje nepročitane notifikacije korisnika
+
+    Returns:
+        dict: unread_count, notifications (lista rečnika), etag
+    """
+    def compute():
+        unread = Notification.objects.filter(user_id=user_id, is_read=False)
+        summary = {
+            'unread_count': unread.count(),
+            'notifications': [
+                serialize_notification(notification)
+                for notification in unread.order_by('-created_at')[:LATEST_COUNT]
+            ],
+        }
+        payload = json.dumps(summary, sort_keys=True).encode('utf-8')
+        summary['etag'] = '"%s"' % hashlib.md5(payload).hexdigest()
+        return summary
+    timeout = SUMMARY_TIMEOUT if is_shared() else SUMMARY_LOCAL_TIMEOUT
+    return get_or_compute(NOTIFICATIONS, ('summary',), compute, timeout=timeout, scope=user_id)
+
+
+def _event(summary):
+    data = json.dumps({
+        'notifications': summary['notifications'],
+        'unread_count': summary['unread_count'],
+        'count': summary['unread_count'],
+    })
+    return f'event: notifications\nid: {summary["etag"]}\ndata: {data}\n\n'
+
+
+class _SummaryStream:
+    """Stanje jedne SSE veze - poll() vraća sledeću poruku ili None"""
+
+    def __init__(self, user_id, last_event_id=None):
+        self.user_id = user_id
+        self.shared = is_shared()
+        self.etag = last_event_id
+        self.version = None
+        self.started = self.last_write = self.last_recheck = time.monotonic()
+
+    @property
+    def open(self):
+        return time.monotonic() - self.started < STREAM_MAX_SECONDS
+
+    def poll(self):
+        now = time.monotonic()
+        if not self.shared and now - self.last_recheck >= STREAM_LOCAL_RECHECK_SECONDS:
+            invalidate_notifications(self.user_id)
+            self.last_recheck = now
+
+        latest_version = version(NOTIFICATIONS, self.user_id)
+        if latest_version != self.version:
+            self.version = latest_version
+            summary = notification_summary(self.user_id)
+            # Veza ka bazi se ne drži otvorenom dok stream čeka
+            connection.close()
+            if summary['etag'] != self.etag:
+                self.etag = summary['etag']
+                self.last_write = now
+                return _event(summary)
+
+        if now - self.last_write >= STREAM_PING_SECONDS:
+            self.last_write = now
+            return ': ping\n\n'
+        return None
+
+
+def notification_events(user_id, last_event_id=None):
+    """
+    Generator SSE poruka za StreamingHttpResponse (WSGI)
+
+    Args:
+        last_event_id: Last-Event-ID posle ponovnog povezivanja - sažetak se
+                       ne šalje ponovo ako se od tada nije promenio
+    """
+    yield f'retry: {STREAM_RETRY_MS}\n\n'
+    stream = _SummaryStream(user_id, last_event_id)
+    while stream.open:
+        message = stream.poll()
+        if message:
+            yield message
+        time.sleep(STREAM_CHECK_SECONDS)
+
+
+async def anotification_events(user_id, last_event_id=None):
+    """Isto kao notification_events, za ASGI (čekanje ne zauzima nit)"""
+    yield f'retry: {STREAM_RETRY_MS}\n\n'
+    stream = _SummaryStream(user_id, last_event_id)
+    poll = sync_to_async(stream.poll)
+    while stream.open:
+        message = await poll()
+        if message:
+            yield message
+        await asyncio.sleep(STREAM_CHECK_SECONDS)
+
+
+def _push_message(notification, data=None):
+    return (
+        f'notifications_{notification.user_id}',
+        {
+            'type': 'send_notification',
+            'notification': dict(serialize_notification(notification), data=data),
+        },
+    )
+
+
+async def _group_send_all(channel_layer, messages):
+    failed = 0
+    for start in range(0, len(messages), PUBLISH_CONCURRENCY):
+        results = await asyncio.gather(
+            *(channel_layer.group_send(group, message) for group, message in messages[start:start + PUBLISH_CONCURRENCY]),
+            return_exceptions=True,
+        )
+        failed += sum(isinstance(result, Exception) for result in results)
+    return failed
+
+
+def publish_notifications(notifications, data=None):
+    """
+    Šalje notifikacije NotificationConsumer-ima primalaca (grupe notifications_<id>)
+
+    Svi group_send pozivi idu u jednom async_to_sync, po PUBLISH_CONCURRENCY
+    paralelno, umesto jednog sinhronog poziva po notifikaciji.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not notifications:
+        return
+    messages = [_push_message(notification, data) for notification in notifications]
+    try:
+        failed = async_to_sync(_group_send_all)(channel_layer, messages)
+    except Exception:
+        failed = len(messages)
+        logger.warning('Slanje notifikacija preko channel layer-a nije uspelo', exc_info=True)
+    if failed:
+        # Notifikacije su upisane, klijenti ih dobijaju i kroz stream/polling
+        logger.warning('Nije poslato %s od %s notifikacija preko channel layer-a', failed, len(messages))
+
+
+def push_notification(notification, data=None):
+    """Šalje jednu notifikaciju NotificationConsumer-ima korisnika"""
+    publish_notifications([notification], data)
+
+
+@receiver(post_save, sender=Notification, dispatch_uid='notifications_push_created')
+def _notification_created(sender, instance, created, **kwargs):
+    if created:
+        data = getattr(instance, 'realtime_data', None)
+        transaction.on_commit(lambda: push_notification(instance, data))
+
+
+def invalidate_notifications(user_id):
+    """Za masovne izmene (QuerySet.update) koje ne šalju signale"""
+    invalidate(NOTIFICATIONS, user_id)
+
+
+invalidate_on(NOTIFICATIONS, Notification, scope=lambda notification: notification.user_id)
+
+
+def _after_bulk_create(notifications, data):
+    # bulk_create ne šalje post_save - keš i push ovde
+    invalidate_many(NOTIFICATIONS, {notification.user_id for notification in notifications})
+    publish_notifications(notifications, data)
+
+
+def _deliver(user_ids, fields, data):
+    total = 0
+    for start in range(0, len(user_ids), FANOUT_CHUNK_SIZE):
+        notifications = Notification.objects.bulk_create([
+            Notification(user_id=user_id, **fields) for user_id in user_ids[start:start + FANOUT_CHUNK_SIZE]
+        ])
+        transaction.on_commit(partial(_after_bulk_create, notifications, data))
+        total += len(notifications)
+    return total
+
+
+def _run_in_background(job):
+    try:
+        job()
+    except Exception:
+        logger.exception('Pozadinski fan-out notifikacija nije uspeo')
+    finally:
+        # Nit ima svoju vezu ka bazi
+        connection.close()
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _fanout_executor():
+    global _executor, _executor_pid
+    # Niti se prave u procesu workera, ne u master procesu pre fork-a (--preload)
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='notification-fanout')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def fan_out(recipients, notification_type, title, message, shipment=None, tour=None, data=None, background=None):
+    """
+    Ista notifikacija za više korisnika
+
+    Args:
+        recipients: korisnici, njihovi id-jevi ili QuerySet korisnika
+        data: dodatak samo za push klijentu (model ga ne čuva)
+        background: True/False, ili None - u pozadinu ide kada ima više od
+                    FANOUT_INLINE_LIMIT primalaca (posle commit-a transakcije)
+
+    Returns:
+        int: broj upisanih notifikacija, ili None kada je posao predat niti
+    """
+    if isinstance(recipients, QuerySet):
+        user_ids = list(recipients.values_list('pk', flat=True))
+    else:
+        user_ids = [getattr(recipient, 'pk', recipient) for recipient in recipients]
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return 0
+
+    fields = {
+        'notification_type': notification_type,
+        'title': title,
+        'message': message,
+        'shipment_id': getattr(shipment, 'pk', shipment),
+        'tour_id': getattr(tour, 'pk', tour),
+    }
+    job = partial(_deliver, user_ids, fields, data)
+    if background is None:
+        background = len(user_ids) > FANOUT_INLINE_LIMIT
+    if background:
+        transaction.on_commit(lambda: _fanout_executor().submit(_run_in_background, job))
+        return None
+    return job()
+
 
 class NotificationManager:
     """
@@ -29,76 +338,53 @@ class NotificationManager:
     def create_notification(cls, user, notification_type, title, message, 
                           related_shipment=None, data=None):
         """
-        Kreira novu notifikaciju
+        Kreira novu notifikaciju (WebSocket-u je šalje signal posle upisa)
         """
-        from .models import Notification
-        
-        notification = Notification.objects.create(
+        notification = Notification(
             user=user,
             notification_type=notification_type,
             title=title,
             message=message,
-            related_shipment=related_shipment,
-            data=json.dumps(data) if data else None
+            shipment=related_shipment,
         )
-        
-        # Pošalji real-time notifikaciju
-        cls._send_realtime_notification(user, notification)
+        # data ide samo klijentu, model je ne čuva
+        notification.realtime_data = data
+        notification.save()
         
         return notification
     
-    @classmethod
-    def _send_realtime_notification(cls, user, notification):
-        """
-        Šalje real-time notifikaciju preko WebSocket-a
-        """
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-        
-        channel_layer = get_channel_layer()
-        
-        if channel_layer:
-            async_to_sync(channel_layer.group_send)(
-                f"notifications_{user.id}",
-                {
-                    'type': 'send_notification',
-                    'notification': {
-                        'id': notification.id,
-                        'type': notification.notification_type,
-                        'title': notification.title,
-                        'message': notification.message,
-                        'created_at': notification.created_at.isoformat(),
-                        'is_read': notification.is_read,
-                        'data': json.loads(notification.data) if notification.data else None
-                    }
-                }
-            )
+    @staticmethod
+    def _carrier(shipment):
+        """Vozač ture pošiljke (Shipment nema polje prevoznika)"""
+        tour = Tour.objects.filter(shipment=shipment).select_related('driver').first()
+        return tour.driver if tour else None
     
     @classmethod
-    def notify_new_shipment(cls, shipment):
+    def notify_new_shipment(cls, shipment, background=None):
         """
-        Obavesti vozače o novoj pošiljci na njihovoj ruti
+        Obavesti vozače o novoj pošiljci na njihovoj ruti (fan_out - jedan
+        bulk_create po paketu, veliki broj vozača u pozadinskoj niti)
         """
         from .route_suggestions import DriverMatchingEngine
         
         # Pronađi vozače u blizini
         nearby_drivers = DriverMatchingEngine.find_nearby_drivers(shipment)
         
-        for driver in nearby_drivers:
-            cls.create_notification(
-                user=driver,
-                notification_type='new_shipment',
-                title='Nova pošiljka dostupna!',
-                message=f'Pošiljka {shipment.reference_number} od {shipment.pickup_city} do {shipment.delivery_city}',
-                related_shipment=shipment,
-                data={
-                    'shipment_id': shipment.id,
-                    'pickup_city': shipment.pickup_city,
-                    'delivery_city': shipment.delivery_city,
-                    'weight': float(shipment.weight),
-                    'offered_price': float(shipment.offered_price)
-                }
-            )
+        return fan_out(
+            nearby_drivers,
+            notification_type='new_shipment',
+            title='Nova pošiljka dostupna!',
+            message=f'Pošiljka "{shipment.title}" od {shipment.pickup_city} do {shipment.delivery_city}',
+            shipment=shipment,
+            data={
+                'shipment_id': shipment.id,
+                'pickup_city': shipment.pickup_city,
+                'delivery_city': shipment.delivery_city,
+                'weight': float(shipment.cargo_weight),
+                'budget': float(shipment.budget) if shipment.budget is not None else None,
+            },
+            background=background,
+        )
     
     @classmethod
     def notify_shipment_assigned(cls, shipment, carrier):
@@ -106,10 +392,10 @@ class NotificationManager:
         Obavesti naručioca da je pošiljka dodeljena
         """
         cls.create_notification(
-            user=shipment.shipper,
+            user=shipment.sender,
             notification_type='shipment_assigned',
             title='Pošiljka dodeljena vozaču!',
-            message=f'Vaša pošiljka {shipment.reference_number} je dodeljena vozaču {carrier.get_full_name() or carrier.username}',
+            message=f'Vaša pošiljka "{shipment.title}" je dodeljena vozaču {carrier.get_full_name() or carrier.username}',
             related_shipment=shipment,
             data={
                 'shipment_id': shipment.id,
@@ -123,14 +409,14 @@ class NotificationManager:
             user=carrier,
             notification_type='shipment_assigned',
             title='Nova pošiljka dodeljena!',
-            message=f'Dodeljena vam je pošiljka {shipment.reference_number}',
+            message=f'Dodeljena vam je pošiljka "{shipment.title}"',
             related_shipment=shipment,
             data={
                 'shipment_id': shipment.id,
                 'pickup_address': shipment.pickup_address,
                 'delivery_address': shipment.delivery_address,
-                'contact_person': shipment.contact_person,
-                'contact_phone': shipment.contact_phone
+                'contact_person': shipment.sender.get_full_name() or shipment.sender.username,
+                'contact_phone': getattr(getattr(shipment.sender, 'profile', None), 'phone_number', '')
             }
         )
     
@@ -140,15 +426,15 @@ class NotificationManager:
         Obavesti naručioca o novoj ponudi
         """
         cls.create_notification(
-            user=offer.shipment.shipper,
+            user=offer.shipment.sender,
             notification_type='offer_received',
             title='Nova ponuda primljena!',
-            message=f'Primili ste ponudu od {offer.carrier.get_full_name() or offer.carrier.username} za {offer.offered_price} RSD',
+            message=f'Primili ste ponudu od {offer.carrier.get_full_name() or offer.carrier.username} za {offer.price} RSD',
             related_shipment=offer.shipment,
             data={
                 'offer_id': offer.id,
                 'carrier_name': offer.carrier.get_full_name() or offer.carrier.username,
-                'offered_price': float(offer.offered_price),
+                'offered_price': float(offer.price),
                 'vehicle_type': offer.vehicle.get_vehicle_type_display(),
                 'message': offer.message
             }
@@ -159,22 +445,24 @@ class NotificationManager:
         """
         Obavesti o primenjenom penalu
         """
-        cls.create_notification(
-            user=shipment.carrier,
-            notification_type='penalty_applied',
-            title='Penal za kašnjenje!',
-            message=f'Primenjen penal od {penalty_amount} RSD za kašnjenje od {minutes_late} minuta',
-            related_shipment=shipment,
-            data={
-                'penalty_amount': float(penalty_amount),
-                'minutes_late': minutes_late,
-                'shipment_id': shipment.id
-            }
-        )
+        carrier = cls._carrier(shipment)
+        if carrier is not None:
+            cls.create_notification(
+                user=carrier,
+                notification_type='penalty_applied',
+                title='Penal za kašnjenje!',
+                message=f'Primenjen penal od {penalty_amount} RSD za kašnjenje od {minutes_late} minuta',
+                related_shipment=shipment,
+                data={
+                    'penalty_amount': float(penalty_amount),
+                    'minutes_late': minutes_late,
+                    'shipment_id': shipment.id
+                }
+            )
         
         # Obavesti i naručioca
         cls.create_notification(
-            user=shipment.shipper,
+            user=shipment.sender,
             notification_type='penalty_applied',
             title='Penal za kašnjenje vozača',
             message=f'Vozač je kasnio {minutes_late} minuta. Primenjen penal od {penalty_amount} RSD',
@@ -191,11 +479,13 @@ class NotificationManager:
         """
         Obavesti o završenoj dostavi
         """
+        carrier = cls._carrier(shipment)
+        
         cls.create_notification(
-            user=shipment.shipper,
+            user=shipment.sender,
             notification_type='shipment_delivered',
             title='Pošiljka isporučena!',
-            message=f'Vaša pošiljka {shipment.reference_number} je uspešno isporučena',
+            message=f'Vaša pošiljka "{shipment.title}" je uspešno isporučena',
             related_shipment=shipment,
             data={
                 'shipment_id': shipment.id,
@@ -203,29 +493,32 @@ class NotificationManager:
             }
         )
         
+        if carrier is None:
+            return
+        
         # Zahtevaj ocenu
         cls.create_notification(
-            user=shipment.shipper,
+            user=shipment.sender,
             notification_type='rating_request',
             title='Ocenite vozača',
-            message=f'Molimo ocenite vozača za pošiljku {shipment.reference_number}',
+            message=f'Molimo ocenite vozača za pošiljku "{shipment.title}"',
             related_shipment=shipment,
             data={
                 'shipment_id': shipment.id,
-                'carrier_name': shipment.carrier.get_full_name() or shipment.carrier.username
+                'carrier_name': carrier.get_full_name() or carrier.username
             }
         )
         
         # Zahtevaj ocenu od vozača
         cls.create_notification(
-            user=shipment.carrier,
+            user=carrier,
             notification_type='rating_request',
             title='Ocenite naručioca',
-            message=f'Molimo ocenite naručioca za pošiljku {shipment.reference_number}',
+            message=f'Molimo ocenite naručioca za pošiljku "{shipment.title}"',
             related_shipment=shipment,
             data={
                 'shipment_id': shipment.id,
-                'shipper_name': shipment.shipper.get_full_name() or shipment.shipper.username
+                'shipper_name': shipment.sender.get_full_name() or shipment.sender.username
             }
         )
     
@@ -234,8 +527,6 @@ class NotificationManager:
         """
         Vraća notifikacije korisnika
         """
-        from .models import Notification
-        
         queryset = Notification.objects.filter(user=user)
         
         if unread_only:
@@ -248,52 +539,15 @@ class NotificationManager:
         """
         Označava notifikacije kao pročitane
         """
-        from .models import Notification
-        
         Notification.objects.filter(
             id__in=notification_ids,
             user=user
-        ).update(is_read=True, read_at=timezone.now())
+        ).update(is_read=True)
+        invalidate_notifications(user.id)
     
     @classmethod
     def get_unread_count(cls, user):
         """
         Vraća broj nepročitanih notifikacija
         """
-        from .models import Notification
-        
-        return Notification.objects.filter(
-            user=user,
-            is_read=False
-        ).count()
-
-
-class Notification(models.Model):
-    """
-    Model za čuvanje notifikacija
-    """
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
-    notification_type = models.CharField(max_length=50)
-    title = models.CharField(max_length=200)
-    message = models.TextField()
-    related_shipment = models.ForeignKey('Shipment', on_delete=models.CASCADE, null=True, blank=True)
-    data = models.TextField(blank=True, help_text='JSON data')
-    is_read = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
-    read_at = models.DateTimeField(null=True, blank=True)
-    
-    class Meta:
-        ordering = ['-created_at']
-        indexes = [
-            models.Index(fields=['user', '-created_at']),
-            models.Index(fields=['user', 'is_read']),
-        ]
-    
-    def __str__(self):
-        return f"{self.title} - {self.user.username}"
-    
-    def mark_as_read(self):
-        """Označava notifikaciju kao pročitanu"""
-        self.is_read = True
-        self.read_at = timezone.now()
-        self.save(update_fields=['is_read', 'read_at'])
+        return notification_summary(user.id)['unread_count']
@@ -0,0 +1,242 @@
+"""
+Trenutne pozicije vozača za mapu flote
+
+Svaka GPS tačka odmah menja poziciju u prodavnici pozicija (Redis ako je
+podešen POSITION_STORE_URL, inače rečnik u procesu) i ulazi u bafer koji
+tabelu CurrentPosition (jedan red po vozaču) ažurira jednim uslovnim
+upsert-om po flush-u (pozadinska nit iz location_ingest.py) - red se menja
+samo novijom tačkom. Mapa flote čita deljenu
+prodavnicu ili CurrentPosition, nikada istoriju (Location/DriverLocation).
+"""
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CurrentPosition
+from .spatial_index import DRIVER_LOCATION_MAX_AGE, driver_index
+
+logger = logging.getLogger(__name__)
+
+POSITION_FIELDS = ('driver_id', 'tour_id', 'latitude', 'longitude', 'accuracy', 'speed', 'heading', 'timestamp')
+
+
+class LocalPositionStore:
+    """Zamena za Redis - vidi samo tačke koje je primio ovaj proces"""
+
+    shared = False
+
+    def __init__(self):
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def update(self, position):
+        with self._lock:
+            previous = self._positions.get(position['driver_id'])
+            if previous is None or previous['timestamp'] <= position['timestamp']:
+                self._positions[position['driver_id']] = position
+
+    def remove(self, driver_id):
+        with self._lock:
+            self._positions.pop(driver_id, None)
+
+    def active(self, since):
+        with self._lock:
+            return [dict(position) for position in self._positions.values() if position['timestamp'] >= since]
+
+
+class RedisPositionStore:
+    """
+    Hash vozač -> JSON pozicija i sorted set vozač -> vreme tačke, pa se
+    aktivni vozači čitaju sa ZRANGEBYSCORE + HMGET bez skeniranja
+    """
+
+    shared = True
+    KEY = 'tovar_taxi:positions'
+    TIMES_KEY = 'tovar_taxi:positions:times'
+    # Kao LocalPositionStore i upsert u CurrentPosition: starija tačka (kasni
+    # zahtev, drugi worker) ne menja poziciju - provera i upis su atomski
+    UPDATE_SCRIPT = """
+    local current = redis.call('ZSCORE', KEYS[2], ARGV[1])
+    if current and tonumber(current) > tonumber(ARGV[2]) then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+    return 1
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=1)
+        self.error = redis.RedisError
+        self._update = self.client.register_script(self.UPDATE_SCRIPT)
+
+    def update(self, position):
+        payload = dict(position, timestamp=position['timestamp'].isoformat())
+        try:
+            self._update(
+                keys=[self.KEY, self.TIMES_KEY],
+                args=[position['driver_id'], repr(position['timestamp'].timestamp()), json.dumps(payload)],
+            )
+        except self.error:
+            # Pozicija će i dalje stići u CurrentPosition kroz bafer
+            logger.warning('Redis nedostupan, pozicija vozača %s nije preslikana', position['driver_id'])
+
+    def remove(self, driver_id):
+        try:
+            self.client.pipeline(transaction=False).hdel(self.KEY, driver_id).zrem(self.TIMES_KEY, driver_id).execute()
+        except self.error:
+            pass
+
+    def active(self, since):
+        driver_ids = self.client.zrangebyscore(self.TIMES_KEY, since.timestamp(), '+inf')
+        if not driver_ids:
+            return []
+        positions = []
+        for raw in self.client.hmget(self.KEY, driver_ids):
+            if raw is None:
+                continue
+            position = json.loads(raw)
+            position['timestamp'] = parse_datetime(position['timestamp'])
+            positions.append(position)
+        return positions
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_position_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = getattr(settings, 'POSITION_STORE_URL', '')
+                _store = RedisPositionStore(url) if url else LocalPositionStore()
+    return _store
+
+
+class PositionBuffer:
+    """
+    Poslednja neupisana pozicija po vozaču - novija tačka istog vozača
+    zamenjuje stariju, pa flush radi najviše jedan red po vozaču
+    """
+
+    UPDATE_FIELDS = ['tour', 'latitude', 'longitude', 'accuracy', 'speed', 'heading', 'is_active', 'timestamp']
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, position, is_active=True):
+        with self._lock:
+            previous = self._pending.get(position['driver_id'])
+            if previous is None or previous.timestamp <= position['timestamp']:
+                self._pending[position['driver_id']] = CurrentPosition(is_active=is_active, **position)
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = list(self._pending.values()), {}
+        if not batch:
+            return 0
+        try:
+            self._upsert(batch)
+        except Exception:
+            logger.exception('Upis %s trenutnih pozicija nije uspeo', len(batch))
+            with self._lock:
+                for position in batch:
+                    self._pending.setdefault(position.driver_id, position)
+            return 0
+        return len(batch)
+
+    def _upsert(self, batch):
+        """
+        INSERT ... ON CONFLICT (driver) DO UPDATE samo kada je tačka novija od
+        upisane - kasni flush drugog workera ne vraća vozača na stariju poziciju
+
+        bulk_create(update_conflicts=True) ne podržava uslov, pa je upit
+        napisan ručno (PostgreSQL i SQLite >= 3.24 imaju istu sintaksu).
+        """
+        meta = CurrentPosition._meta
+        fields = [meta.get_field(name) for name in ['driver'] + self.UPDATE_FIELDS]
+        quote = connection.ops.quote_name
+        table = quote(meta.db_table)
+        columns = [quote(field.column) for field in fields]
+        timestamp = quote(meta.get_field('timestamp').column)
+        row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+        sql = (
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES {{rows}} '
+            f'ON CONFLICT ({columns[0]}) DO UPDATE SET '
+            + ', '.join(f'{column} = EXCLUDED.{column}' for column in columns[1:])
+            + f' WHERE {table}.{timestamp} <= EXCLUDED.{timestamp}'
+        )
+        batch_size = connection.ops.bulk_batch_size(fields, batch) or len(batch)
+        batch_size = min(batch_size, 500)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(batch), batch_size):
+                chunk = batch[start:start + batch_size]
+                params = [field.get_db_prep_save(getattr(position, field.attname), connection)
+                          for position in chunk for field in fields]
+                cursor.execute(sql.format(rows=', '.join([row] * len(chunk))), params)
+
+
+position_buffer = PositionBuffer()
+
+
+def update_position(driver_id, latitude, longitude, timestamp=None, tour_id=None,
+                    accuracy=None, speed=None, heading=None, is_active=True):
+    """Beleži trenutnu poziciju vozača (prodavnica odmah, tabela pri flush-u)"""
+    position = {
+        'driver_id': driver_id,
+        'tour_id': tour_id,
+        'latitude': round(float(latitude), 6),
+        'longitude': round(float(longitude), 6),
+        'accuracy': accuracy,
+        'speed': speed,
+        'heading': heading,
+        'timestamp': timestamp or timezone.now(),
+    }
+    store = get_position_store()
+    if is_active:
+        store.update(position)
+    else:
+        store.remove(driver_id)
+    driver_index.record(driver_id, position['latitude'], position['longitude'], is_active, position['timestamp'])
+    position_buffer.add(position, is_active)
+
+
+def fleet_positions(user, max_age=DRIVER_LOCATION_MAX_AGE):
+    """
+    Aktivni vozači za mapu flote
+
+    Osoblje vidi celu flotu (iz deljene prodavnice kada postoji), ostali
+    korisnici samo sebe i vozače na turama svojih pošiljki.
+    """
+    since = timezone.now() - max_age
+    store = get_position_store()
+    if user.is_staff and store.shared:
+        try:
+            return sorted(store.active(since), key=lambda position: position['driver_id'])
+        except store.error:
+            logger.warning('Redis nedostupan, mapa flote se čita iz baze')
+
+    positions = CurrentPosition.objects.filter(timestamp__gte=since, is_active=True)
+    if not user.is_staff:
+        positions = positions.filter(Q(driver=user) | Q(tour__shipment__sender=user))
+    result = []
+    for position in positions.order_by('driver_id').values(*POSITION_FIELDS):
+        position['latitude'] = float(position['latitude'])
+        position['longitude'] = float(position['longitude'])
+        result.append(position)
+    return result
+
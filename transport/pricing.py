@@ -82,6 +82,23 @@ class PricingCalculator:
         
         return final_price
     
+    @classmethod
+    def calculate_price_between_cities(cls, pickup_city, delivery_city, vehicle_type,
+                                       urgency='standard', pallet_count=1, route_type='highway'):
+        """
+        Izračunava cenu za par gradova čitajući rastojanje iz matrice rastojanja
+        
+        Returns:
+            Decimal: Ukupna cena u RSD (0 ako par nije u matrici)
+        """
+        from .distance_matrix import DistanceMatrix
+        
+        pair = DistanceMatrix.lookup(pickup_city, delivery_city)
+        if not pair:
+            return Decimal('0.0')
+        
+        return cls.calculate_price(pair['distance_km'], vehicle_type, urgency, pallet_count, route_type)
+    
     @classmethod
     def get_price_breakdown(cls, distance_km, vehicle_type, urgency='standard',
                            pallet_count=1, route_type='highway'):
@@ -0,0 +1,358 @@
+"""
+Putna mreža Srbije kao graf u memoriji
+
+Graf se učitava jednom po procesu iz City/Highway tabela i služi upite
+najkraćeg puta (A*, odnosno Dijkstra kada gradovi nemaju koordinate) i
+k-najkraćih puteva (Yen) sa proizvoljnim brojem presedanja.
+Poništava se preko signala kada se City/Highway promene, a ostali
+procesi (gunicorn workeri) promenu primećuju preko otiska tabela koji se
+proverava najviše jednom u GRAPH_RECHECK_SECONDS.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .geo import haversine_many, rank_by_distance
+from .models import City, Highway
+
+
+# Prosečne brzine po tipu puta (km/h)
+SPEED_MAP = {
+    'highway': 90,      # Autoput
+    'main_road': 70,    # Magistralni put
+    'regional': 60,     # Regionalni put
+    'local': 50,        # Lokalni put
+    'mixed': 75,        # Mešovito
+}
+
+# Putarina po kilometru (RSD) za puteve sa naplatom
+TOLL_RATE_PER_KM = {
+    'highway': Decimal('5.0'),
+    'default': Decimal('2.0'),
+}
+
+WEIGHTS = ('distance', 'time', 'toll')
+
+# Koliko često (s) proveravamo da li je neki drugi proces promenio mrežu
+GRAPH_RECHECK_SECONDS = 60
+
+# Mala težina po kilometru kojom se razbijaju nerešeni rezultati kod
+# rangiranja po vremenu/putarini (npr. više puteva bez putarine)
+TIE_BREAK_PER_KM = 1e-6
+
+
+class RoadEdge(NamedTuple):
+    target: int
+    highway_id: int
+    distance: float
+    time: float
+    toll: float
+
+
+class RoadPath(NamedTuple):
+    cost: float
+    nodes: tuple
+    edges: tuple
+
+
+def edge_travel_time(distance_km, highway_type):
+    """Vreme vožnje deonice u satima"""
+    if not distance_km:
+        return 0.0
+    return float(distance_km) / SPEED_MAP.get(highway_type, 70)
+
+
+def edge_toll_cost(highway):
+    """Putarina za jednu deonicu u RSD"""
+    if not highway.toll_road:
+        return Decimal('0.0')
+    rate = TOLL_RATE_PER_KM.get(highway.highway_type, TOLL_RATE_PER_KM['default'])
+    return (highway.distance_km or 0) * rate
+
+
+class RoadGraph:
+    """
+    Neusmereni multigraf: čvorovi su gradovi (City.id), grane su deonice (Highway.id).
+    Između dva grada može postojati više deonica (npr. A1 i M1 Beograd-Niš).
+    """
+
+    def __init__(self, cities, highways):
+        self.cities = {city.id: city for city in cities}
+        self.highways = {}
+        self.adjacency = defaultdict(list)
+        self._city_ids_by_name = {}
+        self._coordinates = {}
+        self._heuristics = {}
+
+        for city in self.cities.values():
+            self._city_ids_by_name.setdefault(city.name, city.id)
+            if city.latitude is not None and city.longitude is not None:
+                self._coordinates[city.id] = (float(city.latitude), float(city.longitude))
+
+        for highway in highways:
+            if highway.start_city_id not in self.cities or highway.end_city_id not in self.cities:
+                continue
+            self.highways[highway.id] = highway
+            distance = float(highway.distance_km or 0)
+            travel_time = edge_travel_time(distance, highway.highway_type)
+            toll = float(edge_toll_cost(highway))
+            self.adjacency[highway.start_city_id].append(
+                RoadEdge(highway.end_city_id, highway.id, distance, travel_time, toll)
+            )
+            self.adjacency[highway.end_city_id].append(
+                RoadEdge(highway.start_city_id, highway.id, distance, travel_time, toll)
+            )
+
+    @classmethod
+    def load(cls):
+        """Učitava celu mrežu sa dva upita"""
+        return cls(list(City.objects.all()), list(Highway.objects.all()))
+
+    def city_id(self, name):
+        return self._city_ids_by_name.get(name)
+
+    def city_coordinates(self, name):
+        """(lat, lng) grada po nazivu ili None ako grad nema koordinate"""
+        return self._coordinates.get(self.city_id(name))
+
+    def coordinates(self, city_id):
+        return self._coordinates.get(city_id)
+
+    def nearest_city(self, lat, lng, max_km):
+        """(city_id, rastojanje_km) najbližeg grada sa koordinatama ili None ako je dalji od max_km"""
+        city_ids = list(self._coordinates)
+        ranked = rank_by_distance(lat, lng, [self._coordinates[city_id] for city_id in city_ids],
+                                  limit=1, max_km=max_km)
+        if not ranked:
+            return None
+        index, distance = ranked[0]
+        return city_ids[index], distance
+
+    # ---------------------------------------------------------------- težine
+
+    @staticmethod
+    def _edge_cost(edge, weight):
+        if weight == 'distance':
+            return edge.distance
+        return getattr(edge, weight) + edge.distance * TIE_BREAK_PER_KM
+
+    def path_cost(self, edges, weight):
+        """Ukupna cena putanje zadate listom Highway.id"""
+        total = 0.0
+        for highway_id in edges:
+            highway = self.highways[highway_id]
+            distance = float(highway.distance_km or 0)
+            if weight == 'distance':
+                total += distance
+            elif weight == 'time':
+                total += edge_travel_time(distance, highway.highway_type) + distance * TIE_BREAK_PER_KM
+            else:
+                total += float(edge_toll_cost(highway)) + distance * TIE_BREAK_PER_KM
+        return total
+
+    def _heuristic(self, target, weight):
+        """
+        Donja granica cene do cilja za A* - vazdušna linija za rastojanje,
+        vazdušna linija pri najvećoj brzini za vreme, 0 za putarinu.
+        Gradovi bez koordinata dobijaju 0 (pretraga se svodi na Dijkstru).
+        """
+        key = (target, weight)
+        table = self._heuristics.get(key)
+        if table is not None:
+            return table
+
+        table = {}
+        target_coords = self._coordinates.get(target)
+        if target_coords and weight != 'toll':
+            divisor = 1 if weight == 'distance' else max(SPEED_MAP.values())
+            city_ids = list(self._coordinates)
+            straight = haversine_many(target_coords, [self._coordinates[city_id] for city_id in city_ids])
+            table = dict(zip(city_ids, (straight / divisor).tolist()))
+        self._heuristics[key] = table
+        return table
+
+    # ---------------------------------------------------------------- pretraga
+
+    def shortest_path(self, source, target, weight='distance',
+                      excluded_nodes=frozenset(), excluded_edges=frozenset()):
+        """
+        A* pretraga od source do target (City.id)
+
+        Returns:
+            RoadPath ili None ako put ne postoji
+        """
+        if source == target:
+            return RoadPath(0.0, (source,), ())
+
+        heuristic = self._heuristic(target, weight)
+        best = {source: 0.0}
+        previous = {}
+        closed = set()
+        counter = itertools.count()
+        heap = [(heuristic.get(source, 0.0), next(counter), source)]
+
+        while heap:
+            _, _, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            if node == target:
+                break
+            closed.add(node)
+
+            for edge in self.adjacency.get(node, ()):
+                if (edge.target in closed or edge.target in excluded_nodes
+                        or edge.highway_id in excluded_edges):
+                    continue
+                cost = best[node] + self._edge_cost(edge, weight)
+                if cost < best.get(edge.target, math.inf):
+                    best[edge.target] = cost
+                    previous[edge.target] = (node, edge.highway_id)
+                    heapq.heappush(heap, (cost + heuristic.get(edge.target, 0.0), next(counter), edge.target))
+
+        if target not in best:
+            return None
+
+        nodes = [target]
+        edges = []
+        while nodes[-1] != source:
+            node, highway_id = previous[nodes[-1]]
+            nodes.append(node)
+            edges.append(highway_id)
+        nodes.reverse()
+        edges.reverse()
+        return RoadPath(best[target], tuple(nodes), tuple(edges))
+
+    def single_source_costs(self, source):
+        """
+        Dijkstra po rastojanju od jednog grada do svih ostalih
+
+        Returns:
+            dict: City.id -> (rastojanje km, vreme h, putarina RSD) duž najkraćeg puta
+        """
+        best = {source: (0.0, 0.0, 0.0)}
+        closed = set()
+        counter = itertools.count()
+        heap = [(0.0, next(counter), source)]
+
+        while heap:
+            distance, _, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            closed.add(node)
+            _, travel_time, toll = best[node]
+
+            for edge in self.adjacency.get(node, ()):
+                if edge.target in closed:
+                    continue
+                candidate = distance + edge.distance
+                if candidate < best.get(edge.target, (math.inf,))[0]:
+                    best[edge.target] = (candidate, travel_time + edge.time, toll + edge.toll)
+                    heapq.heappush(heap, (candidate, next(counter), edge.target))
+
+        return best
+
+    def k_shortest_paths(self, source, target, k=5, weight='distance'):
+        """
+        Yen-ov algoritam - k najkraćih prostih putanja rangiranih po težini
+        (distance, time ili toll)
+        """
+        if weight not in WEIGHTS:
+            raise ValueError(f"Nepoznata težina: {weight}")
+
+        first = self.shortest_path(source, target, weight)
+        if first is None or not first.edges:
+            return []
+
+        accepted = [first]
+        candidates = []
+        seen = {first.edges}
+        counter = itertools.count()
+
+        while len(accepted) < k:
+            last = accepted[-1]
+            for i in range(len(last.edges)):
+                spur_node = last.nodes[i]
+                root_nodes = last.nodes[:i + 1]
+                root_edges = last.edges[:i]
+
+                excluded_edges = {
+                    path.edges[i] for path in accepted
+                    if len(path.edges) > i and path.edges[:i] == root_edges
+                }
+                spur = self.shortest_path(
+                    spur_node, target, weight,
+                    excluded_nodes=frozenset(root_nodes[:-1]),
+                    excluded_edges=frozenset(excluded_edges),
+                )
+                if spur is None:
+                    continue
+
+                edges = root_edges + spur.edges
+                if edges in seen:
+                    continue
+                seen.add(edges)
+                path = RoadPath(self.path_cost(edges, weight), root_nodes[:-1] + spur.nodes, edges)
+                heapq.heappush(candidates, (path.cost, next(counter), path))
+
+            if not candidates:
+                break
+            accepted.append(heapq.heappop(candidates)[2])
+
+        return accepted
+
+
+# ------------------------------------------------------------ keš po procesu
+
+_graph = None
+_graph_fingerprint = None
+_graph_checked_at = 0.0
+_graph_lock = threading.Lock()
+
+
+def _network_fingerprint():
+    # Naziv i koordinate grada menjaju pretragu po nazivu i A* heuristiku - ne samo broj gradova
+    cities = City.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    highways = Highway.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    return (cities['count'], cities['updated'], highways['count'], highways['updated'])
+
+
+def get_road_graph():
+    """Vraća graf ovog procesa, učitava ga ponovo samo kada se mreža promenila"""
+    global _graph, _graph_fingerprint, _graph_checked_at
+
+    now = time.monotonic()
+    if _graph is not None and now - _graph_checked_at < GRAPH_RECHECK_SECONDS:
+        return _graph
+
+    with _graph_lock:
+        if _graph is not None and now - _graph_checked_at < GRAPH_RECHECK_SECONDS:
+            return _graph
+        fingerprint = _network_fingerprint()
+        if _graph is None or fingerprint != _graph_fingerprint:
+            _graph = RoadGraph.load()
+            _graph_fingerprint = fingerprint
+        _graph_checked_at = time.monotonic()
+        return _graph
+
+
+def invalidate_road_graph():
+    global _graph
+    with _graph_lock:
+        _graph = None
+
+
+@receiver(post_save, sender=City, dispatch_uid='road_graph_city_saved')
+@receiver(post_delete, sender=City, dispatch_uid='road_graph_city_deleted')
+@receiver(post_save, sender=Highway, dispatch_uid='road_graph_highway_saved')
+@receiver(post_delete, sender=Highway, dispatch_uid='road_graph_highway_deleted')
+def _road_network_changed(sender, **kwargs):
+    invalidate_road_graph()
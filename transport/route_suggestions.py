@@ -1,5 +1,7 @@
-from django.db.models import Q
-from .models import City, Highway, Route, RouteHighway, Shipment
+from .cache import ROUTES, get_or_compute
+from .geo import rank_by_distance
+from .models import Route, RouteHighway, Shipment, Vehicle
+from .road_graph import SPEED_MAP, edge_toll_cost, get_road_graph
 from decimal import Decimal
 import math
 
@@ -9,7 +11,7 @@ class RouteSuggestionEngine:
     """
     
     @classmethod
-    def suggest_routes(cls, pickup_city_name, delivery_city_name, max_routes=5):
+    def suggest_routes(cls, pickup_city_name, delivery_city_name, max_routes=5, rank_by='distance'):
         """
         Predlaže najbolje rute između dva grada
         
@@ -17,98 +19,63 @@ class RouteSuggestionEngine:
             pickup_city_name: Naziv grada preuzimanja
             delivery_city_name: Naziv grada dostave
             max_routes: Maksimalan broj predloženih ruta
+            rank_by: Kriterijum rangiranja (distance, time, toll)
             
         Returns:
             List[dict]: Lista predloženih ruta sa detaljima
         """
-        try:
-            pickup_city = City.objects.get(name=pickup_city_name)
-            delivery_city = City.objects.get(name=delivery_city_name)
-        except City.DoesNotExist:
-            return []
-        
-        # Pronađi direktne puteve
-        direct_routes = cls._find_direct_routes(pickup_city, delivery_city)
-        
-        # Pronađi rute sa presedanjem
-        indirect_routes = cls._find_indirect_routes(pickup_city, delivery_city)
+        graph = get_road_graph()
         
-        # Kombinuj i sortiraj rute
-        all_routes = direct_routes + indirect_routes
+        pickup_id = graph.city_id(pickup_city_name)
+        delivery_id = graph.city_id(delivery_city_name)
+        if pickup_id is None or delivery_id is None:
+            return []
         
-        # Sortiraj po prioritetu i rastojanju
-        sorted_routes = sorted(all_routes, key=lambda x: (x['priority'], x['total_distance']))
+        def compute():
+            # k najkraćih puteva kroz mrežu, sa proizvoljnim brojem presedanja
+            paths = graph.k_shortest_paths(pickup_id, delivery_id, k=max_routes, weight=rank_by)
+            return [cls._build_route_data(graph, path) for path in paths]
         
-        return sorted_routes[:max_routes]
+        return get_or_compute(ROUTES, (pickup_id, delivery_id, max_routes, rank_by), compute, timeout=3600)
     
     @classmethod
-    def _find_direct_routes(cls, pickup_city, delivery_city):
-        """Pronalazi direktne rute između dva grada"""
-        routes = []
+    def _build_route_data(cls, graph, path):
+        """Pretvara putanju iz grafa u rečnik sa detaljima rute"""
+        highways = [graph.highways[highway_id] for highway_id in path.edges]
+        transit_cities = [graph.cities[city_id].name for city_id in path.nodes[1:-1]]
+        total_distance = sum((highway.distance_km or Decimal('0') for highway in highways), Decimal('0'))
+        travel_time = sum(
+            cls._calculate_travel_time(highway.distance_km, highway.highway_type) for highway in highways
+        )
         
-        # Pronađi puteve koji direktno povezuju gradove
-        highways = Highway.objects.filter(
-            Q(start_city=pickup_city, end_city=delivery_city) |
-            Q(start_city=delivery_city, end_city=pickup_city)
-        ).order_by('priority')
+        route_data = {
+            'highways': highways,
+            'total_distance': float(total_distance),
+            'estimated_time_hours': round(travel_time, 1),
+            'toll_cost': cls._calculate_toll_cost(highways),
+            'fuel_cost_estimate': cls._calculate_fuel_cost(total_distance),
+            'priority': max(highway.priority for highway in highways),
+            'transit_cities': transit_cities,
+        }
         
-        for highway in highways:
-            route_data = {
+        if len(highways) == 1:
+            highway = highways[0]
+            route_data.update({
                 'name': f"Direktna ruta: {highway.name}",
-                'highways': [highway],
-                'total_distance': float(highway.distance_km or 0),
-                'estimated_time_hours': cls._calculate_travel_time(highway.distance_km, highway.highway_type),
-                'toll_cost': cls._calculate_toll_cost([highway]),
-                'fuel_cost_estimate': cls._calculate_fuel_cost(highway.distance_km),
-                'priority': highway.priority,
                 'route_type': 'direct',
-                'description': f"{highway.get_highway_type_display()} - {highway.description}"
-            }
-            routes.append(route_data)
-        
-        return routes
-    
-    @classmethod
-    def _find_indirect_routes(cls, pickup_city, delivery_city):
-        """Pronalazi rute sa jednim presedanjem kroz veće gradove"""
-        routes = []
-        
-        # Glavni gradovi kroz koje se može ići
-        major_cities = City.objects.filter(is_major=True).exclude(
-            id__in=[pickup_city.id, delivery_city.id]
-        )
-        
-        for transit_city in major_cities:
-            # Ruta: pickup -> transit -> delivery
-            first_leg = Highway.objects.filter(
-                Q(start_city=pickup_city, end_city=transit_city) |
-                Q(start_city=transit_city, end_city=pickup_city)
-            ).order_by('priority').first()
-            
-            second_leg = Highway.objects.filter(
-                Q(start_city=transit_city, end_city=delivery_city) |
-                Q(start_city=delivery_city, end_city=transit_city)
-            ).order_by('priority').first()
-            
-            if first_leg and second_leg:
-                highways = [first_leg, second_leg]
-                total_distance = (first_leg.distance_km or 0) + (second_leg.distance_km or 0)
-                
-                route_data = {
-                    'name': f"Ruta preko {transit_city.name}",
-                    'highways': highways,
-                    'total_distance': float(total_distance),
-                    'estimated_time_hours': cls._calculate_travel_time(total_distance, 'mixed'),
-                    'toll_cost': cls._calculate_toll_cost(highways),
-                    'fuel_cost_estimate': cls._calculate_fuel_cost(total_distance),
-                    'priority': max(first_leg.priority, second_leg.priority),
-                    'route_type': 'indirect',
-                    'transit_city': transit_city.name,
-                    'description': f"Preko {transit_city.name} - {first_leg.get_highway_type_display()} + {second_leg.get_highway_type_display()}"
-                }
-                routes.append(route_data)
-        
-        return routes
+                'description': f"{highway.get_highway_type_display()} - {highway.description}",
+            })
+        else:
+            route_data.update({
+                'name': f"Ruta preko {', '.join(transit_cities)} ({' + '.join(highway.code for highway in highways)})",
+                'route_type': 'indirect',
+                'transit_city': transit_cities[0],
+                'description': f"Preko {', '.join(transit_cities)} - " + ' + '.join(
+                    highway.get_highway_type_display() for highway in highways
+                ),
+            })
+        
+        return route_data
     
     @classmethod
     def _calculate_travel_time(cls, distance_km, highway_type):
@@ -116,16 +83,7 @@ class RouteSuggestionEngine:
         if not distance_km:
             return 0
         
-        # Prosečne brzine po tipu puta (km/h)
-        speed_map = {
-            'highway': 90,      # Autoput
-            'main_road': 70,    # Magistralni put
-            'regional': 60,     # Regionalni put
-            'local': 50,        # Lokalni put
-            'mixed': 75         # Mešovito
-        }
-        
-        speed = speed_map.get(highway_type, 70)
+        speed = SPEED_MAP.get(highway_type, 70)
         return round(float(distance_km) / speed, 1)
     
     @classmethod
@@ -134,12 +92,7 @@ class RouteSuggestionEngine:
         toll_cost = Decimal('0.0')
         
         for highway in highways:
-            if highway.toll_road:
-                # Osnovna putarina: 5 RSD po kilometru za autoput
-                if highway.highway_type == 'highway':
-                    toll_cost += (highway.distance_km or 0) * Decimal('5.0')
-                else:
-                    toll_cost += (highway.distance_km or 0) * Decimal('2.0')
+            toll_cost += edge_toll_cost(highway)
         
         return float(toll_cost)
     
@@ -189,12 +142,10 @@ class RouteSuggestionEngine:
             )
             
             # Dodaj puteve u rutu
-            for order, highway in enumerate(route_data['highways']):
-                RouteHighway.objects.create(
-                    route=route,
-                    highway=highway,
-                    order=order + 1
-                )
+            RouteHighway.objects.bulk_create([
+                RouteHighway(route=route, highway=highway, order=order + 1)
+                for order, highway in enumerate(route_data['highways'])
+            ])
             
             created_routes.append(route)
         
@@ -206,43 +157,114 @@ class DriverMatchingEngine:
     Algoritam za pronalaženje najbližih vozača
     """
     
+    CARRIER_ROLES = ['prevoznik', 'vozač']
+    
+    @classmethod
+    def _available_carriers(cls):
+        from django.contrib.auth.models import User
+        
+        return User.objects.filter(
+            profile__role__in=cls.CARRIER_ROLES,
+            vehicles__is_available=True
+        ).distinct()
+    
     @classmethod
     def find_nearby_drivers(cls, shipment, radius_km=50):
         """
-        Pronalazi vozače u blizini rute pošiljke
+        Pronalazi vozače u blizini mesta preuzimanja pošiljke
         
         Args:
             shipment: Shipment objekat
             radius_km: Radijus pretrage u kilometrima
             
         Returns:
-            QuerySet: Vozači sortirani po udaljenosti
+            List[User]: Vozači sortirani po udaljenosti (atribut distance_km)
         """
-        # Pronađi vozače koji imaju aktivna vozila
-        from django.contrib.auth.models import User
-        
-        carriers = User.objects.filter(
-            profile__user_type='carrier',
-            vehicles__is_active=True
-        ).distinct()
+        from .spatial_index import driver_index
         
-        # TODO: Implementirati geolokaciju kada bude dostupna
-        # Za sada vraćamo sve aktivne vozače
+        pickup = get_road_graph().city_coordinates(shipment.pickup_city)
+        if pickup is None:
+            # Grad preuzimanja nema koordinate - vraćamo sve aktivne vozače
+            return list(cls._available_carriers())
         
-        return carriers
+        nearby = driver_index.within_radius(pickup[0], pickup[1], radius_km)
+        return cls._carriers_by_distance(nearby)
     
     @classmethod
-    def match_vehicle_to_shipment(cls, shipment):
+    def find_nearest_drivers(cls, latitude, longitude, k=10, max_radius_km=None):
         """
-        Pronalazi vozila koja mogu da prevoze pošiljku
+        Pronalazi k najbližih vozača oko tačke
+        
+        Returns:
+            List[User]: Vozači sortirani po udaljenosti (atribut distance_km)
         """
-        suitable_vehicles = Vehicle.objects.filter(
-            is_active=True,
-            max_weight__gte=shipment.weight,
-            max_volume__gte=shipment.volume or 0
-        )
+        from .spatial_index import driver_index
+        
+        nearest = driver_index.nearest(latitude, longitude, k=k, max_radius_km=max_radius_km)
+        return cls._carriers_by_distance(nearest)
+    
+    @classmethod
+    def _carriers_by_distance(cls, matches):
+        """Učitava vozače iz indeksa jednim upitom i čuva redosled po udaljenosti"""
+        if not matches:
+            return []
         
-        return suitable_vehicles
+        distances = dict(matches)
+        carriers = cls._available_carriers().filter(id__in=distances.keys())
+        result = []
+        for carrier in carriers:
+            carrier.distance_km = distances[carrier.id]
+            result.append(carrier)
+        result.sort(key=lambda carrier: carrier.distance_km)
+        return result
+    
+    @classmethod
+    def match_vehicle_to_shipment(cls, shipment, radius_km=None, limit=None):
+        """
+        Pronalazi slobodna vozila koja mogu da prevezu pošiljku, sortirana po
+        udaljenosti vozača od mesta preuzimanja (jedan vektorski proračun za
+        sve kandidate)
+        
+        Args:
+            shipment: Shipment objekat
+            radius_km: Najveća udaljenost vozača (None - bez ograničenja)
+            limit: Najviše ovoliko najbližih vozila
+            
+        Returns:
+            List[Vehicle]: Vozila sa atributom distance_km; vozila čiji vozač
+            nema poznatu poziciju dolaze na kraj sa distance_km=None
+        """
+        from .spatial_index import driver_index
+        
+        vehicles = list(Vehicle.objects.filter(
+            is_available=True,
+            capacity__gte=shipment.cargo_weight,
+            volume__gte=shipment.cargo_volume or 0
+        ).select_related('owner'))
+        
+        pickup = get_road_graph().city_coordinates(shipment.pickup_city)
+        positions = driver_index.positions({vehicle.owner_id for vehicle in vehicles}) if pickup else {}
+        located = [vehicle for vehicle in vehicles if vehicle.owner_id in positions]
+        
+        result = []
+        if located:
+            ranked = rank_by_distance(
+                pickup[0], pickup[1],
+                [positions[vehicle.owner_id] for vehicle in located],
+                limit=limit, max_km=radius_km
+            )
+            for index, distance in ranked:
+                vehicle = located[index]
+                vehicle.distance_km = distance
+                result.append(vehicle)
+        
+        if radius_km is None:
+            for vehicle in vehicles:
+                if vehicle.owner_id not in positions:
+                    vehicle.distance_km = None
+                    result.append(vehicle)
+        
+        return result[:limit] if limit is not None else result
     
     @classmethod
     def calculate_compatibility_score(cls, shipment, vehicle):
@@ -252,8 +274,8 @@ class DriverMatchingEngine:
         score = 100
         
         # Penalizuj prekapacitet
-        if vehicle.max_weight:
-            weight_ratio = float(shipment.weight) / float(vehicle.max_weight)
+        if vehicle.capacity:
+            weight_ratio = float(shipment.cargo_weight) / float(vehicle.capacity)
             if weight_ratio > 0.9:
                 score += 20  # Bonus za dobro iskorišćenje
             elif weight_ratio < 0.3:
@@ -0,0 +1,119 @@
+"""
+Sačuvane pretrage berze tereta (SavedSearch)
+
+Umesto da prevoznici stalno osvežavaju berzu, pretraga se proverava jednom,
+kada pošiljka postane objavljena: upis pošiljke stavlja u red zadatak
+match_saved_searches (u istoj transakciji), a worker traži samo pretrage
+čiji par gradova može da odgovara (indeks savedsearch_route_idx - tačno
+taj par, ili "bilo koji" grad na jednoj ili obe strane). Ostali uslovi
+(težina, cena, datum, tip) se proveravaju u istom upitu, a svi pronađeni
+korisnici dobijaju notifikaciju kroz fan_out.
+"""
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from .freight_search import OPEN_STATUS
+from .models import SavedSearch, Shipment
+from .notifications import fan_out
+from .tasks import enqueue, task
+
+# Najviše sačuvanih pretraga po korisniku
+SAVED_SEARCH_LIMIT = 20
+
+
+def from_filters(user, filters, name=''):
+    """
+    SavedSearch iz rečnika freight_search.parse_filters (nije sačuvan)
+
+    Raises:
+        ValueError: grad nije prepoznat ili nema nijednog filtera
+    """
+    if not filters:
+        raise ValueError('Izaberite bar jedan filter')
+    if filters.get('pickup_city') == 0 or filters.get('delivery_city') == 0:
+        raise ValueError('Grad nije prepoznat')
+    return SavedSearch(
+        user=user,
+        name=name.strip()[:100],
+        pickup_city_id=filters.get('pickup_city'),
+        delivery_city_id=filters.get('delivery_city'),
+        cargo_type=filters.get('cargo_type', ''),
+        max_weight=filters.get('max_weight'),
+        min_price=filters.get('min_price'),
+        pickup_date=filters.get('pickup_date'),
+    )
+
+
+def querystring(saved_search):
+    """GET parametri berze tereta za ovu pretragu"""
+    params = {
+        'pickup_city': saved_search.pickup_city_id,
+        'delivery_city': saved_search.delivery_city_id,
+        'cargo_type': saved_search.cargo_type,
+        'max_weight': saved_search.max_weight,
+        'min_price': saved_search.min_price,
+        'pickup_date': saved_search.pickup_date.isoformat() if saved_search.pickup_date else None,
+    }
+    return urlencode({key: value for key, value in params.items() if value not in (None, '')})
+
+
+def matching_user_ids(shipment):
+    """Korisnici sa aktivnom pretragom kojoj pošiljka odgovara (bez naručioca)"""
+    route = Q()
+    for pickup_city_id in {shipment.pickup_city_ref_id, None}:
+        for delivery_city_id in {shipment.delivery_city_ref_id, None}:
+            route |= Q(
+                Q(pickup_city_id=pickup_city_id) if pickup_city_id else Q(pickup_city__isnull=True),
+                Q(delivery_city_id=delivery_city_id) if delivery_city_id else Q(delivery_city__isnull=True),
+            )
+
+    price = Q(min_price__isnull=True)
+    if shipment.budget is not None:
+        price |= Q(min_price__lte=shipment.budget)
+
+    return list(
+        SavedSearch.objects.filter(route, price, is_active=True)
+        .filter(Q(max_weight__isnull=True) | Q(max_weight__gte=shipment.cargo_weight))
+        .filter(Q(pickup_date__isnull=True) | Q(pickup_date=timezone.localtime(shipment.pickup_date).date()))
+        .filter(Q(cargo_type='') | Q(cargo_type__iexact=shipment.cargo_type))
+        .exclude(user_id=shipment.sender_id)
+        .order_by()
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+
+
+@task('match_saved_searches')
+def match_saved_searches(shipment_id):
+    shipment = Shipment.objects.filter(pk=shipment_id, status=OPEN_STATUS).first()
+    if shipment is None:
+        # U međuvremenu povučena ili već prihvaćena
+        return
+    fan_out(
+        matching_user_ids(shipment),
+        notification_type='saved_search',
+        title='Nova pošiljka za vašu pretragu',
+        message=f'Pošiljka "{shipment.title}" od {shipment.pickup_city} do {shipment.delivery_city}',
+        shipment=shipment,
+        data={
+            'shipment_id': shipment.id,
+            'pickup_city': shipment.pickup_city,
+            'delivery_city': shipment.delivery_city,
+            'weight': float(shipment.cargo_weight),
+            'budget': float(shipment.budget) if shipment.budget is not None else None,
+        },
+    )
+
+
+# ------------------------------------------------------------ objava pošiljke
+
+@receiver(post_save, sender=Shipment, dispatch_uid='saved_searches_shipment_published')
+def _shipment_published(sender, instance, raw=False, **kwargs):
+    # _previous_status postavlja freight_search pre upisa
+    if raw or instance.status != OPEN_STATUS or getattr(instance, '_previous_status', None) == OPEN_STATUS:
+        return
+    # Jednom po pošiljci - ponovna objava ne šalje iste notifikacije
+    enqueue('match_saved_searches', {'shipment_id': instance.pk}, idempotency_key=f'saved-searches-{instance.pk}')
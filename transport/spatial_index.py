@@ -0,0 +1,237 @@
+"""
+Prostorni indeks vozača - uniformna mreža ćelija nad poslednjom poznatom
+lokacijom (CurrentPosition) svakog vozača
+
+Upiti po radijusu i k-najbližih obilaze samo ćelije oko tačke, pa cena ne
+zavisi od ukupnog broja vozača na mreži.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .geo import haversine_many
+from .models import CurrentPosition
+
+KM_PER_DEGREE_LAT = 111.32
+
+# Veličina ćelije u stepenima (~11 km po širini, ~8 km po dužini u Srbiji)
+DEFAULT_CELL_SIZE_DEG = 0.1
+
+# Lokacije starije od ovoga se ne smatraju "na mreži"
+DRIVER_LOCATION_MAX_AGE = timedelta(minutes=30)
+
+# Koliko često (s) indeks dopunjava lokacije koje su upisali drugi procesi
+INDEX_SYNC_SECONDS = 5
+
+
+class GridIndex:
+    """
+    Uniformna mreža: ćelija (i, j) -> skup ključeva, ključ -> (lat, lng, timestamp)
+    """
+
+    def __init__(self, cell_size_deg=DEFAULT_CELL_SIZE_DEG):
+        self.cell_size = cell_size_deg
+        self.cells = defaultdict(set)
+        self.points = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def update(self, key, lat, lng, timestamp=None):
+        """Dodaje ili pomera tačku; starije pozicije od postojeće se ignorišu"""
+        lat, lng = float(lat), float(lng)
+        cell = self._cell(lat, lng)
+        with self._lock:
+            previous = self.points.get(key)
+            if previous is not None:
+                if timestamp is not None and previous[2] is not None and timestamp < previous[2]:
+                    return
+                old_cell = self._cell(previous[0], previous[1])
+                if old_cell != cell:
+                    self.cells[old_cell].discard(key)
+                    if not self.cells[old_cell]:
+                        del self.cells[old_cell]
+            self.points[key] = (lat, lng, timestamp)
+            self.cells[cell].add(key)
+
+    def remove(self, key):
+        with self._lock:
+            previous = self.points.pop(key, None)
+            if previous is not None:
+                cell = self._cell(previous[0], previous[1])
+                self.cells[cell].discard(key)
+                if not self.cells[cell]:
+                    del self.cells[cell]
+
+    def _ring(self, center, ring):
+        """Ćelije na Čebiševljevom rastojanju `ring` od centralne ćelije"""
+        ci, cj = center
+        if ring == 0:
+            yield center
+            return
+        for di in range(-ring, ring + 1):
+            yield (ci + di, cj - ring)
+            yield (ci + di, cj + ring)
+        for dj in range(-ring + 1, ring):
+            yield (ci - ring, cj + dj)
+            yield (ci + ring, cj + dj)
+
+    def _candidates(self, cells, newer_than):
+        """Ključevi i (lat, lng) niz tačaka u zadatim ćelijama"""
+        keys, coords = [], []
+        with self._lock:
+            for cell in cells:
+                for key in self.cells.get(cell, ()):
+                    lat, lng, timestamp = self.points[key]
+                    if newer_than is not None and timestamp is not None and timestamp < newer_than:
+                        continue
+                    keys.append(key)
+                    coords.append((lat, lng))
+        return keys, coords
+
+    def _distances(self, lat, lng, cells, newer_than, max_km=None):
+        """Rastojanja do svih tačaka u ćelijama jednim vektorskim prolazom"""
+        keys, coords = self._candidates(cells, newer_than)
+        if not keys:
+            return []
+        distances = haversine_many((lat, lng), coords)
+        if max_km is None:
+            return [(key, float(distance)) for key, distance in zip(keys, distances)]
+        return [(keys[index], float(distances[index])) for index in np.flatnonzero(distances <= max_km)]
+
+    def within_radius(self, lat, lng, radius_km, newer_than=None):
+        """
+        Sve tačke u radijusu
+
+        Returns:
+            list: [(ključ, rastojanje_km)] sortirano po rastojanju
+        """
+        lat, lng = float(lat), float(lng)
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        dlng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        min_i, min_j = self._cell(lat - dlat, lng - dlng)
+        max_i, max_j = self._cell(lat + dlat, lng + dlng)
+        cells = [(i, j) for i in range(min_i, max_i + 1) for j in range(min_j, max_j + 1)]
+
+        found = self._distances(lat, lng, cells, newer_than, max_km=radius_km)
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def nearest(self, lat, lng, k, max_radius_km=None, newer_than=None):
+        """
+        k najbližih tačaka - prstenovi ćelija se šire dok k-ta tačka nije
+        bliža od sigurno pokrivenog radijusa
+
+        Returns:
+            list: [(ključ, rastojanje_km)] sortirano po rastojanju
+        """
+        lat, lng = float(lat), float(lng)
+        if not self.points or k <= 0:
+            return []
+
+        center = self._cell(lat, lng)
+        # Najmanja dimenzija ćelije u km - garantovano pokriven radijus po prstenu
+        cell_km = self.cell_size * KM_PER_DEGREE_LAT * max(math.cos(math.radians(abs(lat) + self.cell_size)), 0.01)
+        max_ring = None
+        if max_radius_km is not None:
+            max_ring = int(math.ceil(max_radius_km / cell_km)) + 1
+        else:
+            max_ring = int(math.ceil(180 / self.cell_size))
+
+        found = []
+        visited = 0
+        for ring in range(0, max_ring + 1):
+            cells = list(self._ring(center, ring))
+            visited += sum(len(self.cells.get(cell, ())) for cell in cells)
+            found.extend(self._distances(lat, lng, cells, newer_than, max_km=max_radius_km))
+            if len(found) >= k:
+                found.sort(key=lambda item: item[1])
+                found = found[:k]
+                if found[-1][1] <= ring * cell_km:
+                    break
+            if visited >= len(self.points):
+                break
+
+        found.sort(key=lambda item: item[1])
+        return found[:k]
+
+
+class DriverLocationIndex:
+    """
+    Indeks poslednje pozicije po vozaču, po jedan u svakom procesu
+
+    Puni se iz CurrentPosition (jedan red po vozaču), pa ni prvo punjenje
+    ni dopuna ne zavise od dužine GPS istorije. Tačke ovog procesa stižu
+    odmah (positions.update_position -> record), a izmene drugih procesa
+    najviše jednom u INDEX_SYNC_SECONDS: redovi čije je vreme tačke posle
+    prethodne dopune, uz preklapanje za tačke koje bafer upisuje kasnije.
+    """
+
+    # Koliko (s) tačka može da kasni od očitavanja do upisa u CurrentPosition
+    SYNC_OVERLAP = timedelta(seconds=30)
+
+    def __init__(self):
+        self.grid = GridIndex()
+        self._since = None
+        self._synced_at = 0.0
+        self._sync_lock = threading.Lock()
+
+    def _apply(self, positions):
+        for driver_id, lat, lng, is_active, timestamp in positions:
+            if is_active:
+                self.grid.update(driver_id, lat, lng, timestamp)
+            else:
+                self.grid.remove(driver_id)
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and self._since is not None and now - self._synced_at < INDEX_SYNC_SECONDS:
+            return
+        with self._sync_lock:
+            started = timezone.now()
+            since = started - DRIVER_LOCATION_MAX_AGE if self._since is None else self._since - self.SYNC_OVERLAP
+            self._apply(CurrentPosition.objects.filter(timestamp__gte=since).values_list(
+                'driver_id', 'latitude', 'longitude', 'is_active', 'timestamp'
+            ))
+            self._since = started
+            self._synced_at = time.monotonic()
+
+    def record(self, driver_id, lat, lng, is_active=True, timestamp=None):
+        """Primenjuje novu poziciju odmah (tačka primljena u ovom procesu)"""
+        if self._since is not None:
+            self._apply([(driver_id, lat, lng, is_active, timestamp)])
+
+    def positions(self, driver_ids):
+        """Sveže pozicije zadatih vozača: {driver_id: (lat, lng)}"""
+        self.sync()
+        cutoff = self._freshness_cutoff()
+        result = {}
+        for driver_id in driver_ids:
+            point = self.grid.points.get(driver_id)
+            if point is not None and (point[2] is None or point[2] >= cutoff):
+                result[driver_id] = (point[0], point[1])
+        return result
+
+    def _freshness_cutoff(self):
+        return timezone.now() - DRIVER_LOCATION_MAX_AGE
+
+    def within_radius(self, lat, lng, radius_km):
+        self.sync()
+        return self.grid.within_radius(lat, lng, radius_km, newer_than=self._freshness_cutoff())
+
+    def nearest(self, lat, lng, k=10, max_radius_km=None):
+        self.sync()
+        return self.grid.nearest(lat, lng, k, max_radius_km=max_radius_km,
+                                 newer_than=self._freshness_cutoff())
+
+
+driver_index = DriverLocationIndex()
@@ -0,0 +1,217 @@
+"""
+Pozadinski zadaci (BackgroundTask) bez spoljnog brokera
+
+View upisuje zadatak u istoj transakciji sa svojom izmenom (enqueue), pa
+zadatak postoji samo ako je izmena sačuvana, a odgovor ne čeka notifikacije,
+Stripe i sporedne upise. Zadatke izvršava `manage.py run_worker`:
+- claim: uzima dospele zadatke (SELECT ... FOR UPDATE SKIP LOCKED, pa više
+  worker-a ne uzima isti zadatak); zadatak čiji je worker pao vraća se posle
+  TASK_LOCK_SECONDS
+- neuspeh: novi pokušaj sa eksponencijalnim odlaganjem do max_attempts,
+  PermanentTaskError odmah završava zadatak kao neuspešan
+- idempotency_key: isti ključ se upisuje samo jednom
+
+Obrađivač se izvršava u transakciji, pa neuspeli pokušaj ne ostavlja
+delimične upise. Na dnu su registrovani zadaci aplikacije.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+from functools import partial
+
+import stripe
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import BackgroundTask, Cargo, Notification
+
+logger = logging.getLogger(__name__)
+
+# Zadatak u statusu running duže od ovoga smatra se napuštenim (pao worker)
+TASK_LOCK_SECONDS = 600
+TASK_BATCH_SIZE = 10
+# Odlaganje ponovnog pokušaja: BASE * 2^(pokušaj-1), najviše MAX sekundi
+TASK_BACKOFF_BASE = 10
+TASK_BACKOFF_MAX = 3600
+TASK_RETENTION_DAYS = 7
+
+TASKS = {}
+
+
+class PermanentTaskError(Exception):
+    """Greška posle koje ponovni pokušaj nema smisla"""
+
+
+def task(name, max_attempts=5):
+    """Registruje funkciju kao zadatak; payload zadatka su njeni argumenti"""
+    def register(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, idempotency_key=None, delay=0, max_attempts=None):
+    """
+    Upisuje zadatak (u tekućoj transakciji)
+
+    Args:
+        payload: rečnik argumenata obrađivača (JSON)
+        idempotency_key: zadatak sa istim ključem se ne upisuje ponovo
+        delay: sekundi do prvog pokušaja
+
+    Returns:
+        BackgroundTask, ili None kada zadatak sa tim ključem već postoji
+    """
+    if name not in TASKS:
+        raise KeyError(f'Nepoznat zadatak: {name}')
+
+    background_task = BackgroundTask(
+        name=name,
+        payload=payload or {},
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts or TASKS[name].max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    try:
+        with transaction.atomic():
+            background_task.save()
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+        return None
+
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False) and not delay:
+        # Bez worker-a (razvoj) - izvrši posle commit-a u ovom procesu
+        transaction.on_commit(partial(run_task, background_task.pk))
+    return background_task
+
+
+def backoff(attempts):
+    seconds = min(TASK_BACKOFF_MAX, TASK_BACKOFF_BASE * 2 ** max(attempts - 1, 0))
+    # Raspršivanje da zadaci koji su pali zajedno ne krenu ponovo zajedno
+    return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+
+def claim(worker, limit=TASK_BATCH_SIZE):
+    """Uzima do limit dospelih zadataka za worker-a"""
+    now = timezone.now()
+    stale = now - timedelta(seconds=TASK_LOCK_SECONDS)
+    with transaction.atomic():
+        ids = list(
+            BackgroundTask.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending', run_at__lte=now) | Q(status='running', locked_at__lt=stale))
+            .order_by('run_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        BackgroundTask.objects.filter(id__in=ids).update(
+            status='running', locked_at=now, locked_by=worker, attempts=F('attempts') + 1
+        )
+    return list(BackgroundTask.objects.filter(id__in=ids).order_by('run_at'))
+
+
+def execute(background_task):
+    """
+    Izvršava preuzet zadatak i beleži ishod
+
+    Returns:
+        bool: da li je zadatak uspeo
+    """
+    handler = TASKS.get(background_task.name)
+    try:
+        if handler is None:
+            raise PermanentTaskError(f'Nepoznat zadatak: {background_task.name}')
+        with transaction.atomic():
+            handler(**background_task.payload)
+    except Exception as exc:
+        now = timezone.now()
+        final = isinstance(exc, PermanentTaskError) or background_task.attempts >= background_task.max_attempts
+        changes = {'last_error': traceback.format_exc(), 'locked_at': None, 'locked_by': ''}
+        if final:
+            changes.update(status='failed', finished_at=now)
+            logger.error('Zadatak %s #%s nije uspeo posle %s pokušaja', background_task.name,
+                         background_task.pk, background_task.attempts, exc_info=True)
+        else:
+            changes.update(status='pending', run_at=now + backoff(background_task.attempts))
+            logger.warning('Zadatak %s #%s nije uspeo (pokušaj %s), ponovo u %s', background_task.name,
+                           background_task.pk, background_task.attempts, changes['run_at'])
+        _finish(background_task, changes)
+        return False
+
+    _finish(background_task, {'status': 'done', 'finished_at': timezone.now(), 'locked_at': None, 'locked_by': ''})
+    return True
+
+
+def _finish(background_task, changes):
+    # Samo ako ga u međuvremenu nije preuzeo drugi worker (napušten zadatak)
+    BackgroundTask.objects.filter(
+        pk=background_task.pk, status='running', locked_by=background_task.locked_by
+    ).update(**changes)
+
+
+def run_task(task_id, worker='eager'):
+    """Preuzima i izvršava jedan zadatak ako je još na čekanju (BACKGROUND_TASKS_EAGER)"""
+    claimed = BackgroundTask.objects.filter(pk=task_id, status='pending').update(
+        status='running', locked_at=timezone.now(), locked_by=worker, attempts=F('attempts') + 1
+    )
+    if claimed:
+        execute(BackgroundTask.objects.get(pk=task_id))
+
+
+def purge(days=TASK_RETENTION_DAYS):
+    """Briše završene zadatke starije od days dana (neuspešni ostaju za pregled)"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = BackgroundTask.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+# ------------------------------------------------------------ zadaci aplikacije
+
+@task('notify')
+def notify(user_id, notification_type, title, message, shipment_id=None, tour_id=None):
+    """Notifikacija jednom korisniku (push i keš rešava post_save)"""
+    Notification.objects.create(
+        user_id=user_id,
+        notification_type=notification_type,
+        title=title,
+        message=message,
+        shipment_id=shipment_id,
+        tour_id=tour_id,
+    )
+
+
+@task('capture_cargo_payment', max_attempts=8)
+def capture_cargo_payment(cargo_id):
+    """Naplata isporučenog tereta (Stripe capture) i obaveštenje prevozniku"""
+    cargo = Cargo.objects.select_for_update().filter(pk=cargo_id).first()
+    if cargo is None or cargo.status != 'delivered':
+        # Obrisan ili već naplaćen
+        return
+
+    if cargo.payment_intent_id:
+        try:
+            # Isti ključ pri ponovnom pokušaju - Stripe ne naplaćuje dvaput
+            stripe.PaymentIntent.capture(
+                cargo.payment_intent_id,
+                api_key=settings.STRIPE_SECRET_KEY,
+                idempotency_key=f'cargo-capture-{cargo.pk}',
+            )
+        except stripe.error.InvalidRequestError as exc:
+            raise PermanentTaskError(str(exc)) from exc
+
+    cargo.status = 'paid'
+    cargo.save(update_fields=['status'])
+
+    if cargo.prevoznik_id:
+        Notification.objects.create(
+            user_id=cargo.prevoznik_id,
+            title="Dostava Potvrđena",
+            message=f"Dostava je potvrđena. Zarada: {cargo.cena_za_prevoznika} RSD",
+            notification_type='payment'
+        )
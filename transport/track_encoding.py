@@ -0,0 +1,113 @@
+"""
+Kompaktni formati GPS putanje za mape
+
+- Google encoded polyline (preciznost 1e-5 stepena, ~1 m), tekst koji
+  Google Maps / Leaflet dodaci dekodiraju direktno
+- delta-binarni niz: little-endian int32 trojke (lat*1e5, lng*1e5,
+  sekunde od X-Track-Base-Time); prva trojka je apsolutna, ostale su
+  razlike u odnosu na prethodnu tačku - u JS-u Int32Array + kumulativni zbir
+
+Oba enkodera rade nad iteratorom (lat, lng, timestamp) redova, u delovima,
+pa se odgovor može slati kao stream bez učitavanja cele putanje.
+"""
+import itertools
+
+import numpy as np
+
+POLYLINE_PRECISION = 5
+CHUNK_SIZE = 2000
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+class PolylineEncoder:
+    """Inkrementalni enkoder - pamti poslednju tačku, pa se može hraniti u delovima"""
+
+    def __init__(self, precision=POLYLINE_PRECISION):
+        self.factor = 10 ** precision
+        self._lat = 0
+        self._lng = 0
+
+    def encode(self, points):
+        parts = []
+        for point in points:
+            lat = int(round(float(point[0]) * self.factor))
+            lng = int(round(float(point[1]) * self.factor))
+            parts.append(_encode_value(lat - self._lat))
+            parts.append(_encode_value(lng - self._lng))
+            self._lat, self._lng = lat, lng
+        return ''.join(parts)
+
+
+def encode_polyline(points, precision=POLYLINE_PRECISION):
+    return PolylineEncoder(precision).encode(points)
+
+
+def decode_polyline(text, precision=POLYLINE_PRECISION):
+    """Obrnuto od encode_polyline - [(lat, lng)]"""
+    factor = 10 ** precision
+    points, values = [], []
+    lat = lng = 0
+    shift = result = 0
+    for char in text:
+        byte = ord(char) - 63
+        result |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            shift = result = 0
+            if len(values) == 2:
+                lat += values[0]
+                lng += values[1]
+                points.append((lat / factor, lng / factor))
+                values = []
+    return points
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_polyline(rows, precision=POLYLINE_PRECISION):
+    """Stream encoded polyline-a iz (lat, lng, ...) redova"""
+    encoder = PolylineEncoder(precision)
+    for chunk in _chunks(rows):
+        yield encoder.encode(chunk)
+
+
+def iter_delta_binary(rows, base_time, precision=POLYLINE_PRECISION):
+    """
+    Stream delta-binarnog niza iz (lat, lng, timestamp) redova
+
+    Args:
+        base_time: datetime od kog se mere sekunde (šalje se klijentu u zaglavlju)
+    """
+    factor = 10 ** precision
+    base = base_time.timestamp()
+    previous = None
+    for chunk in _chunks(rows):
+        values = np.empty((len(chunk), 3), dtype=np.int64)
+        values[:, 0] = np.rint(np.array([float(row[0]) for row in chunk]) * factor)
+        values[:, 1] = np.rint(np.array([float(row[1]) for row in chunk]) * factor)
+        values[:, 2] = np.rint(np.array([row[2].timestamp() for row in chunk]) - base)
+        deltas = np.diff(values, axis=0, prepend=previous if previous is not None else np.zeros((1, 3), dtype=np.int64))
+        previous = values[-1:]
+        yield deltas.astype('<i4').tobytes()
+
+
+def decode_delta_binary(data):
+    """Obrnuto od iter_delta_binary - niz (n, 3) sa lat*1e5, lng*1e5, sekundama"""
+    return np.cumsum(np.frombuffer(data, dtype='<i4').reshape(-1, 3).astype(np.int64), axis=0)
@@ -0,0 +1,214 @@
+"""
+Kompresija GPS putanja
+
+- DeadReckoningFilter (online): tačka se ne čuva ako je objašnjiva
+  brzinom i pravcem iz poslednje dve sačuvane tačke (predviđena pozicija
+  je u okviru tolerancije). Kada predviđanje prestane da važi, čuva se i
+  poslednja odbačena tačka, pa polilinija sačuvanih tačaka prati skretanja.
+- douglas_peucker (offline): uprošćavanje već sačuvane putanje tako da
+  nijedna izbačena tačka nije dalje od tolerancije od uprošćene linije.
+
+Rastojanja se računaju u lokalnoj ekvidistantnoj projekciji (metri), što
+je za dužine deonica između GPS tačaka dovoljno tačno.
+"""
+import math
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from .spatial_index import KM_PER_DEGREE_LAT
+
+METERS_PER_DEGREE_LAT = KM_PER_DEGREE_LAT * 1000
+
+# Podrazumevana tolerancija (m) za online filter i offline kompakciju
+DEAD_RECKONING_TOLERANCE_M = 25.0
+SIMPLIFY_TOLERANCE_M = 15.0
+
+# Tačka se uvek čuva posle ovoliko vremena bez sačuvane tačke, da replay
+# ima vremensku osnovu i kada vozilo dugo stoji ili ide pravo
+MAX_GAP = timedelta(minutes=5)
+
+# Stanje ključa bez novih tačaka duže od ovoga (s) se oslobađa - tura je
+# završena ili je vozač prešao na drugi worker
+TRACK_IDLE_SECONDS = 15 * 60
+
+
+def _to_meters(latitudes, longitudes, origin_lat, origin_lng):
+    scale_x = METERS_PER_DEGREE_LAT * math.cos(math.radians(origin_lat))
+    x = (np.asarray(longitudes, dtype=float) - origin_lng) * scale_x
+    y = (np.asarray(latitudes, dtype=float) - origin_lat) * METERS_PER_DEGREE_LAT
+    return x, y
+
+
+def douglas_peucker(latitudes, longitudes, tolerance_m=SIMPLIFY_TOLERANCE_M):
+    """
+    Douglas-Peucker nad nizom tačaka (iterativno, bez rekurzije)
+
+    Returns:
+        np.ndarray: sortirani indeksi tačaka koje ostaju (uvek prva i poslednja)
+    """
+    count = len(latitudes)
+    if count <= 2:
+        return np.arange(count)
+
+    x, y = _to_meters(latitudes, longitudes, float(np.mean(latitudes)), float(np.mean(longitudes)))
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            distances = np.hypot(px, py)
+        else:
+            # Rastojanje do duži (ne do prave), da se ne izgube povratci unazad
+            t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return np.flatnonzero(keep)
+
+
+class _TrackState:
+    __slots__ = ('anchor', 'last', 'velocity', 'skipped', 'seen_at')
+
+    def __init__(self, fix):
+        self.anchor = fix          # poslednja sačuvana tačka
+        self.last = fix            # poslednja primljena tačka
+        self.velocity = None       # izglađena brzina (m/s istok, m/s sever)
+        self.skipped = None        # poslednja odbačena tačka
+        self.seen_at = time.monotonic()
+
+
+class DeadReckoningFilter:
+    """
+    Online filter po ključu (tura, vozač) - drži samo stanje poslednjih tačaka
+
+    Brzina se izglađuje (eksponencijalno) preko svih primljenih tačaka, pa
+    GPS šum pojedinačne tačke ne kvari predviđanje.
+    """
+
+    # Težina nove tačke u izglađenoj brzini
+    SMOOTHING = 0.3
+
+    def __init__(self, tolerance_m=DEAD_RECKONING_TOLERANCE_M, max_gap=MAX_GAP, idle_seconds=TRACK_IDLE_SECONDS):
+        self.tolerance_m = tolerance_m
+        self.max_gap = max_gap
+        self.idle_seconds = idle_seconds
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def forget(self, key):
+        """
+        Zaboravlja stanje ključa
+
+        Returns:
+            (lat, lng, timestamp) poslednje odbačene tačke ili None - kraj
+            putanje koji pozivalac treba da sačuva
+        """
+        with self._lock:
+            state = self._tracks.pop(key, None)
+        return state.skipped if state is not None else None
+
+    def evict_idle(self, now=None):
+        """
+        Oslobađa stanja ključeva bez tačaka duže od idle_seconds
+
+        Returns:
+            list: [(ključ, (lat, lng, timestamp))] poslednjih odbačenih
+            tačaka - kraj putanje koji pozivalac treba da sačuva
+        """
+        limit = (now if now is not None else time.monotonic()) - self.idle_seconds
+        with self._lock:
+            idle = [key for key, state in self._tracks.items() if state.seen_at < limit]
+            states = [(key, self._tracks.pop(key)) for key in idle]
+        return [(key, state.skipped) for key, state in states if state.skipped is not None]
+
+    def _update_velocity(self, state, fix, speed=None, heading=None):
+        if speed is not None and heading is not None:
+            # Brzina (m/s, kao Geolocation API) i kurs (stepeni od severa) iz uređaja
+            radians = math.radians(float(heading))
+            state.velocity = (float(speed) * math.sin(radians), float(speed) * math.cos(radians))
+            return
+        seconds = (fix[2] - state.last[2]).total_seconds()
+        if seconds <= 0:
+            return
+        x, y = _to_meters([fix[0]], [fix[1]], state.last[0], state.last[1])
+        current = (float(x[0]) / seconds, float(y[0]) / seconds)
+        if state.velocity is None:
+            state.velocity = current
+        else:
+            state.velocity = tuple(
+                old + self.SMOOTHING * (new - old) for old, new in zip(state.velocity, current)
+            )
+
+    def _predicted_error(self, state, fix):
+        anchor = state.anchor
+        seconds = (fix[2] - anchor[2]).total_seconds()
+        x, y = _to_meters([fix[0]], [fix[1]], anchor[0], anchor[1])
+        vx, vy = state.velocity
+        return math.hypot(float(x[0]) - vx * seconds, float(y[0]) - vy * seconds)
+
+    def accept(self, key, latitude, longitude, timestamp, speed=None, heading=None):
+        """
+        Odlučuje koje tačke treba sačuvati
+
+        Returns:
+            list: [(lat, lng, timestamp)] - prazna lista kada je tačka
+            objašnjena predviđanjem, inače tačka (i eventualno poslednja
+            odbačena tačka pre nje)
+        """
+        fix = (float(latitude), float(longitude), timestamp)
+        with self._lock:
+            state = self._tracks.get(key)
+            if state is None:
+                self._tracks[key] = _TrackState(fix)
+                return [fix]
+
+            explained = (
+                timestamp > state.anchor[2]
+                and timestamp - state.anchor[2] < self.max_gap
+                and state.velocity is not None
+                and self._predicted_error(state, fix) <= self.tolerance_m
+            )
+            self._update_velocity(state, fix, speed, heading)
+            state.last = fix
+            state.seen_at = time.monotonic()
+            if explained:
+                state.skipped = fix
+                return []
+
+            kept = []
+            if state.skipped is not None:
+                kept.append(state.skipped)
+                state.skipped = None
+            kept.append(fix)
+            state.anchor = fix
+            return kept
+
+
+def simplify_track(points, tolerance_m=SIMPLIFY_TOLERANCE_M):
+    """
+    Uprošćava listu tačaka (lat, lng, ...) - ostali elementi se prenose
+
+    Returns:
+        list: podskup ulaznih tačaka istim redom
+    """
+    if len(points) <= 2:
+        return list(points)
+    latitudes = [float(point[0]) for point in points]
+    longitudes = [float(point[1]) for point in points]
+    return [points[index] for index in douglas_peucker(latitudes, longitudes, tolerance_m)]
@@ -36,6 +36,11 @@ urlpatterns = [
     path('create-shipment/', views.create_shipment, name='create_shipment'),
     path('shipment/<int:pk>/', views.shipment_detail, name='shipment_detail'),
     path('freight-exchange/', views.freight_exchange, name='freight_exchange'),
+    path('freight-exchange/searches/save/', views.save_search, name='save_search'),
+    path('freight-exchange/searches/<int:pk>/delete/', views.delete_saved_search, name='delete_saved_search'),
+    path('api/freight/', views.freight_exchange_api, name='freight_exchange_api'),
+    path('api/freight/changes/', views.freight_changes_api, name='freight_changes_api'),
+    path('api/cities/autocomplete/', views.city_autocomplete_api, name='city_autocomplete_api'),
     
     # Offers
     path('make-offer/<int:shipment_id>/', views.make_offer, name='make_offer'),
@@ -68,7 +73,13 @@ urlpatterns = [
     # API endpoints
     path('api/accept-offer/<int:offer_id>/', views.accept_offer_api, name='accept_offer_api'),
     path('api/send-message/<int:tour_id>/', views.send_message_api, name='send_message_api'),
+    path('tour/<int:pk>/chat/', views.tour_chat, name='tour_chat'),
+    path('api/tour/<int:pk>/messages/', views.chat_messages_api, name='chat_messages_api'),
+    path('api/tour/<int:pk>/messages/read/', views.chat_read_api, name='chat_read_api'),
+    path('api/tour/<int:pk>/track/', views.tour_track_api, name='tour_track_api'),
+    path('api/fleet/', views.fleet_map_api, name='fleet_map_api'),
     path('api/notifications/', views.notifications_api, name='notifications_api'),
+    path('api/notifications/stream/', views.notifications_stream, name='notifications_stream'),
     path('api/notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('api/notifications/<int:notification_id>/action/', views.notification_action, name='notification_action'),
     
@@ -0,0 +1,166 @@
+"""
+Brojači za dashboard-e (UserStats) - jedan red po korisniku
+
+Dashboard čita samo red korisnika umesto brojanja pošiljki, vozila i
+ponuda pri svakom učitavanju. Red se osvežava posle commit-a izmene
+(signali): ponovo se broji samo deo na koji izmena utiče (pošiljke,
+vozila ili ponude tog korisnika), pa greška u brojanju ne može da se
+nagomilava kao kod +1/-1 ažuriranja. Izmene preko QuerySet.update ne
+prolaze kroz signale - takvo mesto poziva schedule_refresh samo, a
+`manage.py rebuild_user_stats` proverava i popravlja sve redove.
+"""
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Shipment, ShipmentOffer, UserStats, Vehicle
+
+ACTIVE_SHIPMENT_STATUSES = ['published', 'in_progress']
+
+SHIPMENTS = 'shipments'
+VEHICLES = 'vehicles'
+OFFERS = 'offers'
+
+# Deo statistike -> (model, polje vlasnika, brojači)
+PARTS = {
+    SHIPMENTS: (Shipment, 'sender_id', {
+        'total_shipments': Count('id'),
+        'active_shipments': Count('id', filter=Q(status__in=ACTIVE_SHIPMENT_STATUSES)),
+        'completed_shipments': Count('id', filter=Q(status='completed')),
+    }),
+    VEHICLES: (Vehicle, 'owner_id', {
+        'total_vehicles': Count('id'),
+        'available_vehicles': Count('id', filter=Q(is_available=True)),
+    }),
+    OFFERS: (ShipmentOffer, 'carrier_id', {
+        'total_offers': Count('id'),
+        'accepted_offers': Count('id', filter=Q(status='accepted')),
+    }),
+}
+
+SHIPPER_FIELDS = tuple(PARTS[SHIPMENTS][2])
+CARRIER_FIELDS = tuple(PARTS[VEHICLES][2]) + tuple(PARTS[OFFERS][2])
+STAT_FIELDS = SHIPPER_FIELDS + CARRIER_FIELDS
+
+
+def count(user_id, parts=tuple(PARTS)):
+    """Brojači korisnika iz izvornih tabela - jedan upit po delu"""
+    values = {}
+    for part in parts:
+        model, owner_field, counters = PARTS[part]
+        values.update(model.objects.filter(**{owner_field: user_id}).aggregate(**counters))
+    return values
+
+
+def _create(user_id):
+    try:
+        with transaction.atomic():
+            return UserStats.objects.create(user_id=user_id, **count(user_id))
+    except IntegrityError:
+        # Drugi zahtev ga je upravo napravio, ili korisnik više ne postoji (kaskadno brisanje)
+        return UserStats.objects.filter(user_id=user_id).first()
+
+
+def refresh(user_id, parts=tuple(PARTS)):
+    """Ponovo broji delove statistike korisnika (red bez tih delova se pravi ceo)"""
+    values = count(user_id, parts)
+    if not UserStats.objects.filter(user_id=user_id).update(updated_at=timezone.now(), **values):
+        _create(user_id)
+
+
+def schedule_refresh(user_id, part):
+    """Osvežava deo statistike korisnika posle commit-a tekuće transakcije"""
+    if user_id:
+        transaction.on_commit(partial(refresh, user_id, (part,)))
+
+
+def get_stats(user):
+    """Red statistike korisnika; prvi put se računa iz izvornih tabela"""
+    return UserStats.objects.filter(user_id=user.pk).first() or _create(user.pk)
+
+
+def shipper_stats(user):
+    stats = get_stats(user)
+    return {field: getattr(stats, field) for field in SHIPPER_FIELDS}
+
+
+def carrier_stats(user):
+    stats = get_stats(user)
+    return {field: getattr(stats, field) for field in CARRIER_FIELDS}
+
+
+def expected_stats():
+    """Brojači svih korisnika iz izvornih tabela - jedan grupisani upit po delu"""
+    expected = {}
+    for model, owner_field, counters in PARTS.values():
+        rows = model.objects.order_by().values(owner_field).annotate(**counters)
+        for row in rows.iterator():
+            user_id = row.pop(owner_field)
+            expected.setdefault(user_id, dict.fromkeys(STAT_FIELDS, 0)).update(row)
+    return expected
+
+
+def rebuild(fix=True, batch_size=500):
+    """
+    Poredi redove UserStats sa izvornim tabelama i (ako je fix) ispravlja ih
+
+    Returns:
+        (broj proverenih korisnika, id-jevi korisnika sa pogrešnim redom)
+    """
+    expected = expected_stats()
+    existing = {stats.user_id: stats for stats in UserStats.objects.iterator()}
+    # Korisnik bez ičega, a sa redom - red treba da bude sve nule
+    for user_id in existing.keys() - expected.keys():
+        expected[user_id] = dict.fromkeys(STAT_FIELDS, 0)
+
+    now = timezone.now()
+    missing, changed = [], []
+    for user_id, values in expected.items():
+        stats = existing.get(user_id)
+        if stats is None:
+            if any(values.values()):
+                missing.append(UserStats(user_id=user_id, **values))
+        elif any(getattr(stats, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(stats, field, value)
+            stats.updated_at = now
+            changed.append(stats)
+
+    if fix:
+        with transaction.atomic():
+            UserStats.objects.bulk_create(missing, batch_size=batch_size)
+            UserStats.objects.bulk_update(changed, STAT_FIELDS + ('updated_at',), batch_size=batch_size)
+    return len(expected), sorted(stats.user_id for stats in missing + changed)
+
+
+# ------------------------------------------------------------ signali
+
+@receiver(post_save, sender=Shipment, dispatch_uid='user_stats_shipment_saved')
+def _shipment_saved(sender, instance, created=False, raw=False, **kwargs):
+    # _previous_status postavlja freight_search pre upisa; brojači zavise samo od statusa
+    if raw or (not created and getattr(instance, '_previous_status', None) == instance.status):
+        return
+    schedule_refresh(instance.sender_id, SHIPMENTS)
+
+
+@receiver(post_delete, sender=Shipment, dispatch_uid='user_stats_shipment_deleted')
+def _shipment_deleted(sender, instance, **kwargs):
+    schedule_refresh(instance.sender_id, SHIPMENTS)
+
+
+@receiver(post_save, sender=Vehicle, dispatch_uid='user_stats_vehicle_saved')
+@receiver(post_delete, sender=Vehicle, dispatch_uid='user_stats_vehicle_deleted')
+def _vehicle_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh(instance.owner_id, VEHICLES)
+
+
+@receiver(post_save, sender=ShipmentOffer, dispatch_uid='user_stats_offer_saved')
+@receiver(post_delete, sender=ShipmentOffer, dispatch_uid='user_stats_offer_deleted')
+def _offer_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh(instance.carrier_id, OFFERS)
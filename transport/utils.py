@@ -1,4 +1,4 @@
-from geopy.distance import geodesic
+from .geo import ellipsoidal_km
 from .models import CenaPoKilometrazi
 
 
@@ -23,9 +23,7 @@ def izracunaj_cenu(broj_paleta, udaljenost_km):
 
 def izracunaj_udaljenost(polazna_lat, polazna_lon, odredisna_lat, odredisna_lon):
     """Izračunava udaljenost između dve GPS koordinate u kilometrima"""
-    polazna_koordinate = (polazna_lat, polazna_lon)
-    odredisne_koordinate = (odredisna_lat, odredisna_lon)
-    return geodesic(polazna_koordinate, odredisne_koordinate).kilometers
+    return ellipsoidal_km(polazna_lat, polazna_lon, odredisna_lat, odredisna_lon)
 
 
 def predlozi_eko_ambalazu(tezina):
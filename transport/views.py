@@ -1,21 +1,48 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
 from django.core.paginator import Paginator
+import hashlib
 import json
 import math
 
 from .models import (
-    Profile, Vehicle, Shipment, ShipmentOffer, Tour, ChatMessage, Notification, Location, Cargo
+    Profile, Vehicle, Shipment, ShipmentOffer, Tour, Notification, Location, Cargo, SavedSearch
 )
+from .chat import (
+    CHAT_MAX_PAGE_SIZE, CHAT_PAGE_SIZE, broadcast, can_chat, can_view_chat, compact_message, history_page,
+    mark_read, message_event, post_message, read_event
+)
+from .cities import autocomplete, fold, get_city_index, index_version
+from .distance_matrix import DistanceMatrix
 from .forms import SignupForm, ShipmentForm, VehicleForm, ShipmentOfferForm, TourForm
+from .freight_board import changes_since, settled_version
+from .freight_search import (
+    FREIGHT_MAX_PAGE_SIZE, FREIGHT_PAGE_SIZE, InvalidCursor, parse_filters, search_shipments, serialize_shipment
+)
+from .geo import haversine_km
+from .geofence import DELIVERY, geofence_engine
+from .location_ingest import get_tour, record_tour_location
+from .notifications import (
+    anotification_events, invalidate_notifications, notification_events, notification_summary
+)
+from .positions import fleet_positions
+from .saved_searches import SAVED_SEARCH_LIMIT, from_filters, querystring as saved_querystring
+from .tasks import enqueue
+from .track_encoding import iter_delta_binary, iter_polyline
+from .user_stats import OFFERS, carrier_stats, schedule_refresh, shipper_stats
 
 
 
@@ -59,9 +86,8 @@ def shipper_dashboard(request):
     
     context = {
         'shipments': recent_shipments,
-        'total_shipments': shipments.count(),
-        'active_shipments': shipments.filter(status__in=['published', 'in_progress']).count(),
-        'completed_shipments': shipments.filter(status='completed').count(),
+        # Brojači iz jednog reda (UserStats), bez brojanja pošiljki
+        **shipper_stats(request.user),
     }
     return render(request, 'transport/shipper_dashboard.html', context)
 
@@ -101,12 +127,9 @@ def carrier_dashboard(request):
     
     context = {
         'vehicles': vehicles,
-        'total_vehicles': vehicles.count(),
-        'available_vehicles': vehicles.filter(is_available=True).count(),
         'offers': offers[:5],
         'tours': tours[:5],
-        'total_offers': offers.count(),
-        'accepted_offers': offers.filter(status='accepted').count(),
+        **carrier_stats(request.user),
     }
     return render(request, 'transport/carrier_dashboard.html', context)
 
@@ -183,16 +206,17 @@ def make_offer(request, shipment_id):
             offer = form.save(commit=False)
             offer.shipment = shipment
             offer.carrier = request.user
-            offer.save()
-            
-            # Kreiraj notifikaciju za naručioca
-            Notification.objects.create(
-                user=shipment.sender,
-                notification_type='new_offer',
-                title='Nova ponuda',
-                message=f'Dobili ste novu ponudu za pošiljku "{shipment.title}"',
-                shipment=shipment
-            )
+            with transaction.atomic():
+                offer.save()
+                
+                # Notifikacija za naručioca ide u pozadinu
+                enqueue('notify', {
+                    'user_id': shipment.sender_id,
+                    'notification_type': 'new_offer',
+                    'title': 'Nova ponuda',
+                    'message': f'Dobili ste novu ponudu za pošiljku "{shipment.title}"',
+                    'shipment_id': shipment.pk,
+                }, idempotency_key=f'offer-received-{offer.pk}')
             
             messages.success(request, 'Ponuda je uspešno poslata!')
             return redirect('shipment_detail', pk=shipment_id)
@@ -209,55 +233,114 @@ def make_offer(request, shipment_id):
 @login_required
 def freight_exchange(request):
     """Berza tereta - lista dostupnih pošiljki"""
-    # Prikaži samo neprihvaćene aktivne ponude, sortirane po mestu preuzimanja
-    shipments = Shipment.objects.filter(
-        status='published'
-    ).exclude(
-        shipmentoffer__status='accepted'
-    ).order_by('pickup_city', 'pickup_region', 'delivery_city')
-    
-    # Filtriranje
-    pickup_city = request.GET.get('pickup_city')
-    delivery_city = request.GET.get('delivery_city')
-    cargo_type = request.GET.get('cargo_type')
-    max_weight = request.GET.get('max_weight')
-    min_price = request.GET.get('min_price')
-    pickup_date = request.GET.get('pickup_date')
-    
-    if pickup_city:
-        shipments = shipments.filter(pickup_city__icontains=pickup_city)
-    if delivery_city:
-        shipments = shipments.filter(delivery_city__icontains=delivery_city)
-    if cargo_type:
-        shipments = shipments.filter(cargo_type__icontains=cargo_type)
-    if max_weight:
-        try:
-            shipments = shipments.filter(weight__lte=float(max_weight))
-        except ValueError:
-            pass
-    if min_price:
-        try:
-            shipments = shipments.filter(offered_price__gte=float(min_price))
-        except ValueError:
-            pass
-    if pickup_date:
-        shipments = shipments.filter(pickup_date__date=pickup_date)
-    
-    # Dodaj gradove za filter dropdown
-    from .models import City
-    cities = City.objects.all().order_by('name')
-    
+    # Objavljene pošiljke po datumu preuzimanja, stranica po kursoru (freight_search)
+    filters = parse_filters(request.GET)
+    # Verzija pre upita - promene posle nje klijent dobija preko freight_board
+    board_version = settled_version()
+    try:
+        shipments, next_cursor = search_shipments(filters, after=request.GET.get('after'))
+    except InvalidCursor:
+        shipments, next_cursor = search_shipments(filters)
+
+    # Gradovi se biraju preko autocomplete-a, ne iz padajuće liste svih gradova
+    city_index = get_city_index()
+
+    # Filteri bez kursora - osnova za link "Sledeća strana"
+    querystring = request.GET.copy()
+    querystring.pop('after', None)
+
     context = {
         'shipments': shipments,
-        'cities': cities,
-        'pickup_city': pickup_city,
-        'delivery_city': delivery_city,
-        'cargo_type': cargo_type,
+        'next_cursor': next_cursor,
+        'board_version': board_version,
+        'querystring': querystring.urlencode(),
+        'pickup_city_name': city_index.city_name(filters.get('pickup_city')) or request.GET.get('pickup_city', ''),
+        'delivery_city_name': city_index.city_name(filters.get('delivery_city')) or request.GET.get('delivery_city', ''),
+        'cargo_type': filters.get('cargo_type'),
+        'saved_searches': [
+            (saved_search, saved_querystring(saved_search))
+            for saved_search in request.user.saved_searches.select_related('pickup_city', 'delivery_city')
+        ],
         'last_updated': timezone.now(),
     }
     return render(request, 'transport/freight_exchange.html', context)
 
 
+@login_required
+def freight_exchange_api(request):
+    """Stranica berze tereta u JSON-u (isti filteri kao berza, kursor after)"""
+    try:
+        limit = min(max(int(request.GET.get('limit', FREIGHT_PAGE_SIZE)), 1), FREIGHT_MAX_PAGE_SIZE)
+        shipments, next_cursor = search_shipments(
+            parse_filters(request.GET), after=request.GET.get('after'), limit=limit
+        )
+    except (ValueError, InvalidCursor):
+        return JsonResponse({'error': 'Neispravan parametar'}, status=400)
+
+    return JsonResponse({
+        'shipments': [serialize_shipment(shipment) for shipment in shipments],
+        'next_cursor': next_cursor,
+    })
+
+
+@login_required
+def freight_changes_api(request):
+    """Promene berze posle verzije ?since=N (isti filteri kao berza); reset - učitaj stranicu ponovo"""
+    try:
+        since = max(int(request.GET.get('since', 0)), 0)
+    except ValueError:
+        return JsonResponse({'error': 'Neispravan parametar'}, status=400)
+
+    version, changes = changes_since(since, parse_filters(request.GET))
+    return JsonResponse({'version': version, 'changes': changes or [], 'reset': changes is None})
+
+
+@login_required
+@require_http_methods(["POST"])
+def save_search(request):
+    """Čuva trenutne filtere berze (query string) kao pretragu sa obaveštenjima"""
+    if request.user.saved_searches.count() >= SAVED_SEARCH_LIMIT:
+        messages.error(request, f'Možete imati najviše {SAVED_SEARCH_LIMIT} sačuvanih pretraga.')
+    else:
+        try:
+            saved_search = from_filters(request.user, parse_filters(request.GET), request.POST.get('name', ''))
+        except ValueError as exc:
+            messages.error(request, str(exc))
+        else:
+            saved_search.save()
+            messages.success(request, 'Pretraga je sačuvana - obavestićemo vas o novim pošiljkama.')
+    return redirect(f"{reverse('transport:freight_exchange')}?{request.GET.urlencode()}")
+
+
+@login_required
+@require_http_methods(["POST"])
+def delete_saved_search(request, pk):
+    get_object_or_404(SavedSearch, pk=pk, user=request.user).delete()
+    messages.success(request, 'Pretraga je obrisana.')
+    return redirect('transport:freight_exchange')
+
+
+def city_autocomplete_api(request):
+    """Gradovi za početak naziva (?q=cac -> Čačak), bez obzira na dijakritike"""
+    try:
+        limit = max(int(request.GET.get('limit', 10)), 1)
+    except ValueError:
+        limit = 10
+    query = request.GET.get('q', '')
+
+    # Isti upit nad istom verzijom gradova daje isti odgovor
+    etag = '"%s"' % hashlib.md5(f'{index_version()}|{fold(query)}|{limit}'.encode('utf-8')).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'cities': [
+            {'id': city.id, 'name': city.name, 'postal_code': city.postal_code, 'region': city.region}
+            for city in autocomplete(query, limit)
+        ]})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=300'
+    return response
+
+
 @login_required
 def manage_vehicles(request):
     """Upravljanje vozilima"""
@@ -399,23 +482,96 @@ def tour_detail(request, pk):
         messages.error(request, 'Nemate dozvolu da vidite ovu turu.')
         return redirect('home')
     
-    chat_messages = ChatMessage.objects.filter(tour=tour).order_by('timestamp')
+    # Samo poslednja stranica razgovora - starije poruke daje chat_messages_api (?before_id=)
+    chat_messages, has_older_messages = history_page(tour.pk)
     
+    # Putanju za mapu stranica učitava preko tour_track_api (polyline), ne iz konteksta
     context = {
         'tour': tour,
         'chat_messages': chat_messages,
+        'has_older_messages': has_older_messages,
         'can_chat': tour.driver == request.user or tour.shipment.sender == request.user,
+        'track_url': reverse('transport:tour_track_api', args=[tour.pk]),
     }
     return render(request, 'transport/tour_detail.html', context)
 
 
+@login_required
+def tour_track_api(request, pk):
+    """
+    Putanja ture za mapu - encoded polyline (?format=polyline, podrazumevano)
+    ili delta-binarni niz (?format=binary)
+
+    Inkrementalno: ?after=<X-Track-Last-Id prethodnog odgovora> vraća samo
+    redove upisane posle njega. Kursor je id reda, ne vreme očitavanja -
+    bafer (location_ingest) upisuje tačke sa zakašnjenjem i njihovo vreme
+    može biti starije od već poslatih. ?since=<ISO vreme> samo odseca
+    starije tačke (npr. poslednji sat), nije kursor.
+    """
+    tour = get_object_or_404(Tour.objects.select_related('shipment'), pk=pk)
+    
+    # Proveri dozvole
+    if not (tour.driver_id == request.user.id or request.user.is_staff
+            or (tour.shipment and tour.shipment.sender_id == request.user.id)):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    locations = Location.objects.filter(tour=tour)
+    after = 0
+    if request.GET.get('after'):
+        try:
+            after = int(request.GET['after'])
+        except ValueError:
+            return JsonResponse({'error': 'Neispravan parametar after'}, status=400)
+        locations = locations.filter(id__gt=after)
+    if request.GET.get('since'):
+        # '+' iz vremenske zone stiže kao razmak ako klijent nije kodirao URL
+        try:
+            since = parse_datetime(request.GET['since'].replace(' ', '+'))
+        except ValueError:
+            since = None
+        if since is None:
+            return JsonResponse({'error': 'Neispravan parametar since'}, status=400)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        locations = locations.filter(timestamp__gt=since)
+    
+    stats = locations.aggregate(points=Count('id'), first=Min('timestamp'), last_id=Max('id'))
+    # Stream i zaglavlja opisuju iste redove - ne i one upisane u međuvremenu
+    last_id = stats['last_id'] or after
+    rows = locations.filter(id__lte=last_id).order_by('timestamp', 'id').values_list(
+        'latitude', 'longitude', 'timestamp'
+    ).iterator(chunk_size=2000)
+    
+    if request.GET.get('format') == 'binary':
+        base_time = stats['first'] or timezone.now()
+        response = StreamingHttpResponse(iter_delta_binary(rows, base_time), content_type='application/octet-stream')
+        response['X-Track-Base-Time'] = base_time.isoformat()
+    else:
+        response = StreamingHttpResponse(iter_polyline(rows), content_type='text/plain; charset=utf-8')
+    
+    response['X-Track-Points'] = str(stats['points'])
+    response['X-Track-Last-Id'] = str(last_id)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+def fleet_map_api(request):
+    """Trenutne pozicije aktivnih vozača za mapu flote - bez čitanja GPS istorije"""
+    positions = fleet_positions(request.user)
+    for position in positions:
+        position['timestamp'] = position['timestamp'].isoformat()
+    return JsonResponse({'success': True, 'count': len(positions), 'vehicles': positions})
+
+
 @login_required
 def notifications(request):
     """Lista notifikacija"""
     notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
     
     # Označi sve kao pročitane
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    if Notification.objects.filter(user=request.user, is_read=False).update(is_read=True):
+        invalidate_notifications(request.user.id)
     
     context = {
         'notifications': notifications,
@@ -535,45 +691,54 @@ def accept_offer_api(request, offer_id):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
-    offer = get_object_or_404(ShipmentOffer, pk=offer_id)
+    offer = get_object_or_404(ShipmentOffer.objects.select_related('shipment', 'vehicle'), pk=offer_id)
     
-    if offer.shipment.sender != request.user:
+    if offer.shipment.sender_id != request.user.id:
         return JsonResponse({'error': 'Unauthorized'}, status=403)
     
     if offer.status != 'pending':
         return JsonResponse({'error': 'Offer already processed'}, status=400)
     
-    # Prihvati ponudu
-    offer.status = 'accepted'
-    offer.save()
-    
-    # Ažuriraj status pošiljke
-    offer.shipment.status = 'in_progress'
-    offer.shipment.save()
-    
-    # Odbij ostale ponude
-    ShipmentOffer.objects.filter(
-        shipment=offer.shipment
-    ).exclude(pk=offer.pk).update(status='rejected')
-    
-    # Kreiraj turu
-    tour = Tour.objects.create(
-        shipment=offer.shipment,
-        offer=offer,
-        driver=offer.carrier,
-        vehicle=offer.vehicle,
-        status='confirmed'
-    )
-    
-    # Kreiraj notifikacije
-    Notification.objects.create(
-        user=offer.carrier,
-        notification_type='offer_accepted',
-        title='Ponuda prihvaćena',
-        message=f'Vaša ponuda za "{offer.shipment.title}" je prihvaćena!',
-        shipment=offer.shipment,
-        tour=tour
-    )
+    with transaction.atomic():
+        # Uslovni UPDATE - dva istovremena prihvatanja ne prolaze oba
+        if not ShipmentOffer.objects.filter(pk=offer.pk, status='pending').update(status='accepted'):
+            return JsonResponse({'error': 'Offer already processed'}, status=400)
+        # UPDATE ne šalje signale - brojač prihvaćenih ponuda prevoznika ručno
+        schedule_refresh(offer.carrier_id, OFFERS)
+        
+        # Ažuriraj status pošiljke
+        shipment = offer.shipment
+        shipment.status = 'in_progress'
+        shipment.save(update_fields=['status', 'updated_at'])
+        
+        # Odbij ostale ponude
+        ShipmentOffer.objects.filter(
+            shipment=shipment
+        ).exclude(pk=offer.pk).update(status='rejected')
+        
+        # Kreiraj turu
+        capacity = offer.vehicle.capacity
+        tour = Tour.objects.create(
+            shipment=shipment,
+            offer=offer,
+            driver=offer.carrier,
+            vehicle=offer.vehicle,
+            status='confirmed',
+            polaziste=shipment.pickup_city,
+            odrediste=shipment.delivery_city,
+            kapacitet=capacity,
+            slobodna_kilaza=max(capacity - shipment.cargo_weight, 0),
+        )
+        
+        # Notifikacija prevozniku ide u pozadinu
+        enqueue('notify', {
+            'user_id': offer.carrier_id,
+            'notification_type': 'offer_accepted',
+            'title': 'Ponuda prihvaćena',
+            'message': f'Vaša ponuda za "{shipment.title}" je prihvaćena!',
+            'shipment_id': shipment.pk,
+            'tour_id': tour.pk,
+        }, idempotency_key=f'offer-accepted-{offer.pk}')
     
     return JsonResponse({'success': True, 'tour_id': tour.pk})
 
@@ -585,10 +750,10 @@ def send_message_api(request, tour_id):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
-    tour = get_object_or_404(Tour, pk=tour_id)
+    tour = get_object_or_404(Tour.objects.select_related('shipment'), pk=tour_id)
     
     # Proveri dozvole
-    if tour.driver != request.user and tour.shipment.sender != request.user:
+    if not can_chat(tour, request.user):
         return JsonResponse({'error': 'Unauthorized'}, status=403)
     
     try:
@@ -598,21 +763,9 @@ def send_message_api(request, tour_id):
         if not message_text:
             return JsonResponse({'error': 'Message cannot be empty'}, status=400)
         
-        message = ChatMessage.objects.create(
-            tour=tour,
-            sender=request.user,
-            message=message_text
-        )
-        
-        # Kreiraj notifikaciju za drugog korisnika
-        recipient = tour.shipment.sender if tour.driver == request.user else tour.driver
-        Notification.objects.create(
-            user=recipient,
-            notification_type='new_message',
-            title='Nova poruka',
-            message=f'Dobili ste novu poruku u turi "{tour.shipment.title}"',
-            tour=tour
-        )
+        message = post_message(tour, request.user, message_text)
+        # Klijenti povezani na chat ture dobijaju poruku odmah
+        broadcast(tour.pk, message_event(message))
         
         return JsonResponse({
             'success': True,
@@ -624,6 +777,96 @@ def send_message_api(request, tour_id):
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
 
 
+@login_required
+def tour_chat(request, pk):
+    """Chat ture - poruke stižu preko WebSocket-a (ws/chat/<id>/)"""
+    tour = get_object_or_404(Tour.objects.select_related('shipment', 'driver', 'shipment__sender'), pk=pk)
+    
+    if not can_view_chat(tour, request.user):
+        messages.error(request, 'Nemate dozvolu da vidite ovu turu.')
+        return redirect('home')
+    
+    chat_messages, has_older = history_page(tour.pk)
+    last_message_id = chat_messages[-1]['id'] if chat_messages else 0
+    
+    # Otvaranje stranice potvrđuje čitanje svih prikazanih poruka (samo učesnicima -
+    # osoblje čita chat, ali ne potvrđuje čitanje umesto njih)
+    if last_message_id and can_chat(tour, request.user) and mark_read(tour.pk, request.user.id, last_message_id):
+        broadcast(tour.pk, read_event(request.user.id, last_message_id))
+    
+    if tour.driver_id == request.user.id:
+        other_user = tour.shipment.sender if tour.shipment else None
+    else:
+        other_user = tour.driver
+    
+    context = {
+        'tour': tour,
+        'chat_messages': chat_messages,
+        'has_older': has_older,
+        'first_message_id': chat_messages[0]['id'] if chat_messages else 0,
+        'last_message_id': last_message_id,
+        'other_user': other_user,
+        'can_chat': can_chat(tour, request.user),
+    }
+    return render(request, 'transport/chat.html', context)
+
+
+@login_required
+def chat_messages_api(request, pk):
+    """
+    Stranica istorije chata po kursoru:
+    ?before_id= starije poruke (skrolovanje unazad), ?after_id= novije
+    (rezerva kada WebSocket nije dostupan), bez kursora poslednje poruke;
+    ?limit= veličina stranice (najviše CHAT_MAX_PAGE_SIZE)
+    """
+    tour = get_object_or_404(Tour.objects.select_related('shipment', 'driver', 'shipment__sender'), pk=pk)
+    if not can_view_chat(tour, request.user):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    try:
+        before_id = max(int(request.GET.get('before_id', 0)), 0)
+        after_id = max(int(request.GET.get('after_id', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', CHAT_PAGE_SIZE)), 1), CHAT_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    rows, has_more = history_page(tour.pk, before_id=before_id, after_id=after_id, limit=limit)
+    chat_messages = [compact_message(row) for row in rows]
+    
+    # Poruke pišu samo učesnici ture - imena se šalju jednom, ne uz svaku poruku
+    participants = [tour.driver] + ([tour.shipment.sender] if tour.shipment else [])
+    return JsonResponse({
+        'messages': chat_messages,
+        'has_more': has_more,
+        'first_id': chat_messages[0]['id'] if chat_messages else before_id,
+        'last_id': chat_messages[-1]['id'] if chat_messages else after_id,
+        'users': {user.pk: user.username for user in participants},
+    })
+
+
+@login_required
+@require_http_methods(["POST"])
+def chat_read_api(request, pk):
+    """Zbirna potvrda čitanja - sve tuđe poruke do up_to_id"""
+    tour = get_object_or_404(Tour.objects.select_related('shipment'), pk=pk)
+    if not can_view_chat(tour, request.user):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    try:
+        up_to_id = int(json.loads(request.body).get('up_to_id', 0))
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    # Osoblje vidi chat, ali poruke ostaju nepročitane za učesnike
+    if not can_chat(tour, request.user):
+        return JsonResponse({'success': True, 'updated': 0})
+    
+    updated = mark_read(tour.pk, request.user.id, up_to_id)
+    if updated:
+        broadcast(tour.pk, read_event(request.user.id, up_to_id))
+    return JsonResponse({'success': True, 'updated': updated})
+
+
 @login_required
 def websocket_test(request):
     """Test stranica za WebSocket funkcionalnost"""
@@ -789,59 +1032,51 @@ def create_tour(request):
                 except Exception:
                     pass
 
-                # Create Tour object in database
-                tour = Tour.objects.create(
-                    driver=request.user,
-                    vehicle=vehicle,
-                    polaziste=form.cleaned_data['polaziste'],
-                    odrediste=form.cleaned_data['odrediste'],
-                    planirana_putanja=form.cleaned_data.get('planirana_putanja', ''),
-                    dostupno_za_dotovar=form.cleaned_data.get('dostupno_za_dotovar', False),
-                    kapacitet=form.cleaned_data.get('kapacitet', 0),
-                    slobodna_kilaza=form.cleaned_data.get('slobodna_kilaza', 0),
-                    status='active',
-                    start_time=start_time
-                )
-                
-                # Mark vehicle as unavailable during tour
-                if vehicle:
-                    vehicle.is_available = False
-                    vehicle.save()
-                
-                # Create initial location record
-                Location.objects.create(
-                    tour=tour,
-                    latitude=0.0,  # Will be updated by GPS
-                    longitude=0.0,  # Will be updated by GPS
-                    timestamp=timezone.now()
-                )
-                
-                # Create notification for tour start
-                Notification.objects.create(
-                    user=request.user,
-                    title='Tura pokrenuta',
-                    message=f'Tura {tour.polaziste} → {tour.odrediste} je uspešno pokrenuta. GPS praćenje je aktivno.',
-                    notification_type='tour_started',
-                    is_read=False
-                )
-
-                # Zabeleži dostupnost kapaciteta kao lagani log u notifikacijama (privremeni "folder")
-                try:
-                    Notification.objects.create(
-                        user=request.user,
-                        notification_type='cargo',
-                        title='Dostupnost kapaciteta prijavljena',
-                        message=(
+                with transaction.atomic():
+                    # Create Tour object in database (Tour nema polje za polazak - start_time ide u notifikaciju)
+                    tour = Tour.objects.create(
+                        driver=request.user,
+                        vehicle=vehicle,
+                        polaziste=form.cleaned_data['polaziste'],
+                        odrediste=form.cleaned_data['odrediste'],
+                        planirana_putanja=form.cleaned_data.get('planirana_putanja', ''),
+                        dostupno_za_dotovar=form.cleaned_data.get('dostupno_za_dotovar', ''),
+                        kapacitet=form.cleaned_data.get('kapacitet') or 0,
+                        slobodna_kilaza=form.cleaned_data.get('slobodna_kilaza') or 0,
+                        status='confirmed',
+                    )
+                    
+                    # Mark vehicle as unavailable during tour
+                    if vehicle:
+                        vehicle.is_available = False
+                        vehicle.save(update_fields=['is_available'])
+                    
+                    # Notifikacije idu u pozadinu; prvu GPS tačku upisuje praćenje lokacije
+                    enqueue('notify', {
+                        'user_id': request.user.id,
+                        'notification_type': 'tour_started',
+                        'title': 'Tura pokrenuta',
+                        'message': (
+                            f'Tura {tour.polaziste} → {tour.odrediste} je uspešno pokrenuta '
+                            f'(polazak {timezone.localtime(start_time):%d.%m. %H:%M}). GPS praćenje je aktivno.'
+                        ),
+                        'tour_id': tour.pk,
+                    }, idempotency_key=f'tour-started-{tour.pk}')
+                    
+                    # Zabeleži dostupnost kapaciteta kao lagani log u notifikacijama (privremeni "folder")
+                    enqueue('notify', {
+                        'user_id': request.user.id,
+                        'notification_type': 'cargo',
+                        'title': 'Dostupnost kapaciteta prijavljena',
+                        'message': (
                             f"Ruta: {tour.polaziste} → {tour.odrediste} | "
                             f"Putanja: {tour.planirana_putanja or '—'} | "
                             f"Dotovar: {tour.dostupno_za_dotovar} | "
                             f"Slobodno mesta: {tour.kapacitet} | "
                             f"Slobodna kilaža: {tour.slobodna_kilaza}"
                         ),
-                        tour=tour
-                    )
-                except Exception:
-                    pass
+                        'tour_id': tour.pk,
+                    }, idempotency_key=f'tour-capacity-{tour.pk}')
                 
                 messages.success(
                     request, 
@@ -902,30 +1137,19 @@ def update_tour_location(request):
         latitude = float(data.get('latitude'))
         longitude = float(data.get('longitude'))
         
-        # Get active tour for this user
-        tour = Tour.objects.get(
-            id=tour_id,
-            driver=request.user,
-            status__in=['confirmed', 'in_progress']
-        )
-        
-        # Create location record
-        location = Location.objects.create(
-            tour=tour,
-            latitude=latitude,
-            longitude=longitude,
-            timestamp=timezone.now()
-        )
+        # Get active tour for this user (iz keša procesa)
+        tour = get_tour(tour_id)
+        if tour.driver_id != request.user.id:
+            raise Tour.DoesNotExist
         
-        # Update tour status to in progress if it was confirmed
-        if tour.status == 'confirmed':
-            tour.status = 'in_progress'
-            tour.save()
+        # Status se proverava u bazi (potvrđena -> in_progress), tačka ide u bafer
+        # (bulk_create), a ulazak u zonu preuzimanja/dostave potvrđuje preuzimanje/isporuku
+        events = record_tour_location(tour, latitude, longitude, data.get('accuracy'))
         
         return JsonResponse({
             'success': True,
-            'tour_completed': False,
-            'location_id': location.id
+            'tour_completed': tour.delivery_confirmed_at is not None,
+            'geofence_events': [{'zone': zone, 'event': event} for zone, event in events]
         })
         
     except Tour.DoesNotExist:
@@ -935,20 +1159,11 @@ def update_tour_location(request):
 
 
 def check_destination_proximity(tour, current_lat, current_lng):
-    """Check if current location is within 5km of destination"""
-    # This is a simplified distance calculation
-    # In production, you'd use proper geospatial calculations
-    
-    # For now, return False - implement proper GPS coordinate parsing and distance calculation
-    # when destination coordinates are available
-    
-    # TODO: Parse destination coordinates and calculate distance
-    # destination_coords = parse_destination_coordinates(tour.odrediste)
-    # if destination_coords:
-    #     distance = calculate_distance(current_lat, current_lng, dest_lat, dest_lng)
-    #     return distance <= 5.0  # 5km radius
-    
-    return False
+    """Check if current location is inside the delivery geofence"""
+    fence = geofence_engine.fences_for(tour).get(DELIVERY)
+    if fence is None:
+        return False
+    return fence.contains(float(current_lat), float(current_lng))
 
 # Stripe integration and cargo system views
 import stripe
@@ -962,18 +1177,10 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 
 # Add utility functions that are referenced but not defined
 def calculate_distance(lat1, lng1, lat2, lng2):
-    """Calculate distance between two coordinates using Haversine formula"""
+    """Drumsko rastojanje iz matrice rastojanja; vazdušna linija (Haversine) kada par nije u matrici"""
     try:
-        # Convert degrees to radians
-        lat1, lng1, lat2, lng2 = map(math.radians, [float(lat1), float(lng1), float(lat2), float(lng2)])
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlng = lng2 - lng1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        r = 6371  # Radius of Earth in kilometers
-        return c * r
+        road_km = DistanceMatrix.road_distance_km(lat1, lng1, lat2, lng2)
+        return road_km if road_km is not None else haversine_km(lat1, lng1, lat2, lng2)
     except (ValueError, TypeError):
         return 0
 
@@ -1181,54 +1388,55 @@ def confirm_delivery_view(request, cargo_id):
     """Confirm delivery and capture Stripe payment"""
     cargo = get_object_or_404(Cargo, id=cargo_id)
     
-    if cargo.shipper != request.user:
+    if cargo.posiljilac_id != request.user.id:
         return JsonResponse({'success': False, 'error': 'Nemate dozvolu'})
     
-    if cargo.status != 'in_transit':
-        return JsonResponse({'success': False, 'error': 'Pošiljka nije u tranzitu'})
-    
-    try:
-        # Capture Stripe payment
-        stripe.PaymentIntent.capture(cargo.payment_intent_id)
-        
-        cargo.status = 'delivered'
-        cargo.delivered_at = timezone.now()
-        cargo.save()
-        
-        # Create notifications
-        Notification.objects.create(
-            user=cargo.carrier,
-            title="Dostava Potvrđena",
-            message=f"Dostava je potvrđena. Zarada: {cargo.carrier_price} RSD",
-            notification_type='payment'
+    with transaction.atomic():
+        # Uslovni UPDATE - dvostruka potvrda ne pravi dve naplate
+        confirmed = Cargo.objects.filter(pk=cargo.pk, status='in_transit').update(
+            status='delivered', isporucen=timezone.now()
         )
+        if not confirmed:
+            return JsonResponse({'success': False, 'error': 'Pošiljka nije u tranzitu'})
         
-        return JsonResponse({'success': True})
-        
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
+        # Stripe capture i notifikacija prevozniku u pozadini (ponavlja se ako Stripe ne odgovori)
+        enqueue('capture_cargo_payment', {'cargo_id': cargo.pk}, idempotency_key=f'cargo-capture-{cargo.pk}')
+    
+    return JsonResponse({'success': True})
 
 @login_required
 def notifications_api(request):
     """API endpoint for fetching notifications"""
-    notifications = Notification.objects.filter(
-        user=request.user,
-        is_read=False
-    ).order_by('-created_at')[:10]
-    
-    data = {
-        'notifications': [{
-            'id': n.id,
-            'title': n.title,
-            'message': n.message,
-            'notification_type': n.notification_type,
-            'sound_file': n.sound_file,
-            'is_read': n.is_read,
-            'created_at': n.created_at.isoformat()
-        } for n in notifications]
-    }
-    
-    return JsonResponse(data)
+    summary = notification_summary(request.user.id)
+    
+    # Ništa se nije promenilo od prošlog poll-a - 304 bez tela
+    response = get_conditional_response(request, etag=summary['etag'])
+    if response is None:
+        response = JsonResponse({
+            'notifications': summary['notifications'],
+            'unread_count': summary['unread_count'],
+            'count': summary['unread_count'],
+        })
+    response['ETag'] = summary['etag']
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@login_required
+def notifications_stream(request):
+    """Server-Sent Events - sažetak notifikacija stiže čim se promeni"""
+    if not settings.NOTIFICATION_STREAM_ENABLED:
+        # EventSource ne pokušava ponovo posle 204, klijent prelazi na polling
+        return HttpResponse(status=204)
+    
+    # Pod ASGI-jem sinhroni generator bi bio pročitan do kraja pre slanja
+    events = anotification_events if isinstance(request, ASGIRequest) else notification_events
+    response = StreamingHttpResponse(
+        events(request.user.id, request.headers.get('Last-Event-ID')),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @login_required
 @require_http_methods(['POST'])